@@ -0,0 +1,72 @@
+"""
+Convert ESM-2 Checkpoints to Memory-Mapped Bundles
+
+Loads a hub model name or local .pt checkpoint once (pickle) and writes a
+<name>.plmbundle directory that the pipeline maps instead of unpickling.
+Point config.yaml's plm_bundle_dir at the output directory to use it.
+
+Usage:
+    python scripts/convert_plm_bundle.py --model esm2_t30_150M_UR50D --outdir models
+    python scripts/convert_plm_bundle.py --model ~/.cache/torch/hub/checkpoints/esm2_t33_650M_UR50D.pt
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.features.plm_bundle import BUNDLE_SUFFIX, load_bundle, save_bundle
+
+
+def convert(model_name, outdir, verify=True):
+    """
+    Convert one checkpoint and optionally verify the bundle reproduces it.
+
+    Returns:
+        Path to the written bundle directory
+    """
+    import esm
+    import torch
+
+    start = time.perf_counter()
+    model, alphabet = esm.pretrained.load_model_and_alphabet(model_name)
+    model.eval()
+    print(f"[INFO] Loaded {model_name} from checkpoint in {time.perf_counter() - start:.2f}s")
+
+    out = Path(outdir) / f"{Path(model_name).stem}{BUNDLE_SUFFIX}"
+    save_bundle(model, out, Path(model_name).stem)
+    size_mb = sum(f.stat().st_size for f in out.iterdir()) / 1024 ** 2
+    print(f"[OK] wrote {out} ({size_mb:.1f} MB)")
+
+    if verify:
+        start = time.perf_counter()
+        mapped, _ = load_bundle(out)
+        print(f"[INFO] Bundle cold start: {time.perf_counter() - start:.2f}s")
+        _, _, toks = alphabet.get_batch_converter()([("probe", "MNFPRASRLMQAAVLGGLMAVSAAATAQ")])
+        with torch.no_grad():
+            diff = (model(toks)["logits"] - mapped(toks)["logits"]).abs().max().item()
+        if diff > 1e-5:
+            raise RuntimeError(f"Bundle logits differ from checkpoint (max |diff| = {diff:.2e})")
+        print(f"[OK] Bundle verified (max |logit diff| = {diff:.1e})")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Convert ESM-2 checkpoints to memory-mapped bundles')
+    ap.add_argument('--model', required=True, action='append',
+                    help='Hub model name or local .pt path (repeatable)')
+    ap.add_argument('--outdir', default='models', help='Bundle output directory')
+    ap.add_argument('--no-verify', action='store_true', help='Skip logits comparison')
+    args = ap.parse_args()
+
+    os.makedirs(args.outdir, exist_ok=True)
+    for name in args.model:
+        convert(name, args.outdir, verify=not args.no_verify)
+
+
+if __name__ == '__main__':
+    main()
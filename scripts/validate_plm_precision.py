@@ -0,0 +1,140 @@
+"""
+PLM Precision Validation Report
+
+Scores the same sequences with the fp32 reference and each reduced-precision
+CPU inference path (bf16 autocast, int8 dynamic quantisation) and reports
+the speedup and how far the mean PLL drifts from fp32.
+
+Metrics per precision:
+- Wall time and speedup vs fp32
+- Mean / max absolute difference of mean PLL vs fp32
+- Spearman ρ of the resulting ranking vs fp32
+
+Only sequences scored under every precision are compared; any that a
+precision failed to score are listed in the report.
+
+Usage:
+    python scripts/validate_plm_precision.py --input data/real_sequences/petase_variants.fasta \
+        --precisions fp32,bf16,int8 --threads 16 --output runs/plm_precision_report.md
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+from scipy.stats import spearmanr
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils_seq import read_fasta
+from src.features.plm_engine import pll_sweep
+
+
+def compare_precisions(seqs, cfg, precisions):
+    """
+    Run pll_sweep once per precision and compare against fp32.
+
+    Args:
+        seqs: List of (seq_id, sequence) tuples
+        cfg: Base configuration dict (plm_model, plm_threads, ...)
+        precisions: Iterable of precision names; fp32 is always run first
+
+    Returns:
+        DataFrame with one row per precision; df.attrs['dropped'] lists the
+        seq_ids left out because some precision could not score them
+    """
+    base_cfg = dict(cfg)
+    base_cfg.pop('plm_cache_dir', None)  # measure inference, not cache hits
+
+    results = {}
+    timings = {}
+    for precision in ['fp32'] + [p for p in precisions if p != 'fp32']:
+        run_cfg = dict(base_cfg, plm_precision=precision)
+        # Warm-up on one sequence so model loading/quantisation is not timed
+        pll_sweep(seqs[:1], run_cfg)
+        start = time.perf_counter()
+        results[precision] = pll_sweep(seqs, run_cfg)
+        timings[precision] = time.perf_counter() - start
+        print(f"[INFO] {precision}: {timings[precision]:.2f}s for {len(seqs)} sequences")
+
+    sids = [sid for sid, _ in seqs if all(sid in scores for scores in results.values())]
+    scored = set(sids)
+    dropped = [sid for sid, _ in seqs if sid not in scored]
+    if dropped:
+        print(f"[WARN] {len(dropped)} sequences not scored under every precision, "
+              f"left out of the comparison: {', '.join(dropped)}")
+    if not sids:
+        raise RuntimeError('No sequence was scored under every precision')
+    ref = np.array([results['fp32'][sid] for sid in sids])
+    rows = []
+    for precision, scores in results.items():
+        vals = np.array([scores[sid] for sid in sids])
+        diff = np.abs(vals - ref)
+        rho = spearmanr(ref, vals)[0] if len(sids) > 2 else float('nan')
+        rows.append({
+            'precision': precision,
+            'seconds': timings[precision],
+            'speedup_vs_fp32': timings['fp32'] / max(timings[precision], 1e-9),
+            'mean_abs_diff': float(diff.mean()),
+            'max_abs_diff': float(diff.max()),
+            'spearman_vs_fp32': float(rho),
+            'n_unscored': sum(sid not in scores for sid, _ in seqs),
+        })
+    df = pd.DataFrame(rows)
+    df.attrs['dropped'] = dropped
+    return df
+
+
+def write_report(df, cfg, n_seqs, output_path):
+    """Write the comparison table as a Markdown report."""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('# PLM Precision Validation\n\n')
+        f.write(f"- Model: {cfg.get('plm_model', 'esm2_t30_150M_UR50D')}\n")
+        f.write(f"- Sequences: {n_seqs}\n")
+        f.write(f"- Intra-op threads: {cfg.get('plm_threads', 'default')}\n")
+        dropped = df.attrs.get('dropped', [])
+        if dropped:
+            f.write(f"- Not scored under every precision (excluded): {', '.join(dropped)}\n")
+        f.write('\n| precision | seconds | speedup | mean abs ΔPLL | max abs ΔPLL | Spearman vs fp32 | unscored |\n')
+        f.write('|---|---|---|---|---|---|---|\n')
+        for _, r in df.iterrows():
+            f.write(f"| {r['precision']} | {r['seconds']:.2f} | {r['speedup_vs_fp32']:.2f}x | "
+                    f"{r['mean_abs_diff']:.4f} | {r['max_abs_diff']:.4f} | {r['spearman_vs_fp32']:.4f} | "
+                    f"{r['n_unscored']} |\n")
+    print(f"[OK] wrote {output_path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Validate reduced-precision PLM inference against fp32')
+    ap.add_argument('--input', required=True, help='FASTA path')
+    ap.add_argument('--config', default='config.yaml', help='YAML config')
+    ap.add_argument('--precisions', default='fp32,bf16,int8', help='Comma-separated precisions')
+    ap.add_argument('--threads', type=int, default=None, help='Intra-op threads (plm_threads)')
+    ap.add_argument('--interop-threads', type=int, default=None, help='Inter-op threads')
+    ap.add_argument('--max-seqs', type=int, default=None, help='Score only the first N sequences')
+    ap.add_argument('--output', default='runs/plm_precision_report.md', help='Markdown report path')
+    args = ap.parse_args()
+
+    with open(args.config, encoding='utf-8') as f:
+        cfg = yaml.safe_load(f)
+    cfg['device'] = 'cpu'
+    if args.threads:
+        cfg['plm_threads'] = args.threads
+    if args.interop_threads:
+        cfg['plm_interop_threads'] = args.interop_threads
+
+    seqs = read_fasta(args.input)[:args.max_seqs]
+    df = compare_precisions(seqs, cfg, args.precisions.split(','))
+    print(df.to_string(index=False))
+    write_report(df, cfg, len(seqs), args.output)
+    df.to_csv(os.path.splitext(args.output)[0] + '.csv', index=False)
+
+
+if __name__ == '__main__':
+    main()
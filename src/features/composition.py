@@ -0,0 +1,205 @@
+"""
+Batch amino-acid composition features for the expression channel.
+
+Sequences are encoded once into a uint8 matrix (src.utils_seq.encode_sequences)
+and every feature is a numpy reduction over it:
+
+- counts: (N, 20) residue counts in AA_ORDER
+- gravy: Kyte-Doolittle mean hydropathy
+- aromaticity: F + W + Y fraction
+- charge_balance: (K + R - D - E) / length
+- pi: isoelectric point, solved by bisection for all sequences at once
+- disorder_promoting / order_promoting: fractions of PEKSQAGDR / WFYIVLCMNT
+
+Every feature is a function of the residue counts, length and terminal
+residues; pI is solved once per distinct charge composition.
+
+Definitions follow Bio.SeqUtils.ProtParam / IsoelectricPoint (case-insensitive,
+same pK tables and bisection schedule), so values match ProteinAnalysis.
+Non-canonical residues count towards length only; empty sequences get 0.0
+fractions and a pI of NaN.
+
+Key functions:
+- composition_features(sequences): Dict of feature arrays
+- isoelectric_points(counts, nterm, cterm): Vectorised pI
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from src.utils_seq import AA_ORDER, UNKNOWN_CODE, encode_sequences
+
+# Kyte & Doolittle hydropathy (Bio.SeqUtils.ProtParamData.kd) in AA_ORDER
+KD = np.array([{
+    'A': 1.8, 'R': -4.5, 'N': -3.5, 'D': -3.5, 'C': 2.5, 'Q': -3.5, 'E': -3.5,
+    'G': -0.4, 'H': -3.2, 'I': 4.5, 'L': 3.8, 'K': -3.9, 'M': 1.9, 'F': 2.8,
+    'P': -1.6, 'S': -0.8, 'T': -0.7, 'W': -0.9, 'Y': -1.3, 'V': 4.2,
+}[aa] for aa in AA_ORDER])
+
+# Bio.SeqUtils.IsoelectricPoint pK tables (summation order matters for
+# bit-identical bisection decisions, so keep theirs)
+POSITIVE_PKS = (('K', 10.0), ('R', 12.0), ('H', 5.98))
+NEGATIVE_PKS = (('D', 4.05), ('E', 4.45), ('C', 9.0), ('Y', 10.0))
+PK_NTERM, PK_CTERM = 7.5, 3.55
+PK_NTERMINAL = {'A': 7.59, 'M': 7.0, 'S': 6.93, 'P': 8.36, 'T': 6.82, 'V': 7.44, 'E': 7.7}
+PK_CTERMINAL = {'D': 4.55, 'E': 4.75}
+
+DISORDER_PROMOTING = 'PEKSQAGDR'
+ORDER_PROMOTING = 'WFYIVLCMNT'
+
+_IDX = {aa: i for i, aa in enumerate(AA_ORDER)}
+_CHARGED = [_IDX[aa] for aa, _ in POSITIVE_PKS + NEGATIVE_PKS]
+_DISORDER_MASK = np.isin(np.arange(len(AA_ORDER)), [_IDX[aa] for aa in DISORDER_PROMOTING])
+_ORDER_MASK = np.isin(np.arange(len(AA_ORDER)), [_IDX[aa] for aa in ORDER_PROMOTING])
+
+
+def _terminal_lut(table, default):
+    lut = np.full(256, default)
+    for aa, pk in table.items():
+        lut[_IDX[aa]] = pk
+    return lut
+
+
+_NTERM_LUT = _terminal_lut(PK_NTERMINAL, PK_NTERM)
+_CTERM_LUT = _terminal_lut(PK_CTERMINAL, PK_CTERM)
+
+
+def count_residues(codes: np.ndarray, block: int = 2048) -> np.ndarray:
+    """(N, L) AA_ORDER codes -> (N, 20) int64 counts (non-canonical ignored)."""
+    n = codes.shape[0]
+    out = np.zeros((n, len(AA_ORDER)), dtype=np.int64)
+    # One bincount per block of rows over (row * 256 + code); blocks keep
+    # the histogram cache-sized
+    for start in range(0, n, block):
+        part = codes[start:start + block]
+        m = len(part)
+        flat = (part.astype(np.int32) + (np.arange(m, dtype=np.int32) * 256)[:, None]).ravel()
+        out[start:start + m] = np.bincount(flat, minlength=m * 256).reshape(m, 256)[:, :len(AA_ORDER)]
+    return out
+
+
+def charge_at_ph(counts: np.ndarray, nterm: np.ndarray, cterm: np.ndarray, ph) -> np.ndarray:
+    """
+    Net charge at pH (scalar or per sequence) from residue counts.
+
+    Args:
+        counts: (N, 20) residue counts
+        nterm: (N,) N-terminal amine pK
+        cterm: (N,) C-terminal carboxyl pK
+        ph: pH, scalar or (N,)
+    """
+    counts = counts.astype(np.float64)
+    positive = 0.0 + 1.0 / (10 ** (ph - nterm) + 1.0)
+    for aa, pk in POSITIVE_PKS:
+        positive = positive + counts[:, _IDX[aa]] * (1.0 / (10 ** (ph - pk) + 1.0))
+    negative = 0.0 + 1.0 / (10 ** (cterm - ph) + 1.0)
+    for aa, pk in NEGATIVE_PKS:
+        negative = negative + counts[:, _IDX[aa]] * (1.0 / (10 ** (pk - ph) + 1.0))
+    return positive - negative
+
+
+def _group_rows(columns, n):
+    """
+    Rows with equal values in all integer columns.
+
+    Returns:
+        (first row of each group, group of each row)
+    """
+    key = np.zeros(n, dtype=np.int64)
+    radix = 1
+    for column in columns:
+        if not n:
+            break
+        low = int(column.min())
+        span = int(column.max()) - low + 1
+        if radix * span >= 2 ** 62:  # does not pack into one int64 key
+            _, first, inverse = np.unique(np.column_stack(columns), axis=0,
+                                          return_index=True, return_inverse=True)
+            return first, inverse.reshape(-1)
+        key += (column - low) * radix
+        radix *= span
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+
+def isoelectric_points(counts: np.ndarray, nterm: np.ndarray, cterm: np.ndarray) -> np.ndarray:
+    """
+    Isoelectric points by bisection, all sequences in lock-step.
+
+    Mirrors IsoelectricPoint.pi(): start at pH 7.775 in [4.05, 12] and halve
+    the bracket until it is narrower than 1e-4. Sequences with the same
+    charged-residue counts and terminal pKs are solved once.
+    """
+    columns = [counts[:, i].astype(np.int64) for i in _CHARGED]
+    columns += [np.unique(nterm, return_inverse=True)[1].reshape(-1),
+                np.unique(cterm, return_inverse=True)[1].reshape(-1)]
+    first, inverse = _group_rows(columns, len(counts))
+    charged = np.zeros((len(first), len(AA_ORDER)))
+    charged[:, _CHARGED] = counts[first][:, _CHARGED]
+    nterm, cterm = nterm[first], cterm[first]
+
+    n = len(first)
+    ph = np.full(n, 7.775)
+    low = np.full(n, 4.05)
+    high = np.full(n, 12.0)
+    active = high - low > 0.0001
+    while active.any():
+        positive = charge_at_ph(charged, nterm, cterm, ph) > 0.0
+        low = np.where(active & positive, ph, low)
+        high = np.where(active & ~positive, ph, high)
+        ph = np.where(active, (low + high) / 2, ph)
+        active = high - low > 0.0001
+    return ph[inverse]
+
+
+def _features(counts, lengths, first, last) -> Dict[str, np.ndarray]:
+    """All features from counts, lengths and terminal residue codes."""
+    denom = np.maximum(lengths, 1)
+    charge = (counts[:, _IDX['K']] + counts[:, _IDX['R']]
+              - counts[:, _IDX['D']] - counts[:, _IDX['E']])
+    pi = isoelectric_points(counts, _NTERM_LUT[first], _CTERM_LUT[last]) if len(counts) else np.zeros(0)
+    pi[lengths == 0] = np.nan
+    return {
+        'length': lengths,
+        'counts': counts,
+        'gravy': counts @ KD / denom,
+        'aromaticity': counts[:, [_IDX['F'], _IDX['W'], _IDX['Y']]].sum(axis=1) / denom,
+        'charge_balance': charge / denom,
+        'pi': pi,
+        'disorder_promoting': counts[:, _DISORDER_MASK].sum(axis=1) / denom,
+        'order_promoting': counts[:, _ORDER_MASK].sum(axis=1) / denom,
+    }
+
+
+def _encoded_terms(sequences: List[str]):
+    """(counts, lengths, first code, last code) of a batch."""
+    codes = encode_sequences(sequences)
+    lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+    rows = np.arange(len(sequences))
+    if codes.shape[1]:
+        first = codes[rows, 0]
+        last = codes[rows, np.maximum(lengths - 1, 0)]
+    else:
+        first = last = np.full(len(sequences), UNKNOWN_CODE, dtype=np.uint8)
+    return count_residues(codes), lengths, first, last
+
+
+def composition_features(sequences: List[str], chunk_size: int = 65536) -> Dict[str, np.ndarray]:
+    """
+    Composition features of many sequences.
+
+    Args:
+        sequences: Protein sequences
+        chunk_size: Sequences encoded per batch (bounds the matrix size)
+
+    Returns:
+        {'length', 'counts', 'gravy', 'aromaticity', 'charge_balance', 'pi',
+        'disorder_promoting', 'order_promoting'}, one row per sequence
+    """
+    parts = [_encoded_terms(sequences[start:start + chunk_size])
+             for start in range(0, len(sequences), chunk_size)]
+    if not parts:
+        return _features(np.zeros((0, len(AA_ORDER)), dtype=np.int64), np.zeros(0, dtype=np.int64),
+                         np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8))
+    return _features(*(np.concatenate(column) for column in zip(*parts)))
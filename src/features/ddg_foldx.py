@@ -6,6 +6,11 @@ Negative ΔΔG = stabilizing, Positive ΔΔG = destabilizing.
 
 Key functions:
 - ddg_foldx_scores(seqs, cfg): Main interface returning {seq_id: ddg_score}
+- prepare_structure(pdb_path, chain, foldx_exe, cfg): Cached RepairPDB model
+- saturation_matrix(pdb_path, chain, foldx_exe, cfg): Position × 20 single-mutant ΔΔG
+- additive_ddg(resnums, matrix, mutation_sets): Additive multi-mutant estimates
+- ddg_foldx_channels(seqs, cfg): ΔΔG plus per-energy-term sub-channels
+- read_fxout_table(work_dir, pdb_name): Streaming Average/Dif/Raw fxout parser
 
 Implementation following TDD principles (tests in tests/test_ddg.py).
 
@@ -14,42 +19,71 @@ References:
 - Schymkowitz et al., Nucleic Acids Res. 2005 (FoldX original paper)
 """
 
+import hashlib
 import os
 import subprocess
+import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import Dict, Iterator, List, Tuple
 import shutil
-import re
 
+import numpy as np
+import pandas as pd
 
-def _generate_mutation_list(wt_seq: str, mut_seq: str, chain: str = 'A') -> List[str]:
+from src.features.ddg_store import get_store, store_key
+from src.structure_index import load_structure_index
+from src.utils_align import get_variant_map
+from src.utils_seq import AA_ORDER, parse_mutation_codes
+
+# Content hashes of PDBs / FoldX binaries: (path, size, mtime_ns) -> sha256
+_FILE_HASHES = {}
+
+
+def _call_mutations_by_alignment(
+    seqs: List[Tuple[str, str]],
+    index,
+    chain: str,
+    min_identity: float = 0.5,
+    map_identity: float = 0.9
+) -> Dict[str, List[str]]:
     """
-    Generate FoldX mutation list from WT and mutant sequences.
+    Call FoldX mutations by comparing sequences to the structure's sequence.
 
-    FoldX format: [WT_aa][Chain][Position][Mut_aa]
-    Example: SA121E (Serine at position 121 of chain A mutated to Glutamate)
+    Positions are mapped into PDB numbering through the structure index.
+    Internal indels cannot be modelled by BuildModel and are skipped with a
+    warning; substitutions to non-canonical residues are skipped too.
 
     Args:
-        wt_seq: Wild-type amino acid sequence
-        mut_seq: Mutant amino acid sequence
-        chain: PDB chain identifier (default 'A')
+        seqs: List of (seq_id, sequence) tuples
+        index: StructureIndex of the modelled chain
+        chain: PDB chain identifier
+        min_identity: Sequences less identical than this to the structure
+                      are not called (None)
+        map_identity: Identity above which equal-length sequences are
+                      compared by index instead of aligned
 
     Returns:
-        List of mutations in FoldX format (e.g., ["SA121E", "DA186H"])
+        Dict mapping seq_id to FoldX mutations, or None when rejected
     """
-    if len(wt_seq) != len(mut_seq):
-        raise ValueError(f"Sequence length mismatch: WT={len(wt_seq)}, Mut={len(mut_seq)}")
-
-    mutations = []
-    for i, (wt_aa, mut_aa) in enumerate(zip(wt_seq, mut_seq)):
-        if wt_aa != mut_aa:
-            # FoldX uses 1-indexed positions
-            position = i + 1
-            mutation = f"{wt_aa}{chain}{position}{mut_aa}"
-            mutations.append(mutation)
-
-    return mutations
+    calls = {}
+    # Reuses the library map prepared by run_pipeline when there is one
+    results = get_variant_map(index.sequence, [seq for _, seq in seqs], map_identity).calls()
+    for (seq_id, _), (substitutions, indels, identity) in zip(seqs, results):
+        if identity < min_identity:
+            print(f"[WARN] {seq_id}: {identity:.0%} identical to the PDB chain; no mutations called")
+            calls[seq_id] = None
+            continue
+        if indels:
+            print(f"[WARN] {seq_id}: {indels} indels relative to the PDB chain ignored (BuildModel models substitutions only)")
+        skipped = [f"{wt}{index.seq_to_pdb(i)}{mut}" for wt, i, mut in substitutions if mut not in AA_ORDER]
+        if skipped:
+            print(f"[WARN] {seq_id}: non-canonical substitutions skipped: {', '.join(skipped)}")
+        calls[seq_id] = [f"{wt}{chain}{index.seq_to_pdb(i)}{mut}"
+                         for wt, i, mut in substitutions if mut in AA_ORDER]
+    return calls
 
 
 def _parse_mutations_from_id(seq_id: str, chain: str = 'A', pdb_offset: int = 0) -> List[str]:
@@ -73,14 +107,10 @@ def _parse_mutations_from_id(seq_id: str, chain: str = 'A', pdb_offset: int = 0)
     # Pattern: [Single letter][1-4 digit number][Single letter]
     # Must be preceded by _ or | and followed by _ or end of string
     # Example: S121E, D186H, R224Q (from "...| S121E_D186H...")
-    mutation_pattern = r'(?:^|[_|])([A-Z])(\d{1,4})([A-Z])(?=[_|]|$)'
-
-    matches = re.findall(mutation_pattern, seq_id)
-
     mutations = []
-    for wt_aa, position, mut_aa in matches:
+    for wt_aa, position, mut_aa in parse_mutation_codes(seq_id):
         # Apply PDB offset to position
-        pdb_position = int(position) + pdb_offset
+        pdb_position = position + pdb_offset
         # FoldX format: [WT_aa][Chain][Position][Mut_aa]
         mutation = f"{wt_aa}{chain}{pdb_position}{mut_aa}"
         mutations.append(mutation)
@@ -106,7 +136,83 @@ def _create_individual_list(mutations: List[str], output_file: Path):
     else:
         content = ",".join(mutations) + ";\n"
 
-    output_file.write_text(content, encoding='utf-8')
+    # Force LF line endings: the file may be read by Linux FoldX under WSL
+    with open(output_file, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
+
+
+def _create_batch_list(mutation_sets: List[List[str]], output_file: Path):
+    """
+    Create an individual_list.txt holding several variants, one per line.
+
+    FoldX builds line k as model <PDB>_k, so row k of the output files
+    belongs to mutation_sets[k - 1].
+
+    Args:
+        mutation_sets: One list of FoldX-format mutations per variant
+        output_file: Path to write individual_list.txt
+    """
+    lines = [",".join(mutations) + ";\n" for mutations in mutation_sets]
+    with open(output_file, 'w', encoding='utf-8', newline='\n') as f:
+        f.writelines(lines)
+
+
+def _to_wsl_path(path: Path) -> str:
+    """Translate a Windows path (C:\\x\\y) into its WSL mount (/mnt/c/x/y)."""
+    text = str(path).replace('\\', '/')
+    if len(text) > 1 and text[1] == ':':
+        text = f"/mnt/{text[0].lower()}{text[2:]}"
+    return text
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """Symlink src into a sandbox, copying when symlinks are unavailable."""
+    if dst.exists() or dst.is_symlink():
+        return
+    try:
+        os.symlink(src.resolve(), dst, target_is_directory=src.is_dir())
+    except OSError:
+        if src.is_dir():
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy(src, dst)
+
+
+def _prepare_sandbox(sandbox: Path, pdb_path: str, foldx_dir: Path):
+    """
+    Populate a private FoldX working directory.
+
+    The PDB and FoldX's data files (rotabase.txt, molecules/) are linked in,
+    so concurrent runs never share individual_list.txt or *.fxout files.
+    """
+    sandbox.mkdir(parents=True, exist_ok=True)
+    _link_or_copy(Path(pdb_path), sandbox / Path(pdb_path).name)
+    for data_name in ('rotabase.txt', 'molecules'):
+        data_path = foldx_dir / data_name
+        if data_path.exists():
+            _link_or_copy(data_path, sandbox / data_name)
+
+
+def _foldx_command(foldx_exe: str, run_dir: Path, args: List[str]) -> Tuple[List[str], str]:
+    """
+    Build the FoldX command line for running inside run_dir.
+
+    Returns:
+        (cmd, cwd) for subprocess.run; cwd is None for WSL, where the
+        directory change happens inside the bash command
+    """
+    if 'wsl' in foldx_exe.lower() or foldx_exe.endswith('.bat'):
+        # WSL mode: call Linux FoldX next to the wrapper directly via WSL
+        foldx_linux = f"{_to_wsl_path(Path(foldx_exe).resolve().parent)}/foldx_20251231"
+        cmd = [
+            "wsl", "bash", "-c",
+            f"cd '{_to_wsl_path(run_dir)}' && '{foldx_linux}' {' '.join(args)}"
+        ]
+        return cmd, None
+    foldx_exe_abs = os.path.abspath(foldx_exe)
+    if foldx_exe_abs.endswith('.py'):
+        return [sys.executable, foldx_exe_abs] + args, str(run_dir)
+    return [foldx_exe_abs] + args, str(run_dir)
 
 
 def _run_foldx_buildmodel(
@@ -114,76 +220,59 @@ def _run_foldx_buildmodel(
     mutation_file: Path,
     work_dir: str,
     foldx_exe: str = "tools/foldx/foldx_20251231.exe",
-    timeout: int = 300
+    timeout: int = 300,
+    foldx_dir: str = None
 ) -> Dict:
     """
     Run FoldX BuildModel command.
 
-    IMPORTANT: FoldX must run from the FoldX directory (not temp directories).
-    This function uses the FoldX installation directory as working directory.
+    work_dir is used as an isolated sandbox: the PDB and FoldX data files
+    are linked into it, individual_list.txt is written there and FoldX runs
+    with it as working directory, so *.fxout files land directly in
+    work_dir and concurrent runs cannot clash.
 
     Args:
         pdb_path: Path to reference PDB structure
         mutation_file: Path to individual_list.txt
-        work_dir: Output directory for FoldX results (files will be moved here after)
+        work_dir: Sandbox directory for this run (FoldX outputs end up here)
         foldx_exe: Path to FoldX executable (or WSL wrapper)
         timeout: Timeout in seconds (default 300 = 5 minutes)
+        foldx_dir: FoldX installation directory holding rotabase.txt
+                   (default: directory of foldx_exe)
 
     Returns:
         Dict with execution metadata (returncode, stdout, stderr)
     """
-    # FoldX must run from its installation directory
-    # Use tools/foldx/ as working directory
-    foldx_dir = Path("tools/foldx").resolve()
-    pdb_name = Path(pdb_path).name
+    sandbox = Path(work_dir).resolve()
+    foldx_home = Path(foldx_dir or Path(foldx_exe).parent).resolve()
+    _prepare_sandbox(sandbox, pdb_path, foldx_home)
 
-    # Copy PDB to FoldX directory if not already there
-    foldx_pdb = foldx_dir / pdb_name
-    if not foldx_pdb.exists() or foldx_pdb != Path(pdb_path).resolve():
-        shutil.copy(pdb_path, foldx_pdb)
+    list_file = sandbox / "individual_list.txt"
+    if Path(mutation_file).resolve() != list_file:
+        with open(list_file, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(Path(mutation_file).read_text(encoding='utf-8'))
 
-    # Read mutation file content
-    mutation_content = mutation_file.read_text(encoding='utf-8').strip()
+    cmd, run_cwd = _foldx_command(foldx_exe, sandbox, [
+        "--command=BuildModel",
+        f"--pdb={Path(pdb_path).name}",
+        "--mutant-file=individual_list.txt",
+        "--numberOfRuns=1",  # Using 1 run due to FoldX crash with multiple runs
+    ])
 
-    # Detect if using WSL wrapper and construct appropriate command
-    if 'wsl' in foldx_exe.lower() or foldx_exe.endswith('.bat'):
-        # WSL mode: Call Linux FoldX directly via WSL
-        foldx_dir_wsl = str(foldx_dir).replace('\\', '/').replace('C:', '/mnt/c').replace('D:', '/mnt/d')
-        foldx_linux = f"{foldx_dir_wsl}/foldx_20251231"
+    return _run_foldx(cmd, run_cwd, timeout, foldx_exe)
 
-        # CRITICAL: Create individual_list.txt inside bash command to avoid WSL file copy issues
-        # Construct WSL command - run from FoldX directory
-        cmd = [
-            "wsl", "bash", "-c",
-            f"cd '{foldx_dir_wsl}' && echo '{mutation_content}' > individual_list.txt && '{foldx_linux}' --command=BuildModel --pdb={pdb_name} --mutant-file=individual_list.txt --numberOfRuns=1"
-        ]
-        run_cwd = None
-    else:
-        # Native Windows FoldX
-        foldx_exe_abs = os.path.abspath(foldx_exe)
-        cmd = [
-            foldx_exe_abs,
-            "--command=BuildModel",
-            f"--pdb={pdb_name}",
-            "--mutant-file=individual_list.txt",
-            "--numberOfRuns=1",  # Using 1 run due to FoldX crash with multiple runs
-        ]
-        run_cwd = str(foldx_dir)
 
+def _run_foldx(cmd: List[str], cwd: str, timeout: int, foldx_exe: str) -> Dict:
+    """Run a prepared FoldX command; timeouts and a missing binary become returncode -1."""
     try:
         result = subprocess.run(
             cmd,
-            cwd=run_cwd,
+            cwd=cwd,
             capture_output=True,
             text=True,
             timeout=timeout
         )
 
-        # Move output files to work_dir for parsing
-        if result.returncode == 0:
-            for fxout_file in foldx_dir.glob("*.fxout"):
-                shutil.move(str(fxout_file), Path(work_dir) / fxout_file.name)
-
         return {
             'returncode': result.returncode,
             'stdout': result.stdout,
@@ -204,96 +293,230 @@ def _run_foldx_buildmodel(
         }
 
 
-def _parse_foldx_output(work_dir: str) -> Dict[str, float]:
+def _file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents, memoised on (path, size, mtime)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _FILE_HASHES:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _FILE_HASHES[memo_key] = digest.hexdigest()
+    return _FILE_HASHES[memo_key]
+
+
+def _foldx_version(foldx_exe: str) -> str:
     """
-    Parse FoldX output files to extract ΔΔG values.
+    Identify the FoldX build behind foldx_exe.
 
-    FoldX creates files:
-    - Average_<PDB>.fxout: Contains average ΔΔG across runs
-    - Dif_<PDB>.fxout: Contains detailed energy differences
+    Hashes the binary itself (for the WSL wrapper, the Linux binary next to
+    it), so upgrading FoldX invalidates cached structures.
+    """
+    binary = Path(foldx_exe)
+    if 'wsl' in foldx_exe.lower() or foldx_exe.endswith('.bat'):
+        binary = binary.parent / "foldx_20251231"
+    if binary.exists():
+        return f"{binary.name}:{_file_sha256(str(binary))[:16]}"
+    return binary.name
 
-    Args:
-        work_dir: FoldX working directory
 
-    Returns:
-        Dict mapping mutation IDs to ΔΔG values
+def prepare_structure(pdb_path: str, chain: str, foldx_exe: str, cfg: dict) -> str:
     """
-    ddg_dict = {}
+    Return a RepairPDB-optimised copy of pdb_path, repairing at most once.
 
-    # Look for Average_*.fxout files
-    work_path = Path(work_dir)
-    avg_files = list(work_path.glob("Average_*.fxout"))
+    Repaired models are cached under cfg['foldx_cache_dir'] keyed by
+    (PDB content hash, chain, FoldX version), so every BuildModel job and
+    every later run reuses the same structure. If RepairPDB fails the
+    original PDB is returned with a warning.
 
-    if not avg_files:
-        # No output files found, return empty
-        return ddg_dict
+    Args:
+        pdb_path: Reference PDB structure
+        chain: PDB chain identifier
+        foldx_exe: Path to FoldX executable (or WSL wrapper)
+        cfg: Configuration dict (foldx_cache_dir, foldx_dir, foldx_repair_timeout)
 
-    # Parse first Average file (usually only one)
-    avg_file = avg_files[0]
+    Returns:
+        Path to the repaired PDB (or pdb_path on failure)
+    """
+    key_text = f"{_file_sha256(pdb_path)}|{chain}|{_foldx_version(foldx_exe)}"
+    key = hashlib.sha256(key_text.encode('utf-8')).hexdigest()[:20]
+    stem = Path(pdb_path).stem
+    cache_dir = Path(cfg.get('foldx_cache_dir', 'cache/foldx')) / 'repaired' / key
+    repaired = cache_dir / f"{stem}_Repair.pdb"
+    if repaired.exists():
+        return str(repaired)
+
+    print(f"[INFO] Running FoldX RepairPDB on {pdb_path} (chain {chain})...")
+    timeout = cfg.get('foldx_repair_timeout', 1800)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='foldx_repair_', dir=cfg.get('foldx_sandbox_root')) as tmpdir:
+        sandbox = Path(tmpdir).resolve()
+        foldx_home = Path(cfg.get('foldx_dir') or Path(foldx_exe).parent).resolve()
+        _prepare_sandbox(sandbox, pdb_path, foldx_home)
+        cmd, run_cwd = _foldx_command(foldx_exe, sandbox, [
+            "--command=RepairPDB",
+            f"--pdb={Path(pdb_path).name}",
+        ])
+        result = _run_foldx(cmd, run_cwd, timeout, foldx_exe)
+        output = sandbox / f"{stem}_Repair.pdb"
+        if result['returncode'] != 0 or not output.exists():
+            print(f"[WARN] FoldX RepairPDB failed, using unrepaired PDB: {result['stderr'][:200]}")
+            return pdb_path
+        # Publish atomically: concurrent runs may race to fill the same entry
+        tmp = repaired.with_name(f"{repaired.name}.{os.getpid()}.tmp")
+        shutil.copy(output, tmp)
+        os.replace(tmp, repaired)
+
+    (cache_dir / 'source.txt').write_text(
+        f"pdb: {os.path.abspath(pdb_path)}\nchain: {chain}\nkey: {key_text}\n", encoding='utf-8')
+    print(f"[OK] Repaired structure cached: {repaired}")
+    return str(repaired)
+
+
+def _term_name(column: str) -> str:
+    """FoldX column header -> term key ("Van der Waals" -> "van_der_waals")."""
+    name = column.strip().lower().replace(' ', '_')
+    return 'total' if name == 'total_energy' else name
+
+
+# Column layout assumed when an fxout file has no "Pdb ..." header line
+_DEFAULT_COLUMNS = {
+    'Average': ['pdb', 'sd', 'total'],
+    'Dif': ['pdb', 'total'],
+    'Raw': ['pdb', 'total'],
+}
+
+
+def iter_fxout_rows(path, kind: str = 'Dif') -> Iterator[Tuple[str, np.ndarray, List[str]]]:
+    """
+    Stream the data rows of a FoldX .fxout file.
 
-    try:
-        lines = avg_file.read_text(encoding='utf-8').splitlines()
+    The file is read line by line, so memory stays bounded however many
+    models a batched run produced. Banner lines before the "Pdb ..." header
+    are skipped; the SD column of Average files is dropped.
 
-        for line in lines:
-            if not line.strip() or line.startswith('#'):
-                continue
+    Args:
+        path: fxout file
+        kind: 'Average', 'Dif' or 'Raw' (sets the fallback column layout)
 
-            parts = line.split('\t')
-            if len(parts) < 3:
+    Yields:
+        (row name, float values, term names) per data row
+    """
+    columns = list(_DEFAULT_COLUMNS[kind])
+    keep = None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.rstrip('\r\n').split('\t')
+            if parts[0].strip() == 'Pdb':
+                columns = [_term_name(c) for c in parts]
+                keep = None
                 continue
-
-            # Format: PDB_name    mutation_id    ddG    ...
-            mutation_id = parts[1].strip()
+            if len(parts) < len(columns) or not parts[0]:
+                continue
+            if keep is None:
+                keep = [i for i, name in enumerate(columns) if i > 0 and name != 'sd']
+                terms = [columns[i] for i in keep]
             try:
-                ddg_value = float(parts[2].strip())
-                ddg_dict[mutation_id] = ddg_value
-            except (ValueError, IndexError):
+                values = np.array([float(parts[i]) for i in keep])
+            except ValueError:
                 continue
+            yield parts[0].strip(), values, terms
 
-    except Exception as e:
-        print(f"[WARN] Failed to parse FoldX output: {e}")
 
-    return ddg_dict
+def read_fxout_table(work_dir: str, pdb_name: str) -> pd.DataFrame:
+    """
+    Per-model energy terms of a BuildModel run as a columnar table.
+
+    Reads Average_<PDB>.fxout if present, else Dif_<PDB>.fxout (averaged
+    over runs), else Raw_<PDB>.fxout (mutant minus WT, averaged over runs).
+    Rows are streamed and reduced per model, so only the table itself is
+    held in memory.
+
+    Args:
+        work_dir: FoldX working directory
+        pdb_name: PDB file name passed to --pdb (e.g. "5XJH.pdb")
+
+    Returns:
+        DataFrame indexed by model number k (line k of individual_list.txt)
+        with a 'total' column (ΔΔG) and one column per energy term; empty
+        if no output could be read
+    """
+    stem = Path(pdb_name).stem
+    work_path = Path(work_dir)
+    for kind in ('Average', 'Dif', 'Raw'):
+        fxout = work_path / f"{kind}_{stem}.fxout"
+        if not fxout.exists():
+            continue
+        sums = {}
+        terms = []
+        try:
+            for name, values, terms in iter_fxout_rows(fxout, kind):
+                sign = 1.0
+                if name.startswith(f"WT_{stem}_"):
+                    if kind != 'Raw':
+                        continue
+                    name, sign = name[3:], -1.0
+                if not name.startswith(f"{stem}_"):
+                    continue
+                # "<stem>_<k>" (Average) or "<stem>_<k>_<run>.pdb" (Dif/Raw)
+                k = int(name[len(stem) + 1:].split('_')[0].split('.')[0])
+                total, counts = sums.get(k, (np.zeros(len(values)), [0, 0]))
+                counts[0 if sign > 0 else 1] += 1
+                sums[k] = (total + sign * values, counts)
+        except Exception as e:
+            print(f"[WARN] Failed to parse FoldX output {fxout.name}: {e}")
+            continue
+        if not sums:
+            continue
+        models = sorted(sums)
+        # Dif/Raw hold one row per run: average them (Raw: mutant and WT alike)
+        table = np.vstack([sums[k][0] / max(sums[k][1][0], 1) for k in models])
+        return pd.DataFrame(table, index=pd.Index(models, name='model'), columns=terms)
+
+    return pd.DataFrame()
 
 
-def _get_pdb_range(pdb_path: str, chain: str = 'A') -> tuple:
+def _parse_batch_output(work_dir: str, pdb_name: str) -> Dict[int, Dict[str, float]]:
+    """
+    Parse per-line energy terms of a batched BuildModel run.
+
+    Args:
+        work_dir: FoldX working directory
+        pdb_name: PDB file name passed to --pdb (e.g. "5XJH.pdb")
+
+    Returns:
+        Dict mapping line number k to {'total': ΔΔG, <term>: value, ...}
+    """
+    table = read_fxout_table(work_dir, pdb_name)
+    return {int(k): {term: float(v) for term, v in row.items()}
+            for k, row in zip(table.index, table.to_dict('records'))}
+
+
+def _get_pdb_range(pdb_path: str, chain: str = 'A', cache_dir: str = None) -> tuple:
     """
     Get the residue numbering range from PDB file.
 
     Args:
         pdb_path: Path to PDB structure file
         chain: Chain identifier
+        cache_dir: Structure index cache directory (None = in-process only)
 
     Returns:
         Tuple of (first_residue, last_residue, offset)
         e.g., (30, 292, 29) means PDB numbered 30-292, offset +29
     """
     try:
-        from Bio.PDB import PDBParser
-
-        parser = PDBParser(QUIET=True)
-        structure = parser.get_structure('protein', pdb_path)
-
-        for model in structure:
-            for pdb_chain in model:
-                if pdb_chain.id == chain:
-                    residue_numbers = []
-                    for residue in pdb_chain:
-                        if residue.id[0] == ' ':  # Standard residue
-                            residue_numbers.append(residue.id[1])
-
-                    if residue_numbers:
-                        first_res = min(residue_numbers)
-                        last_res = max(residue_numbers)
-                        offset = first_res - 1
-                        return (first_res, last_res, offset)
+        index = load_structure_index(pdb_path, chain, cache_dir)
+        if len(index):
+            return (index.first_res, index.last_res, index.offset)
     except Exception as e:
         print(f"[WARN] Could not determine PDB range: {e}")
 
     return (1, 999999, 0)  # Default: no filtering
 
 
-def _get_pdb_offset(pdb_path: str, chain: str = 'A') -> int:
+def _get_pdb_offset(pdb_path: str, chain: str = 'A', cache_dir: str = None) -> int:
     """
     Get the residue numbering offset from PDB file.
 
@@ -303,60 +526,35 @@ def _get_pdb_offset(pdb_path: str, chain: str = 'A') -> int:
     Args:
         pdb_path: Path to PDB structure file
         chain: Chain identifier
+        cache_dir: Structure index cache directory (None = in-process only)
 
     Returns:
         Offset to add to sequence positions (e.g., 29 if PDB starts at residue 30)
     """
     try:
-        from Bio.PDB import PDBParser
-
-        parser = PDBParser(QUIET=True)
-        structure = parser.get_structure('protein', pdb_path)
-
-        for model in structure:
-            for pdb_chain in model:
-                if pdb_chain.id == chain:
-                    for residue in pdb_chain:
-                        if residue.id[0] == ' ':  # First standard residue
-                            first_residue_num = residue.id[1]
-                            offset = first_residue_num - 1
-                            return offset
+        index = load_structure_index(pdb_path, chain, cache_dir)
+        if len(index):
+            return index.offset
     except Exception as e:
         print(f"[WARN] Could not determine PDB offset: {e}")
 
     return 0  # Default: no offset
 
 
-def _extract_wt_sequence_from_pdb(pdb_path: str, chain: str = 'A') -> str:
+def _extract_wt_sequence_from_pdb(pdb_path: str, chain: str = 'A', cache_dir: str = None) -> str:
     """
     Extract wild-type amino acid sequence from PDB file.
 
     Args:
         pdb_path: Path to PDB structure file
         chain: Chain identifier to extract
+        cache_dir: Structure index cache directory (None = in-process only)
 
     Returns:
         Wild-type amino acid sequence
     """
     try:
-        from Bio.PDB import PDBParser
-        from Bio.PDB.Polypeptide import protein_letters_3to1
-
-        parser = PDBParser(QUIET=True)
-        structure = parser.get_structure('protein', pdb_path)
-
-        for model in structure:
-            for pdb_chain in model:
-                if pdb_chain.id == chain:
-                    sequence = []
-                    for residue in pdb_chain:
-                        if residue.id[0] == ' ':  # Standard amino acid
-                            resname_upper = residue.resname.upper()
-                            if resname_upper in protein_letters_3to1:
-                                aa = protein_letters_3to1[resname_upper]
-                                sequence.append(aa)
-                    return ''.join(sequence)
-
+        return load_structure_index(pdb_path, chain, cache_dir).sequence
     except Exception as e:
         print(f"[WARN] Could not extract sequence from PDB: {e}")
 
@@ -373,8 +571,38 @@ def ddg_foldx_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]
             - foldx_exe: Path to FoldX executable
             - foldx_pdb: Path to reference PDB structure
             - foldx_wt_seq: Wild-type sequence (optional, auto-extract from PDB)
-            - foldx_timeout: Timeout per variant in seconds (default 300)
+            - foldx_timeout: Timeout per variant in seconds (default 300); with
+              foldx_adaptive_timeout (default True) and at least
+              foldx_timeout_min_samples stored runtimes, variants get
+              foldx_timeout_factor x the foldx_timeout_quantile runtime per
+              mutation instead, never below foldx_timeout_min
+            - foldx_retries / foldx_retry_backoff: Retries of transient
+              single-variant failures and base backoff seconds (default 1 / 2.0)
             - foldx_chain: PDB chain identifier (default 'A')
+            - foldx_workers: Concurrent FoldX processes (default 1)
+            - foldx_batch_size: Variants per FoldX process (default 1)
+            - foldx_repair: Run BuildModel on a cached RepairPDB model (default True)
+            - foldx_cache_dir: Cache directory for repaired structures and the
+              ΔΔG store (default cache/foldx)
+            - foldx_store: Look up / record results in the ΔΔG store (default True)
+            - foldx_mutation_source: 'header' (mutation codes in seq_id),
+              'alignment' (compare sequences to the PDB chain) or 'auto'
+              (header codes if present, else alignment; default)
+            - foldx_min_identity: Minimum identity to the PDB chain for
+              alignment-based calling (default 0.5)
+            - foldx_mode: 'buildmodel' (every variant) or 'additive' (sum of the
+              single-mutant saturation matrix; default 'buildmodel')
+            - foldx_saturation_scope: 'variants' (positions in the library) or
+              'all' (whole chain) for the additive matrix (default 'variants')
+            - foldx_refine_top_n: Additive mode: re-run the N most stabilising
+              multi-mutants with BuildModel (default 0)
+            - foldx_refine_divergence: Additive mode: re-run multi-mutants at
+              positions whose stored results deviated from additivity by more
+              than this many kcal/mol (default off)
+            - foldx_dir: FoldX data directory with rotabase.txt (default: exe directory)
+            - foldx_sandbox_root: Parent directory for per-run sandboxes (default: system temp)
+            - structure_cache_dir: Cache directory for parsed structure indexes
+              (default cache/structures)
 
     Returns:
         Dict mapping seq_id to ΔΔG score (negative = stabilizing, positive = destabilizing)
@@ -385,51 +613,107 @@ def ddg_foldx_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]
         >>> ddg_foldx_scores(seqs, cfg)
         {'WT': 0.0, 'S121E': -1.23}
     """
+    return ddg_foldx_channels(seqs, cfg).get('ddg_foldx', {})
+
+
+def ddg_foldx_channels(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, Dict[str, float]]:
+    """
+    ΔΔG plus per-energy-term stability sub-channels from one FoldX pass.
+
+    Args:
+        seqs: List of (seq_id, sequence) tuples
+        cfg: Configuration dict as for ddg_foldx_scores, plus
+            - foldx_term_channels: FoldX energy terms to expose as
+              'foldx_<term>' channels (e.g. ['van_der_waals', 'backbone_clash'])
+
+    Returns:
+        {'ddg_foldx': {seq_id: ΔΔG}, 'foldx_<term>': {seq_id: value}, ...};
+        empty if FoldX could not run. Missing terms are 0.0 (neutral), like
+        failed variants.
+    """
+    variant_terms = _variant_terms(seqs, cfg)
+    if variant_terms is None:
+        return {}
+    channels = {'ddg_foldx': {sid: variant_terms[sid].get('total', 0.0) for sid, _ in seqs}}
+    for term in cfg.get('foldx_term_channels') or []:
+        channels[f'foldx_{term}'] = {sid: variant_terms[sid].get(term, 0.0) for sid, _ in seqs}
+    return channels
+
+
+def _variant_terms(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, Dict[str, float]]:
+    """
+    FoldX energy terms per variant ({'total': ΔΔG, <term>: value, ...}).
+
+    See ddg_foldx_scores for the configuration keys. Returns None when
+    FoldX cannot run at all (missing executable, PDB or WT sequence).
+    """
     if not seqs:
         return {}
 
     # Extract configuration
     foldx_exe = cfg.get('foldx_exe', 'tools/foldx/foldx_20251231.exe')
     pdb_path = cfg.get('foldx_pdb', 'tools/foldx/5XJH.pdb')
-    timeout = cfg.get('foldx_timeout', 300)
     chain = cfg.get('foldx_chain', 'A')
+    structure_cache = cfg.get('structure_cache_dir', 'cache/structures')
 
     # Check FoldX executable exists
     if not os.path.exists(foldx_exe):
         print(f"[ERROR] FoldX executable not found: {foldx_exe}")
-        return {}
+        return None
 
     # Check PDB exists
     if not os.path.exists(pdb_path):
         print(f"[ERROR] Reference PDB not found: {pdb_path}")
-        return {}
+        return None
 
     # Get wild-type sequence
     wt_seq = cfg.get('foldx_wt_seq')
     if not wt_seq:
         print("[INFO] Extracting WT sequence from PDB...")
-        wt_seq = _extract_wt_sequence_from_pdb(pdb_path, chain)
+        wt_seq = _extract_wt_sequence_from_pdb(pdb_path, chain, structure_cache)
 
     if not wt_seq:
         print("[ERROR] Could not determine wild-type sequence")
-        return {}
+        return None
 
     print(f"[INFO] Wild-type sequence: {len(wt_seq)} aa")
 
     # Get PDB residue numbering range
-    first_res, last_res, pdb_offset = _get_pdb_range(pdb_path, chain)
+    first_res, last_res, pdb_offset = _get_pdb_range(pdb_path, chain, structure_cache)
     print(f"[INFO] PDB numbering: {first_res}-{last_res}")
 
-    # Process each variant
-    ddg_results = {}
+    # Mutation source: FASTA header codes, alignment to the PDB chain, or
+    # header codes where present and alignment for the rest ('auto')
+    source = cfg.get('foldx_mutation_source', 'auto')
+    header_calls = {}
+    for seq_id, _ in seqs:
+        # NOTE: Mutation codes in FASTA headers (e.g., S121E) already use PDB residue numbering!
+        # Do NOT apply additional offset - they are PDB-compatible positions
+        # (e.g., "FAST_PETase|S121E_D186H_R224Q_N233K_R280E")
+        header_calls[seq_id] = _parse_mutations_from_id(seq_id, chain, pdb_offset=0) \
+            if source != 'alignment' else []
+    to_align = [(seq_id, seq) for seq_id, seq in seqs
+                if source != 'header' and not header_calls[seq_id]]
+    aligned_calls = {}
+    if to_align:
+        try:
+            index = load_structure_index(pdb_path, chain, structure_cache)
+            aligned_calls = _call_mutations_by_alignment(
+                to_align, index, chain, cfg.get('foldx_min_identity', 0.5),
+                cfg.get('mapping_min_identity', 0.9))
+        except Exception as e:
+            print(f"[WARN] Alignment-based mutation calling failed: {e}")
+
+    # ΔΔG is only meaningful on a repaired structure; repair once and reuse
+    if cfg.get('foldx_repair', True):
+        pdb_path = prepare_structure(pdb_path, chain, foldx_exe, cfg)
 
+    # Resolve mutations for each variant; WT-like variants need no FoldX run
+    ddg_results = {}
+    jobs = []
     for seq_id, mut_seq in seqs:
         try:
-            # Parse mutations from sequence ID
-            # NOTE: Mutation codes in FASTA headers (e.g., S121E) already use PDB residue numbering!
-            # Do NOT apply additional offset - they are PDB-compatible positions
-            # (e.g., "FAST_PETase|S121E_D186H_R224Q_N233K_R280E")
-            all_mutations = _parse_mutations_from_id(seq_id, chain, pdb_offset=0)
+            all_mutations = header_calls[seq_id] or aligned_calls.get(seq_id) or []
 
             # Filter mutations to only include those within PDB range
             mutations = []
@@ -449,47 +733,488 @@ def ddg_foldx_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]
 
             # Wild-type has ΔΔG = 0.0
             if not mutations:
-                ddg_results[seq_id] = 0.0
+                ddg_results[seq_id] = {'total': 0.0}
                 print(f"[INFO] {seq_id}: WT (ΔΔG = 0.0)")
                 continue
 
             print(f"[INFO] {seq_id}: {len(mutations)} mutations - {', '.join(mutations[:5])}")
+            jobs.append((seq_id, mutations))
 
-            # Create temp directory for FoldX
-            with tempfile.TemporaryDirectory() as tmpdir:
-                # Create individual_list.txt
-                mut_file = Path(tmpdir) / "individual_list.txt"
-                _create_individual_list(mutations, mut_file)
-
-                # Run FoldX BuildModel
-                result = _run_foldx_buildmodel(
-                    pdb_path=pdb_path,
-                    mutation_file=mut_file,
-                    work_dir=tmpdir,
-                    foldx_exe=foldx_exe,
-                    timeout=timeout
-                )
-
-                if result['returncode'] != 0:
-                    print(f"[WARN] FoldX failed for {seq_id}: {result['stderr'][:200]}")
-                    # Assign neutral ΔΔG for failed runs
-                    ddg_results[seq_id] = 0.0
-                    continue
+        except Exception as e:
+            print(f"[ERROR] Failed to process {seq_id}: {e}")
+            ddg_results[seq_id] = {'total': 0.0}
 
-                # Parse output
-                ddg_dict = _parse_foldx_output(tmpdir)
+    if cfg.get('foldx_mode', 'buildmodel') == 'additive':
+        variant_terms = {seq_id: {'total': total} for seq_id, total in
+                         _additive_scores(jobs, pdb_path, chain, foldx_exe, cfg).items()}
+    else:
+        variant_terms = _buildmodel_many(jobs, pdb_path, chain, foldx_exe, cfg)
+    for seq_id, _ in jobs:
+        terms = variant_terms.get(seq_id) or {}
+        total = terms.get('total')
+        # Assign neutral ΔΔG for failed runs
+        if total is None or np.isnan(total):
+            terms = {}
+        ddg_results[seq_id] = dict(terms, total=float(total)) if terms else {'total': 0.0}
 
-                if ddg_dict:
-                    # Take first result (usually only one entry)
-                    ddg_value = list(ddg_dict.values())[0]
-                    ddg_results[seq_id] = ddg_value
-                    print(f"[INFO] {seq_id}: ΔΔG = {ddg_value:.2f} kcal/mol")
-                else:
-                    print(f"[WARN] No ΔΔG output for {seq_id}")
-                    ddg_results[seq_id] = 0.0
+    # Report in input order regardless of completion order
+    return {seq_id: ddg_results.get(seq_id, {'total': 0.0}) for seq_id, _ in seqs}
 
-        except Exception as e:
-            print(f"[ERROR] Failed to process {seq_id}: {e}")
-            ddg_results[seq_id] = 0.0
 
-    return ddg_results
+def _store_context(pdb_path: str, foldx_exe: str) -> Tuple[str, str]:
+    """(structure hash, FoldX settings) identifying results in the ΔΔG store."""
+    return _file_sha256(pdb_path), f"{_foldx_version(foldx_exe)}|BuildModel|numberOfRuns=1"
+
+
+class _CostModel:
+    """
+    FoldX runtime expectations learned from the ΔΔG store.
+
+    Each stored run's wall time is shared equally among its mutations and
+    the shares are pooled per (chain, residue) position, since BuildModel
+    time is dominated by how much has to be repacked around each site. A
+    job's cost is the sum of the median share at each of its positions,
+    with the overall median seconds per mutation for positions never seen
+    before; it drives longest-job-first ordering. A high quantile of the
+    per-mutation share gives the adaptive timeout. Without history, cost
+    falls back to the mutation count and the timeout to foldx_timeout.
+    """
+
+    def __init__(self, history: List[Tuple[List[str], float]], cfg: dict):
+        shares = []
+        by_position = {}
+        for mutations, rt in history:
+            if not mutations or not rt:
+                continue
+            share = rt / len(mutations)
+            shares.append(share)
+            for mutation in mutations:
+                by_position.setdefault(_mutation_site(mutation), []).append(share)
+        per_mutation = np.array(shares, dtype=np.float64)
+        self.max_timeout = float(cfg.get('foldx_timeout', 300))
+        self.per_mutation = float(np.median(per_mutation)) if len(per_mutation) else None
+        self.per_position = {site: float(np.median(values))
+                             for site, values in by_position.items() if site is not None}
+        self.limit = None
+        if cfg.get('foldx_adaptive_timeout', True) and \
+                len(per_mutation) >= int(cfg.get('foldx_timeout_min_samples', 20)):
+            self.limit = float(np.quantile(per_mutation, cfg.get('foldx_timeout_quantile', 0.99)))
+        self.factor = float(cfg.get('foldx_timeout_factor', 3.0))
+        self.min_timeout = float(cfg.get('foldx_timeout_min', 30))
+
+    def cost(self, mutations: List[str]) -> float:
+        """Expected seconds (or relative cost without history) of one job."""
+        fallback = self.per_mutation or 1.0
+        return sum(self.per_position.get(_mutation_site(m), fallback) for m in mutations)
+
+    def timeout(self, mutations: List[str]) -> float:
+        """Per-variant timeout: factor x quantile runtime, within [min, foldx_timeout]."""
+        if self.limit is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.factor * self.limit * len(mutations)))
+
+
+def _mutation_site(mutation: str):
+    """"SA121E" -> ("A", 121); None for strings that are not FoldX mutations."""
+    try:
+        return mutation[1], int(mutation[2:-1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _schedule_batches(
+    jobs: List[Tuple[str, List[str]]],
+    costs: Dict[str, float],
+    batch_size: int
+) -> List[List[Tuple[str, List[str]]]]:
+    """
+    Longest-job-first batches.
+
+    Jobs are sorted by descending cost and chunked, so the heaviest
+    variants are dispatched first and the cheap ones fill in at the end,
+    keeping the parallel makespan close to total cost / workers.
+    """
+    ordered = sorted(jobs, key=lambda job: -costs[job[0]])
+    batches = [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+    return sorted(batches, key=lambda batch: -sum(costs[label] for label, _ in batch))
+
+
+def _buildmodel_many(
+    jobs: List[Tuple[str, List[str]]],
+    pdb_path: str,
+    chain: str,
+    foldx_exe: str,
+    cfg: dict
+) -> Dict[str, Dict[str, float]]:
+    """
+    BuildModel energy terms for many mutation sets.
+
+    Consults the ΔΔG store first; identical mutation sets are modelled
+    once. The rest are packed into longest-job-first batches with
+    per-variant timeouts learned from stored runtimes, run on the worker
+    pool and written back to the store.
+
+    Args:
+        jobs: List of (label, mutations) tuples; labels must be unique
+        pdb_path: Structure to mutate (normally the repaired model)
+
+    Returns:
+        Dict mapping label to {'total': ΔΔG, <term>: value, ...}, or {} for
+        mutation sets FoldX could not model
+    """
+    workers = max(1, int(cfg.get('foldx_workers', 1)))
+    foldx_dir = cfg.get('foldx_dir')
+    sandbox_root = cfg.get('foldx_sandbox_root')
+    if sandbox_root:
+        os.makedirs(sandbox_root, exist_ok=True)
+    retry = (int(cfg.get('foldx_retries', 1)), float(cfg.get('foldx_retry_backoff', 2.0)))
+
+    # Consult the ΔΔG store; identical mutation sets are modelled once
+    store = get_store(cfg)
+    structure_hash, settings = _store_context(pdb_path, foldx_exe)
+    keys = {label: store_key(structure_hash, chain, mutations, settings)
+            for label, mutations in jobs}
+    cached = store.get_many(list(keys.values())) if store is not None else {}
+    results = {}
+    owners = {}
+    pending = []
+    for label, mutations in jobs:
+        key = keys[label]
+        if key in cached:
+            results[label] = dict(cached[key]['terms'], total=cached[key]['total'])
+        elif key in owners:
+            owners[key].append(label)
+        else:
+            owners[key] = [label]
+            pending.append((label, mutations))
+    if store is not None and jobs:
+        print(f"[INFO] ΔΔG store: {len(results)}/{len(jobs)} mutation sets cached")
+    jobs = pending
+
+    # Pack variants into batches so each FoldX process amortises its startup
+    # (PDB, rotamer library, parameters) over many models, while still
+    # giving every worker something to do.
+    batch_size = max(1, int(cfg.get('foldx_batch_size', 1)))
+    if jobs:
+        batch_size = min(batch_size, -(-len(jobs) // workers))
+    model = _CostModel(store.runtimes(structure_hash, settings) if store is not None else [], cfg)
+    costs = {label: model.cost(mutations) for label, mutations in jobs}
+    timeouts = {label: model.timeout(mutations) for label, mutations in jobs}
+    batches = _schedule_batches(jobs, costs, batch_size)
+
+    if jobs:
+        adaptive = f", adaptive timeouts up to {max(timeouts.values()):.0f}s" if model.limit else ""
+        print(f"[INFO] Running {len(jobs)} FoldX jobs in {len(batches)} batches "
+              f"on {min(workers, len(batches))} workers (longest first{adaptive})")
+
+    # FoldX runs are external processes, so threads are enough to keep
+    # `workers` of them busy; each runs in its own sandbox directory.
+    # Submission order is dispatch order, so the heaviest batches start first.
+    mutation_sets = dict(jobs)
+    new_entries = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_run_batch, batch, pdb_path, foldx_exe,
+                        timeouts, foldx_dir, sandbox_root, retry): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                batch_results = {}
+                for label, _ in futures[future]:
+                    print(f"[ERROR] Failed to process {label}: {e}")
+            for label, _ in futures[future]:
+                outcome = batch_results.get(label) or {}
+                terms = outcome.get('terms') or {}
+                key = keys[label]
+                for owner in owners[key]:
+                    results[owner] = terms
+                if terms:
+                    new_entries.append({
+                        'key': key, 'structure': structure_hash, 'chain': chain,
+                        'mutations': mutation_sets[label], 'settings': settings,
+                        'total': terms['total'], 'terms': terms,
+                        'runtime': outcome.get('runtime'),
+                    })
+
+    # Failed runs are not stored, so they are retried next time
+    if store is not None and new_entries:
+        store.put_many(new_entries)
+
+    return results
+
+
+def _split_foldx_mutation(mutation: str) -> Tuple[str, str, int, str]:
+    """"SA121E" -> ("S", "A", 121, "E")."""
+    return mutation[0], mutation[1], int(mutation[2:-1]), mutation[-1]
+
+
+def saturation_matrix(
+    pdb_path: str,
+    chain: str,
+    foldx_exe: str,
+    cfg: dict,
+    positions: List[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Position × 20 single-mutant ΔΔG matrix for a structure.
+
+    Every single substitution is modelled with batched, parallel BuildModel
+    runs through the ΔΔG store, so the full scan is paid once per
+    (structure, FoldX settings) and later calls are store lookups.
+
+    Args:
+        pdb_path: Structure to scan (normally the repaired model)
+        chain: PDB chain identifier
+        foldx_exe: Path to FoldX executable (or WSL wrapper)
+        cfg: Configuration dict (FoldX worker/batch/store settings)
+        positions: PDB residue numbers to scan (default: every residue of chain)
+
+    Returns:
+        (resnums, matrix): int array (P,) and float array (P, 20) with
+        columns in AA_ORDER; the WT column is 0.0, failed singles are NaN
+    """
+    residues = dict(load_structure_index(pdb_path, chain, cfg.get('structure_cache_dir')).residues())
+    if positions is None:
+        positions = sorted(residues)
+    resnums = np.array([p for p in positions if p in residues], dtype=np.int64)
+
+    matrix = np.zeros((len(resnums), len(AA_ORDER)), dtype=np.float64)
+    jobs = []
+    cells = {}
+    for row, resnum in enumerate(resnums):
+        wt_aa = residues[int(resnum)]
+        for col, aa in enumerate(AA_ORDER):
+            if aa != wt_aa:
+                mutation = f"{wt_aa}{chain}{resnum}{aa}"
+                jobs.append((mutation, [mutation]))
+                cells[mutation] = (row, col)
+
+    print(f"[INFO] Saturation matrix: {len(resnums)} positions, {len(jobs)} single mutants")
+    for mutation, terms in _buildmodel_many(jobs, pdb_path, chain, foldx_exe, cfg).items():
+        matrix[cells[mutation]] = terms.get('total', np.nan)
+    return resnums, matrix
+
+
+def additive_ddg(resnums: np.ndarray, matrix: np.ndarray, mutation_sets: List[List[str]]) -> np.ndarray:
+    """
+    Additive ΔΔG estimates: sum of single-mutant matrix entries per set.
+
+    Positions or residues missing from the matrix give NaN.
+
+    Returns:
+        float array (len(mutation_sets),)
+    """
+    row_of = {int(r): i for i, r in enumerate(resnums)}
+    owners, rows, cols = [], [], []
+    for k, mutations in enumerate(mutation_sets):
+        for mutation in mutations:
+            _, _, pos, aa = _split_foldx_mutation(mutation)
+            owners.append(k)
+            rows.append(row_of.get(pos, -1))
+            cols.append(AA_ORDER.find(aa))
+    owners = np.asarray(owners, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    valid = (rows >= 0) & (cols >= 0)
+    values = np.full(len(owners), np.nan)
+    values[valid] = matrix[rows[valid], cols[valid]]
+    return np.bincount(owners, weights=values, minlength=len(mutation_sets))
+
+
+def _divergent_positions(
+    pdb_path: str,
+    chain: str,
+    foldx_exe: str,
+    cfg: dict,
+    threshold: float
+) -> set:
+    """
+    Positions whose stored multi-mutant ΔΔG departed from the additive sum.
+
+    Every multi-mutant already modelled on this structure whose singles are
+    also stored is compared with its additive estimate; positions of sets
+    with |true - additive| above threshold are returned. Only the store is
+    read, no FoldX runs are launched.
+    """
+    store = get_store(cfg)
+    if store is None:
+        return set()
+    structure_hash, settings = _store_context(pdb_path, foldx_exe)
+    history = [(m, total) for m, total in store.entries(structure_hash, chain, settings)
+               if len(m) > 1]
+    if not history:
+        return set()
+
+    residues = dict(load_structure_index(pdb_path, chain, cfg.get('structure_cache_dir')).residues())
+    single_keys = {}
+    for mutations, _ in history:
+        for mutation in mutations:
+            _, _, pos, aa = _split_foldx_mutation(mutation)
+            if pos in residues:
+                single = f"{residues[pos]}{chain}{pos}{aa}"
+                single_keys[(pos, aa)] = store_key(structure_hash, chain, [single], settings)
+    singles = store.get_many(list(single_keys.values()))
+
+    divergent = set()
+    for mutations, total in history:
+        parts = [_split_foldx_mutation(m) for m in mutations]
+        hits = [singles.get(single_keys.get((pos, aa))) for _, _, pos, aa in parts]
+        if all(hits) and abs(total - sum(h['total'] for h in hits)) > threshold:
+            divergent.update(pos for _, _, pos, _ in parts)
+    return divergent
+
+
+def _additive_scores(
+    jobs: List[Tuple[str, List[str]]],
+    pdb_path: str,
+    chain: str,
+    foldx_exe: str,
+    cfg: dict
+) -> Dict[str, float]:
+    """
+    Score variants from the saturation matrix, refining selected ones.
+
+    Multi-mutants are estimated additively. Real BuildModel runs replace
+    the estimate for variants with missing singles, the foldx_refine_top_n
+    most stabilising multi-mutants, and multi-mutants touching a position
+    whose stored results diverged from additivity by more than
+    foldx_refine_divergence kcal/mol.
+    """
+    if not jobs:
+        return {}
+    scope = cfg.get('foldx_saturation_scope', 'variants')
+    positions = None if scope == 'all' else sorted(
+        {_split_foldx_mutation(m)[2] for _, mutations in jobs for m in mutations})
+    resnums, matrix = saturation_matrix(pdb_path, chain, foldx_exe, cfg, positions)
+
+    estimates = additive_ddg(resnums, matrix, [mutations for _, mutations in jobs])
+    totals = {seq_id: float(v) for (seq_id, _), v in zip(jobs, estimates)}
+
+    multi = [(seq_id, mutations) for seq_id, mutations in jobs if len(mutations) > 1]
+    refine = {seq_id for seq_id, _ in multi if np.isnan(totals[seq_id])}
+    top_n = int(cfg.get('foldx_refine_top_n', 0))
+    if top_n > 0:
+        ranked = sorted((totals[s], s) for s, _ in multi if not np.isnan(totals[s]))
+        refine.update(s for _, s in ranked[:top_n])
+    threshold = cfg.get('foldx_refine_divergence')
+    if threshold is not None and multi:
+        divergent = _divergent_positions(pdb_path, chain, foldx_exe, cfg, float(threshold))
+        refine.update(s for s, mutations in multi
+                      if any(_split_foldx_mutation(m)[2] in divergent for m in mutations))
+
+    if refine:
+        print(f"[INFO] Refining {len(refine)} additive estimates with BuildModel")
+        refined = _buildmodel_many([(s, m) for s, m in multi if s in refine],
+                                   pdb_path, chain, foldx_exe, cfg)
+        for seq_id, terms in refined.items():
+            if terms:
+                totals[seq_id] = terms['total']
+    return totals
+
+
+# stderr fragments of failures worth retrying (system trouble, not the variant)
+_TRANSIENT_ERRORS = ('timeout', 'temporarily', 'resource', 'memory', 'killed', 'broken pipe')
+
+
+def _is_transient(result: Dict) -> bool:
+    """Timeouts, signals and resource errors may succeed on a second try."""
+    stderr = result['stderr'].lower()
+    return result['returncode'] < 0 or any(fragment in stderr for fragment in _TRANSIENT_ERRORS)
+
+
+def _run_batch(
+    batch: List[Tuple[str, List[str]]],
+    pdb_path: str,
+    foldx_exe: str,
+    timeouts: Dict[str, float],
+    foldx_dir: str = None,
+    sandbox_root: str = None,
+    retry: Tuple[int, float] = (0, 0.0)
+) -> Dict[str, Dict]:
+    """
+    Run BuildModel for a batch of variants in one FoldX process.
+
+    Each variant is one line of individual_list.txt. If the run fails or
+    some rows are missing, the affected variants are split in halves and
+    retried, so one bad variant only loses its own result. A batch that
+    timed out is not bisected (each half would get the summed timeouts of
+    its variants again); its missing variants are run one at a time with
+    their own timeouts, bounding the retry time by one more pass. A single
+    variant whose run failed transiently (timeout, signal, resource error)
+    is retried up to retry[0] times, waiting retry[1] * 2**attempt seconds
+    and doubling its timeout each time.
+
+    Args:
+        batch: List of (seq_id, mutations) tuples
+        timeouts: Timeout in seconds per seq_id (summed over the batch)
+        retry: (max transient retries, base backoff seconds)
+
+    Returns:
+        Dict mapping seq_id to {'terms': {'total': ΔΔG, ...}, 'runtime':
+        seconds per variant}; variants that failed even on their own map
+        to {'terms': {}}
+    """
+    max_retries, backoff = retry
+    for attempt in range(max_retries + 1):
+        with tempfile.TemporaryDirectory(prefix='foldx_', dir=sandbox_root) as tmpdir:
+            mut_file = Path(tmpdir) / "individual_list.txt"
+            _create_batch_list([mutations for _, mutations in batch], mut_file)
+
+            start = time.perf_counter()
+            result = _run_foldx_buildmodel(
+                pdb_path=pdb_path,
+                mutation_file=mut_file,
+                work_dir=tmpdir,
+                foldx_exe=foldx_exe,
+                timeout=sum(timeouts[seq_id] for seq_id, _ in batch) * 2 ** attempt,
+                foldx_dir=foldx_dir
+            )
+            runtime = (time.perf_counter() - start) / len(batch)
+            rows = _parse_batch_output(tmpdir, Path(pdb_path).name) if result['returncode'] == 0 else {}
+
+        if len(batch) > 1 or rows or attempt == max_retries or not _is_transient(result):
+            break
+        wait = backoff * 2 ** attempt
+        print(f"[WARN] FoldX failed transiently for {batch[0][0]} "
+              f"({result['stderr'][:80]}); retry {attempt + 1}/{max_retries} in {wait:.0f}s")
+        time.sleep(wait)
+
+    batch_results = {}
+    missing = []
+    for k, (seq_id, mutations) in enumerate(batch, start=1):
+        if k in rows:
+            batch_results[seq_id] = {'terms': rows[k], 'runtime': runtime}
+            print(f"[INFO] {seq_id}: ΔΔG = {rows[k]['total']:.2f} kcal/mol")
+        else:
+            missing.append((seq_id, mutations))
+
+    if not missing:
+        return batch_results
+
+    if len(batch) == 1:
+        seq_id = batch[0][0]
+        if result['returncode'] != 0:
+            print(f"[WARN] FoldX failed for {seq_id}: {result['stderr'][:200]}")
+        else:
+            print(f"[WARN] No ΔΔG output for {seq_id}")
+        # Caller assigns neutral ΔΔG for failed runs
+        batch_results[seq_id] = {'terms': {}}
+        return batch_results
+
+    if result['returncode'] < 0 and 'timeout' in result['stderr'].lower():
+        print(f"[WARN] FoldX batch of {len(batch)} timed out; "
+              f"retrying {len(missing)} variants individually")
+        parts = [[job] for job in missing]
+    else:
+        print(f"[WARN] FoldX batch of {len(batch)} incomplete "
+              f"({len(missing)} missing); retrying in halves")
+        half = (len(missing) + 1) // 2
+        parts = [missing[:half], missing[half:]]
+    for part in parts:
+        if part:
+            batch_results.update(_run_batch(part, pdb_path, foldx_exe, timeouts,
+                                            foldx_dir, sandbox_root, retry))
+    return batch_results
@@ -0,0 +1,130 @@
+"""
+Persistent ΔΔG store for FoldX results.
+
+Each BuildModel result is kept in SQLite under a key derived from the
+structure actually modelled (content hash of the repaired PDB), the
+chain, the sorted mutation set and the FoldX settings (binary version,
+number of runs). Entries hold the total ΔΔG plus the per-term energy
+breakdown, so rescoring a library only launches FoldX for mutation sets
+that have never been modelled with the same structure and settings.
+
+Layout:
+    <foldx_cache_dir>/ddg.sqlite
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+def store_key(structure_hash: str, chain: str, mutations: Iterable[str], settings: str) -> str:
+    """Stable key for one (structure, chain, mutation set, settings) tuple."""
+    mutation_text = ",".join(sorted(mutations))
+    payload = f"{structure_hash}\x1f{chain}\x1f{mutation_text}\x1f{settings}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class DDGStore:
+    """
+    SQLite-backed map from store_key() to ΔΔG results.
+
+    Args:
+        path: SQLite file (parent directory created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=60)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ddg ("
+            " key TEXT PRIMARY KEY, structure TEXT, chain TEXT, mutations TEXT,"
+            " settings TEXT, total REAL, terms TEXT, created REAL, runtime REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(ddg)")}
+        if "runtime" not in columns:  # stores created before runtimes were recorded
+            self._db.execute("ALTER TABLE ddg ADD COLUMN runtime REAL")
+        self._db.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """
+        Look up several keys at once.
+
+        Returns:
+            {key: {'total': float, 'terms': {term: float}}} for the hits only
+        """
+        hits = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):  # stay under SQLite's variable limit
+            chunk = unique[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT key, total, terms FROM ddg WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, total, terms in rows:
+                hits[key] = {"total": total, "terms": json.loads(terms or "{}")}
+        return hits
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: List[Dict]):
+        """
+        Store results; each entry needs key, structure, chain, mutations,
+        settings, total and terms, plus optionally the FoldX wall time per
+        variant in seconds (runtime).
+        """
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO ddg"
+            " (key, structure, chain, mutations, settings, total, terms, created, runtime)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (e["key"], e["structure"], e["chain"], ",".join(sorted(e["mutations"])),
+                 e["settings"], float(e["total"]), json.dumps(e.get("terms") or {}), now,
+                 e.get("runtime"))
+                for e in entries
+            ],
+        )
+        self._db.commit()
+
+    def entries(self, structure: str, chain: str, settings: str) -> List[tuple]:
+        """All (mutations, total) stored for one structure, chain and settings."""
+        rows = self._db.execute(
+            "SELECT mutations, total FROM ddg WHERE structure = ? AND chain = ? AND settings = ?",
+            (structure, chain, settings),
+        ).fetchall()
+        return [(mutations.split(",") if mutations else [], total) for mutations, total in rows]
+
+    def runtimes(self, structure: str, settings: str) -> List[tuple]:
+        """(mutations, seconds) of every timed run on a structure."""
+        rows = self._db.execute(
+            "SELECT mutations, runtime FROM ddg"
+            " WHERE structure = ? AND settings = ? AND runtime IS NOT NULL",
+            (structure, settings),
+        ).fetchall()
+        return [(mutations.split(",") if mutations else [], runtime) for mutations, runtime in rows]
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM ddg").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+# Process-level handles: resolved path -> DDGStore
+_STORES = {}
+
+
+def get_store(cfg: dict) -> Optional[DDGStore]:
+    """Return the store under cfg['foldx_cache_dir'], or None if cfg['foldx_store'] is off."""
+    if not cfg.get("foldx_store", True):
+        return None
+    path = Path(cfg.get("foldx_cache_dir", "cache/foldx")) / "ddg.sqlite"
+    key = str(path.resolve())
+    if key not in _STORES:
+        _STORES[key] = DDGStore(path)
+    return _STORES[key]
@@ -0,0 +1,200 @@
+"""
+Memory-mapped PLM model bundles for fast cold start.
+
+A bundle is a directory holding the ESM-2 weights in safetensors layout
+plus the architecture needed to rebuild the module:
+
+    <name>.plmbundle/
+        model.safetensors   # 8-byte header size, JSON header, raw tensor bytes
+        config.json         # {"arch": "ESM2", "num_layers": ..., ...}
+
+Loading maps model.safetensors copy-on-write and hands torch tensors that
+view the mapping directly (no pickle, no copy). Pages are faulted in on
+first use and shared through the page cache by every process that loads
+the same bundle, so short-lived jobs start quickly and add little RSS.
+
+Key functions:
+- save_bundle(model, path, model_name): Write a bundle from a loaded ESM-2
+- load_bundle(path): (model, alphabet) with mmap-backed parameters
+- find_bundle(name, bundle_dir): Bundle path for a model name, if one exists
+"""
+
+import json
+import struct
+from pathlib import Path
+
+import numpy as np
+
+BUNDLE_SUFFIX = ".plmbundle"
+WEIGHTS_FILE = "model.safetensors"
+CONFIG_FILE = "config.json"
+
+# safetensors dtype tag -> (numpy storage dtype, torch dtype name)
+_DTYPES = {
+    "F32": (np.float32, "float32"),
+    "F16": (np.float16, "float16"),
+    "BF16": (np.int16, "bfloat16"),  # no numpy bf16: read raw bits, view in torch
+    "I64": (np.int64, "int64"),
+    "I32": (np.int32, "int32"),
+    "U8": (np.uint8, "uint8"),
+    "BOOL": (np.bool_, "bool"),
+}
+
+
+def _dtype_tag(tensor) -> str:
+    name = str(tensor.dtype).replace("torch.", "")
+    for tag, (_, torch_name) in _DTYPES.items():
+        if torch_name == name:
+            return tag
+    raise ValueError(f"Unsupported tensor dtype for bundle: {tensor.dtype}")
+
+
+def write_safetensors(tensors: dict, path, metadata: dict = None):
+    """
+    Write tensors in safetensors layout (8-byte LE header size, JSON, data).
+
+    Tensor data is 8-byte aligned so every tensor can be viewed in place.
+    """
+    import torch
+
+    header = {"__metadata__": {str(k): str(v) for k, v in (metadata or {}).items()}}
+    blobs = []
+    offset = 0
+    for name in sorted(tensors):
+        t = tensors[name].detach().cpu().contiguous()
+        if t.dtype == torch.bfloat16:
+            t_bits = t.view(torch.int16)  # numpy has no bf16; raw bits are identical
+            raw = t_bits.numpy().tobytes()
+        else:
+            raw = t.numpy().tobytes()
+        pad = (-offset) % 8
+        if pad:
+            blobs.append(b"\0" * pad)
+            offset += pad
+        header[name] = {"dtype": _dtype_tag(t), "shape": list(t.shape),
+                        "data_offsets": [offset, offset + len(raw)]}
+        blobs.append(raw)
+        offset += len(raw)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * ((-len(header_bytes)) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+
+
+def read_safetensors_mmap(path) -> tuple:
+    """
+    Map a safetensors file and return zero-copy torch tensors.
+
+    The file is mapped copy-on-write: tensors are writable views, but pages
+    are only duplicated if something actually writes to them.
+
+    Returns:
+        (tensors, metadata): {name: torch.Tensor}, {str: str}
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    data_start = 8 + header_len
+    buf = np.memmap(path, dtype=np.uint8, mode="c")
+    metadata = header.pop("__metadata__", {})
+
+    tensors = {}
+    for name, info in header.items():
+        np_dtype, torch_name = _DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        arr = buf[data_start + begin:data_start + end].view(np_dtype).reshape(info["shape"])
+        t = torch.from_numpy(arr)
+        if torch_name == "bfloat16":
+            t = t.view(torch.bfloat16)
+        tensors[name] = t
+    return tensors, metadata
+
+
+def save_bundle(model, path, model_name: str = ""):
+    """
+    Write an ESM-2 model as a bundle directory.
+
+    Args:
+        model: Loaded esm.model.esm2.ESM2 instance
+        path: Output directory (conventionally <model_name>.plmbundle)
+        model_name: Original checkpoint name, stored for provenance
+    """
+    from esm.model.esm2 import ESM2
+
+    if not isinstance(model, ESM2):
+        raise ValueError(f"Only ESM-2 models can be bundled (got {type(model).__name__})")
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    config = {
+        "arch": "ESM2",
+        "alphabet": "ESM-1b",
+        "model_name": model_name,
+        "num_layers": model.num_layers,
+        "embed_dim": model.embed_dim,
+        "attention_heads": model.attention_heads,
+        "token_dropout": bool(model.token_dropout),
+    }
+    write_safetensors(model.state_dict(), path / WEIGHTS_FILE, {"model_name": model_name})
+    (path / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def load_bundle(path):
+    """
+    Rebuild an ESM-2 model whose parameters view the mapped bundle file.
+
+    The module is constructed on the meta device (no weight allocation)
+    and the mapped tensors are assigned in place of its parameters.
+
+    Returns:
+        (model, alphabet) with model in eval mode on CPU
+    """
+    import torch
+    import esm
+    from esm.model.esm2 import ESM2
+
+    path = Path(path)
+    config = json.loads((path / CONFIG_FILE).read_text(encoding="utf-8"))
+    if config.get("arch") != "ESM2":
+        raise ValueError(f"Unsupported bundle architecture: {config.get('arch')}")
+    alphabet = esm.Alphabet.from_architecture(config.get("alphabet", "ESM-1b"))
+    tensors, _ = read_safetensors_mmap(path / WEIGHTS_FILE)
+    with torch.device("meta"):
+        model = ESM2(
+            num_layers=config["num_layers"],
+            embed_dim=config["embed_dim"],
+            attention_heads=config["attention_heads"],
+            alphabet=alphabet,
+            token_dropout=config["token_dropout"],
+        )
+    model.load_state_dict(tensors, strict=True, assign=True)
+    model.eval()
+    return model, alphabet
+
+
+def is_bundle(path) -> bool:
+    path = Path(path)
+    return path.is_dir() and (path / WEIGHTS_FILE).exists() and (path / CONFIG_FILE).exists()
+
+
+def find_bundle(name: str, bundle_dir=None):
+    """
+    Resolve a model name to a bundle directory.
+
+    Accepts a bundle path directly, or looks for <bundle_dir>/<name>.plmbundle
+    (bundle_dir is cfg['plm_bundle_dir']).
+
+    Returns:
+        Path or None
+    """
+    if is_bundle(name):
+        return Path(name)
+    if bundle_dir:
+        candidate = Path(bundle_dir) / f"{Path(name).stem}{BUNDLE_SUFFIX}"
+        if is_bundle(candidate):
+            return candidate
+    return None
@@ -0,0 +1,179 @@
+"""
+Content-addressed on-disk cache for PLM outputs.
+
+Entries are keyed by SHA-256 of (model name, scoring mode, sequence,
+scoring parameters) and hold a scalar score (mean PLL) plus named numpy arrays (per-position
+log-probabilities, WT marginal matrices, optional embeddings). Arrays are
+stored as .npy files and opened with mmap_mode='r', so a hit costs a file
+open rather than a deserialisation. A small SQLite index tracks sizes and
+last access for size-bounded LRU eviction; access times and inserts are
+buffered and committed once per sweep (see PLMCache.flush).
+
+Layout:
+    <root>/index.sqlite
+    <root>/<key[:2]>/<key>.<array_name>.npy
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def cache_key(model_name: str, mode: str, sequence: str, params: str = "") -> str:
+    """
+    Stable content hash for one (model, mode, sequence) triple.
+
+    params carries everything else that changes the stored arrays (weights
+    identity, tiling settings); see plm_engine._cache_params.
+    """
+    payload = f"{model_name}\x1f{mode}\x1f{sequence}\x1f{params}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class PLMCache:
+    """
+    Size-bounded LRU cache of PLM scores and arrays.
+
+    Args:
+        root: Cache directory (created if missing)
+        max_bytes: Total array bytes kept before least-recently-used
+                   entries are evicted
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.root / "index.sqlite"), timeout=60)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, score REAL, arrays TEXT,"
+            " nbytes INTEGER, last_access REAL)"
+        )
+        self._db.commit()
+        self._touched = {}
+        self._total = self._sum_bytes()
+
+    def _path(self, key: str, name: str) -> Path:
+        return self.root / key[:2] / f"{key}.{name}.npy"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up an entry and mark it as recently used.
+
+        The access time is recorded in memory and written by flush().
+
+        Returns:
+            {'score': float or None, 'arrays': {name: memory-mapped ndarray}}
+            or None on a miss (including entries whose files vanished)
+        """
+        row = self._db.execute(
+            "SELECT score, arrays FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        score, names = row
+        arrays = {}
+        try:
+            for name in filter(None, names.split(",")):
+                arrays[name] = np.load(self._path(key, name), mmap_mode="r")
+        except (OSError, ValueError):
+            self._delete(key, names)
+            return None
+        self._touched[key] = time.time()
+        return {"score": score, "arrays": arrays}
+
+    def put(self, key: str, score: Optional[float] = None, arrays: Optional[Dict] = None):
+        """
+        Store (or replace) an entry, then evict LRU entries over max_bytes.
+
+        The index row is committed by the next flush().
+        """
+        arrays = arrays or {}
+        nbytes = 0
+        for name, arr in arrays.items():
+            path = self._path(key, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr))
+            os.replace(tmp, path)  # atomic: readers never see partial files
+            nbytes += path.stat().st_size
+        old = self._db.execute("SELECT nbytes FROM entries WHERE key = ?", (key,)).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (key, score, ",".join(arrays), nbytes, time.time()),
+        )
+        self._touched.pop(key, None)
+        self._total += nbytes - (old[0] if old else 0)
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def flush(self):
+        """Write buffered access times and commit pending inserts and deletes."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(t, k) for k, t in self._touched.items()],
+            )
+            self._touched = {}
+        self._db.commit()
+        self._total = self._sum_bytes()  # pick up entries written by other processes
+
+    def _sum_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+
+    def _delete(self, key: str, names: str):
+        for name in filter(None, names.split(",")):
+            try:
+                self._path(key, name).unlink()
+            except FileNotFoundError:
+                pass
+        row = self._db.execute("SELECT nbytes FROM entries WHERE key = ?", (key,)).fetchone()
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._touched.pop(key, None)
+        if row is not None:
+            self._total -= row[0]
+
+    def _evict(self):
+        self.flush()  # LRU order needs the buffered access times
+        if self._total <= self.max_bytes:
+            return
+        for key, names in self._db.execute(
+            "SELECT key, arrays FROM entries ORDER BY last_access ASC"
+        ).fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._delete(key, names)
+        self._db.commit()
+
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+# Process-level handles: (root, max_bytes) -> PLMCache
+_CACHES = {}
+
+
+def get_cache(cfg: dict) -> Optional[PLMCache]:
+    """Return the cache configured by cfg['plm_cache_dir'], or None if disabled."""
+    root = cfg.get("plm_cache_dir")
+    if not root:
+        return None
+    max_bytes = int(float(cfg.get("plm_cache_max_mb", 2048)) * 1024 ** 2)
+    key = (str(Path(root).resolve()), max_bytes)
+    if key not in _CACHES:
+        _CACHES[key] = PLMCache(root, max_bytes)
+    return _CACHES[key]
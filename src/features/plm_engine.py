@@ -0,0 +1,860 @@
+"""
+Shared ESM scoring engine for all PLM-derived channels.
+
+Loads each checkpoint once per process (model registry) and computes the
+masked pseudo-log-likelihood (PLL) sweep a single time, so the activity
+(plm_llr) and stability (plm_perplexity) channels are derived from the
+same forward passes. Results can be persisted across runs through the
+content-addressed cache in plm_cache.py.
+
+Key functions:
+- load_plm(name, device, precision): Cached (model, alphabet) lookup,
+  optionally int8-quantised for CPU inference
+- masked_log_probs(...): Batched single-position masking under a token budget
+- masked_position_scores(...): Tiled, de-duplicated masked scores at chosen positions
+- length_buckets(...): Similar-length micro-batches under a residue budget
+- position_log_likelihoods(seqs, cfg): Per-residue masked log-likelihoods
+- pll_sweep(seqs, cfg): Mean per-residue log-likelihood {seq_id: float}
+- wt_marginal_matrix(wt_seq, cfg): Cached L x 20 WT masked-marginal log-probs
+- mutation_window_scores(seqs, cfg): Re-mask only mutated positions (+ window)
+- plm_scores(seqs, cfg): Dispatch on cfg['plm_scoring']
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+from src.features.plm_cache import cache_key, get_cache
+
+# Tokens per forward call when stacking masked copies (rows x padded length)
+DEFAULT_TOKEN_BUDGET = 16384
+
+# Length bucketing: padded residues per micro-batch and tolerated padding overhead
+DEFAULT_BUCKET_TOKENS = 65536
+DEFAULT_BUCKET_SLACK = 0.1
+
+# ESM-2 context is 1024 tokens including BOS/EOS; longer inputs are tiled
+DEFAULT_MAX_RESIDUES = 1022
+DEFAULT_TILE_OVERLAP = 256
+
+# Process-level registry: (model_name, device, weights) -> (model, alphabet)
+_MODEL_REGISTRY = {}
+
+# (model_name, mode tag, wt_seq, cache params) -> (L x 20 log-prob matrix, per-position WT log-prob)
+_WT_MARGINALS = {}
+
+# Variants scored per vectorised lookup chunk in wt-marginal mode
+_LOOKUP_CHUNK = 4096
+
+# Forked data-parallel pool: model, precision, state tuple and Pool handle
+_WORKERS = {}
+
+# One-time warnings already printed in this process
+_WARNED = set()
+
+SCORING_MODES = ("pll", "wt-marginal", "mutation-window")
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def resolve_device(cfg: dict) -> str:
+    """Return 'cuda' only when requested in cfg and actually available."""
+    import torch
+    if cfg.get("device", "auto") == "cuda":
+        if torch.cuda.is_available():
+            return "cuda"
+        if "cuda" not in _WARNED:
+            _WARNED.add("cuda")
+            print("[WARN] device: cuda requested but CUDA is unavailable; running PLM on CPU")
+    return "cpu"
+
+
+def resolve_precision(cfg: dict, device: str) -> str:
+    """
+    Inference precision from cfg['plm_precision'].
+
+    'fp32' (default), 'bf16' (autocast) or 'int8' (dynamic quantisation of
+    Linear layers, CPU only; falls back to fp32 on CUDA).
+    """
+    precision = str(cfg.get("plm_precision", "fp32")).lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown plm_precision: {precision} (expected one of {PRECISIONS})")
+    if precision == "int8" and device != "cpu":
+        print("[WARN] plm_precision: int8 is CPU-only; using fp32 on", device)
+        return "fp32"
+    return precision
+
+
+def configure_threads(cfg: dict):
+    """Apply cfg['plm_threads'] (intra-op) and cfg['plm_interop_threads']."""
+    import torch
+
+    if cfg.get("plm_threads"):
+        torch.set_num_threads(int(cfg["plm_threads"]))
+    if cfg.get("plm_interop_threads"):
+        try:
+            torch.set_num_interop_threads(int(cfg["plm_interop_threads"]))
+        except RuntimeError:
+            # Only settable before the first inter-op parallel region
+            pass
+
+
+def register_plm(name: str, model, alphabet, device: str = "cpu"):
+    """
+    Register an already-constructed model under a name.
+
+    Useful for locally built checkpoints and for tests that use a tiny
+    randomly initialised ESM model instead of downloading weights.
+    """
+    model.eval()
+    for key in [k for k in _MODEL_REGISTRY if k[:2] == (name, device)]:
+        del _MODEL_REGISTRY[key]  # drop derived (e.g. int8) copies
+    _MODEL_REGISTRY[(name, device, "fp32")] = (model.to(device), alphabet)
+
+
+def clear_plm_registry():
+    """Drop all cached models, WT marginals and worker processes."""
+    shutdown_workers()
+    _MODEL_REGISTRY.clear()
+    _WT_MARGINALS.clear()
+
+
+def _quantize_int8(model):
+    """Dynamic int8 quantisation of all nn.Linear layers (CPU kernels)."""
+    import warnings
+    import torch
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_plm(name: str, device: str = "cpu", precision: str = "fp32", bundle_dir=None):
+    """
+    Load an ESM checkpoint, reusing the process-level copy if present.
+
+    A memory-mapped bundle (see plm_bundle.py) is preferred over the pickled
+    checkpoint when name is a bundle directory or bundle_dir holds
+    <name>.plmbundle.
+
+    Args:
+        name: ESM model name (hub), path to a local .pt checkpoint or bundle
+        device: 'cpu' or 'cuda'
+        precision: 'fp32', 'bf16' or 'int8'; bf16 shares the fp32 weights
+                   (autocast is applied at inference time)
+        bundle_dir: Directory searched for <name>.plmbundle
+
+    Returns:
+        (model, alphabet) tuple, model already in eval mode on device
+    """
+    import copy
+
+    weights = "int8" if precision == "int8" else "fp32"
+    key = (name, device, weights)
+    if key in _MODEL_REGISTRY:
+        return _MODEL_REGISTRY[key]
+
+    base_key = (name, device, "fp32")
+    if base_key in _MODEL_REGISTRY:
+        model, alphabet = _MODEL_REGISTRY[base_key]
+        if weights == "int8":
+            model = _quantize_int8(copy.deepcopy(model))
+    else:
+        from src.features.plm_bundle import find_bundle, load_bundle
+        bundle = find_bundle(name, bundle_dir)
+        if bundle is not None:
+            model, alphabet = load_bundle(bundle)
+        else:
+            import esm
+            model, alphabet = esm.pretrained.load_model_and_alphabet(name)
+        model.eval()
+        model = model.to(device)
+        if weights == "int8":
+            model = _quantize_int8(model)
+    model.eval()
+    _MODEL_REGISTRY[key] = (model, alphabet)
+    return _MODEL_REGISTRY[key]
+
+
+def _runtime(cfg: dict):
+    """Resolve (name, device, precision) and load the matching model."""
+    configure_threads(cfg)
+    name = cfg.get("plm_model", "esm2_t30_150M_UR50D")
+    device = resolve_device(cfg)
+    precision = resolve_precision(cfg, device)
+    model, alphabet = load_plm(name, device, precision, cfg.get("plm_bundle_dir"))
+    _ensure_workers(cfg, model, precision, device)
+    return name, device, precision, model, alphabet
+
+
+def _cache_params(cfg: dict, name: str) -> str:
+    """
+    Cache-key component for everything besides (model, mode, sequence).
+
+    Covers the tiling settings, which change per-position scores of long
+    sequences, and the weights file actually loaded (bundle or local
+    checkpoint; path, size and mtime), so replacing weights under the same
+    model name never returns stale entries. Hub names are versioned by name.
+    """
+    from pathlib import Path
+    from src.features.plm_bundle import WEIGHTS_FILE, find_bundle
+
+    bundle = find_bundle(name, cfg.get("plm_bundle_dir"))
+    weights = bundle / WEIGHTS_FILE if bundle is not None else Path(name)
+    identity = name
+    if weights.is_file():
+        st = weights.stat()
+        identity = f"{weights.resolve()}:{st.st_size}:{st.st_mtime_ns}"
+    max_residues = int(cfg.get("plm_max_residues", DEFAULT_MAX_RESIDUES))
+    overlap = int(cfg.get("plm_tile_overlap", DEFAULT_TILE_OVERLAP))
+    return f"{identity}|tile={max_residues}/{overlap}"
+
+
+def _mode_tag(mode: str, precision: str) -> str:
+    """Cache namespace: reduced-precision scores never mix with fp32 ones."""
+    return mode if precision == "fp32" else f"{mode}@{precision}"
+
+
+def _masked_batches(toks, jobs, token_budget: int, mask_idx: int):
+    """
+    Yield (masked_toks, positions) chunks of single-position-masked copies.
+
+    Each job (row, pos) is one copy of toks[row] with pos replaced by <mask>.
+    Copies are stacked so that every forward call holds at most
+    token_budget tokens (but always at least one copy).
+    """
+    import torch
+
+    per_chunk = max(1, token_budget // max(1, toks.size(1)))
+    for start in range(0, len(jobs), per_chunk):
+        chunk = jobs[start:start + per_chunk]
+        rows = torch.tensor([r for r, _ in chunk], device=toks.device)
+        positions = torch.tensor([p for _, p in chunk], device=toks.device)
+        masked = toks[rows].clone()
+        masked[torch.arange(len(chunk), device=toks.device), positions] = mask_idx
+        yield masked, positions
+
+
+def _forward_masked(model, masked, positions, precision: str):
+    """One forward call; log-softmax at each copy's masked position."""
+    import torch
+
+    idx = torch.arange(len(positions), device=masked.device)
+    autocast = torch.autocast(device_type=masked.device.type, dtype=torch.bfloat16,
+                              enabled=(precision == "bf16"))
+    with torch.no_grad(), autocast:
+        logits = model(masked, repr_layers=[], return_contacts=False)["logits"]
+        return torch.log_softmax(logits[idx, positions].float(), dim=-1)
+
+
+def _worker_init(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _worker_forward(chunk):
+    # Model inherited from the parent at fork time (copy-on-write pages)
+    masked, positions = chunk
+    return _forward_masked(_WORKERS["model"], masked, positions, _WORKERS["precision"])
+
+
+def shutdown_workers():
+    """Terminate the PLM worker pool, if one is running."""
+    pool = _WORKERS.pop("pool", None)
+    _WORKERS.clear()
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def _ensure_workers(cfg: dict, model, precision: str, device: str):
+    """
+    Start (or reuse) a forked worker pool for cfg['plm_workers'] > 1.
+
+    Workers are forked after the model is loaded, so weights are shared
+    copy-on-write rather than reloaded per process. Each worker pins
+    torch to cfg['plm_worker_threads'] intra-op threads (default: cores
+    divided evenly between workers). Requires the 'fork' start method
+    (Linux); elsewhere scoring stays in-process.
+    """
+    import multiprocessing as mp
+
+    workers = int(cfg.get("plm_workers", 1) or 1)
+    if workers <= 1 or device != "cpu":
+        return
+    threads = int(cfg.get("plm_worker_threads") or max(1, (os.cpu_count() or 1) // workers))
+    state = (id(model), precision, workers, threads)
+    if _WORKERS.get("state") == state:
+        return
+    if "fork" not in mp.get_all_start_methods():
+        if "fork" not in _WARNED:
+            _WARNED.add("fork")
+            print("[WARN] plm_workers needs the 'fork' start method; scoring in-process")
+        return
+    shutdown_workers()
+    _WORKERS.update(model=model, precision=precision, state=state)
+    _WORKERS["pool"] = mp.get_context("fork").Pool(workers, initializer=_worker_init, initargs=(threads,))
+
+
+def masked_log_probs(model, alphabet, toks, jobs, token_budget: int, precision: str = "fp32"):
+    """
+    Log-probabilities over the vocabulary at each masked (row, pos) job.
+
+    When a worker pool is running for this model (cfg['plm_workers']),
+    forward chunks are spread across processes; imap keeps chunk order,
+    so results are identical in layout to the in-process path.
+
+    Args:
+        model: ESM model in eval mode
+        alphabet: Matching ESM alphabet
+        toks: (B, T) token tensor (BOS/EOS included)
+        jobs: List of (row, pos) pairs to mask, one forward slot each
+        token_budget: Max tokens per forward call
+        precision: 'bf16' runs the forward passes under autocast
+
+    Returns:
+        (len(jobs), vocab) float32 tensor of log-probabilities, in job order
+    """
+    import torch
+
+    chunks = _masked_batches(toks, jobs, token_budget, alphabet.mask_idx)
+    if _WORKERS.get("model") is model and _WORKERS.get("precision") == precision:
+        out = list(_WORKERS["pool"].imap(_worker_forward, chunks))
+    else:
+        out = [_forward_masked(model, masked, positions, precision) for masked, positions in chunks]
+    if not out:
+        return torch.zeros(0, len(alphabet.all_toks))
+    return torch.cat(out)
+
+
+def length_buckets(lengths: List[int], bucket_tokens: int, slack: float) -> List[List[int]]:
+    """
+    Group sequence indices into micro-batches of similar length.
+
+    Indices are sorted by length and a bucket is closed once adding the
+    next sequence would either exceed bucket_tokens padded residues or pad
+    the shortest member by more than slack (fraction of its length).
+
+    Args:
+        lengths: Sequence lengths
+        bucket_tokens: Max padded residues (members x longest) per bucket
+        slack: Allowed padding overhead, e.g. 0.1 = 10%
+
+    Returns:
+        List of index lists; every index appears exactly once
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets = []
+    current = []
+    for i in order:
+        if current:
+            shortest = lengths[current[0]]
+            padded = (len(current) + 1) * lengths[i]
+            if padded > bucket_tokens or lengths[i] > shortest * (1.0 + slack):
+                buckets.append(current)
+                current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def sequence_tiles(length: int, max_residues: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping windows covering a sequence longer than the model context.
+
+    Each residue is assigned to exactly one tile: the overlap between two
+    neighbouring tiles is split at its midpoint, so every scored residue
+    keeps at least overlap/2 residues of context on both sides (except at
+    the true termini).
+
+    Args:
+        length: Sequence length
+        max_residues: Residues per tile (model context minus BOS/EOS)
+        overlap: Residues shared by neighbouring tiles
+
+    Returns:
+        List of (start, end, assigned_start, assigned_end), 0-based half-open
+    """
+    if length <= max_residues:
+        return [(0, length, 0, length)]
+    stride = max(1, max_residues - overlap)
+    starts = list(range(0, length - max_residues, stride)) + [length - max_residues]
+    tiles = []
+    for k, start in enumerate(starts):
+        end = start + max_residues
+        lo = 0 if k == 0 else (start + starts[k - 1] + max_residues) // 2
+        hi = length if k == len(starts) - 1 else (starts[k + 1] + end) // 2
+        tiles.append((start, end, lo, hi))
+    return tiles
+
+
+def _score_items(items, cfg: dict, full: bool):
+    """Masked scores for one bucket of (string, local positions) work items."""
+    import torch
+
+    token_budget = int(cfg.get("plm_token_budget", DEFAULT_TOKEN_BUDGET))
+    _, device, precision, model, alphabet = _runtime(cfg)
+    _, _, toks = alphabet.get_batch_converter()([(str(j), t) for j, (t, _) in enumerate(items)])
+    toks = toks.to(device)
+
+    # Token index = residue index + 1 (0 is BOS)
+    jobs = [(row, p + 1) for row, (_, local) in enumerate(items) for p in local]
+    lp = masked_log_probs(model, alphabet, toks, jobs, token_budget, precision).cpu()
+    if not full:
+        rows = torch.tensor([r for r, _ in jobs], dtype=torch.long)
+        positions = torch.tensor([p for _, p in jobs], dtype=torch.long)
+        lp = lp.gather(1, toks.cpu()[rows, positions].view(-1, 1)).squeeze(1)
+    lp = lp.numpy()
+
+    out = []
+    start = 0
+    for _, local in items:
+        out.append(lp[start:start + len(local)])
+        start += len(local)
+    return out
+
+
+def masked_position_scores(strings: List[str], positions: List, cfg: dict, full: bool = False) -> List:
+    """
+    Masked-marginal scores at selected positions of each sequence.
+
+    Core primitive behind every scoring mode. Sequences longer than
+    cfg['plm_max_residues'] are split into overlapping tiles
+    (cfg['plm_tile_overlap']) and each position is scored in the tile where
+    it is most central. Identical (tile, positions) work items, e.g. the
+    unchanged tiles shared by variants of one long construct, are computed
+    once. Work items are grouped into length buckets; a bucket that fails
+    is retried item by item so one bad input cannot sink the rest.
+
+    Args:
+        strings: Sequences
+        positions: Per sequence, 0-based positions to mask and score
+        cfg: Configuration dict (plm_* keys)
+        full: Return log-probabilities over the whole vocabulary instead of
+              only the true residue
+
+    Returns:
+        Per sequence: float32 array (k,) of true-residue log-likelihoods, or
+        (k, vocab) if full; None if scoring that sequence failed
+    """
+    import numpy as np
+
+    bucket_tokens = int(cfg.get("plm_bucket_tokens", DEFAULT_BUCKET_TOKENS))
+    slack = float(cfg.get("plm_bucket_slack", DEFAULT_BUCKET_SLACK))
+    max_residues = int(cfg.get("plm_max_residues", DEFAULT_MAX_RESIDUES))
+    overlap = int(cfg.get("plm_tile_overlap", DEFAULT_TILE_OVERLAP))
+
+    item_index = {}
+    items = []
+    scatter = []  # (sequence index, item index, selected indices into positions[i])
+    for i, (s, pos) in enumerate(zip(strings, positions)):
+        pos = np.asarray(pos, dtype=np.int64)
+        for start, end, lo, hi in sequence_tiles(len(s), max_residues, overlap):
+            sel = np.nonzero((pos >= lo) & (pos < hi))[0]
+            if len(sel) == 0:
+                continue
+            key = (s[start:end], tuple((pos[sel] - start).tolist()))
+            if key not in item_index:
+                item_index[key] = len(items)
+                items.append(key)
+            scatter.append((i, item_index[key], sel))
+
+    results = [None] * len(items)
+    for bucket in length_buckets([len(t) for t, _ in items], bucket_tokens, slack):
+        try:
+            scored = _score_items([items[j] for j in bucket], cfg, full)
+        except Exception as e:  # retry one by one to isolate the failing input
+            print(f"[WARN] PLM bucket of {len(bucket)} failed ({e}); retrying individually")
+            scored = []
+            for j in bucket:
+                try:
+                    scored.append(_score_items([items[j]], cfg, full)[0])
+                except Exception as e2:
+                    print(f"[WARN] PLM scoring failed for a {len(items[j][0])}-residue input: {e2}")
+                    scored.append(None)
+        for j, res in zip(bucket, scored):
+            results[j] = res
+
+    width = next((r.shape[1:] for r in results if r is not None), (0,) if full else ())
+    out = [np.zeros((len(pos),) + tuple(width), dtype=np.float32) for pos in positions]
+    failed = set()
+    for i, j, sel in scatter:
+        if results[j] is None:
+            failed.add(i)
+        else:
+            out[i][sel] = results[j]
+    return [None if i in failed else arr for i, arr in enumerate(out)]
+
+
+def _mean_embeddings(strings: List[str], cfg: dict) -> List:
+    """Mean-pooled final-layer representation of each unmasked sequence (tiled if long)."""
+    import torch
+
+    max_residues = int(cfg.get("plm_max_residues", DEFAULT_MAX_RESIDUES))
+    overlap = int(cfg.get("plm_tile_overlap", DEFAULT_TILE_OVERLAP))
+    _, device, _, model, alphabet = _runtime(cfg)
+    layer = model.num_layers
+    batch_converter = alphabet.get_batch_converter()
+
+    out = []
+    with torch.no_grad():
+        for s in strings:
+            total = 0.0
+            for start, end, lo, hi in sequence_tiles(len(s), max_residues, overlap):
+                _, _, toks = batch_converter([("tile", s[start:end])])
+                reps = model(toks.to(device), repr_layers=[layer])["representations"][layer]
+                total = total + reps[0, lo - start + 1:hi - start + 1].float().sum(0)
+            out.append((total / max(1, len(s))).cpu().numpy())
+    return out
+
+
+def position_log_likelihoods(seqs: List[Tuple[str, str]], cfg: dict) -> List:
+    """
+    Masked log-likelihood of the true residue at every position.
+
+    Each residue is masked in turn and the log-probability of the true
+    token is recorded. Sequences are grouped into length buckets
+    (cfg['plm_bucket_tokens'], cfg['plm_bucket_slack']) so padding and the
+    tensors held per micro-batch stay small; within a bucket, masked copies
+    are stacked into dense forward batches bounded by cfg['plm_token_budget']
+    tokens. Padding and EOS tokens are never masked or scored. Sequences
+    longer than the model context are scored in overlapping tiles (see
+    masked_position_scores).
+
+    When cfg['plm_cache_dir'] is set, sequences already scored by the same
+    model are read from the on-disk cache and new results (mean PLL,
+    per-position log-likelihoods, optional embeddings) are written back.
+
+    Args:
+        seqs: List of (seq_id, sequence) tuples
+        cfg: Configuration dict with plm_model, device, plm_token_budget,
+             plm_bucket_tokens, plm_bucket_slack, plm_max_residues,
+             plm_tile_overlap, plm_cache_dir, plm_cache_max_mb,
+             plm_cache_embeddings
+
+    Returns:
+        List of float32 arrays (one per input sequence, length len(seq)),
+        None for sequences that could not be scored
+    """
+    import numpy as np
+
+    name, _, precision, _, _ = _runtime(cfg)
+    tag = _mode_tag("pll", precision)
+
+    cache = get_cache(cfg)
+    embed = bool(cfg.get("plm_cache_embeddings", False)) and cache is not None
+    per_pos = [None] * len(seqs)
+    params = _cache_params(cfg, name)
+    if cache is not None:
+        for i, (_, s) in enumerate(seqs):
+            hit = cache.get(cache_key(name, tag, s, params))
+            if hit is not None and "position_ll" in hit["arrays"]:
+                per_pos[i] = hit["arrays"]["position_ll"]
+    todo = [i for i, v in enumerate(per_pos) if v is None]
+
+    strings = [seqs[i][1] for i in todo]
+    scored = masked_position_scores(strings, [range(len(s)) for s in strings], cfg)
+    reps = _mean_embeddings(strings, cfg) if embed and strings else None
+    for k, i in enumerate(todo):
+        per_pos[i] = scored[k]
+        if cache is not None and scored[k] is not None:
+            arrays = {"position_ll": scored[k]}
+            if reps is not None:
+                arrays["embedding"] = reps[k]
+            mean = float(scored[k].sum(dtype=np.float64)) / max(1, len(strings[k]))
+            cache.put(cache_key(name, tag, strings[k], params), mean, arrays)
+    if cache is not None:
+        cache.flush()
+
+    return per_pos
+
+
+def pll_sweep(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]:
+    """
+    Masked pseudo-log-likelihood, averaged over residues.
+
+    See position_log_likelihoods() for batching, tiling and caching.
+
+    Args:
+        seqs: List of (seq_id, sequence) tuples
+        cfg: Configuration dict (plm_* keys)
+
+    Returns:
+        Dict mapping seq_id to mean log-likelihood per residue (<= 0);
+        sequences that could not be scored are omitted
+    """
+    per_pos = position_log_likelihoods(seqs, cfg)
+    return {sid: float(per_pos[i].sum(dtype="float64")) / max(1, len(s))
+            for i, (sid, s) in enumerate(seqs) if per_pos[i] is not None}
+
+
+def _load_wt_sequence(cfg: dict):
+    """WT from cfg['plm_wt_seq'] or the first record of cfg['wt_fasta']."""
+    wt_seq = cfg.get("plm_wt_seq")
+    if wt_seq:
+        return wt_seq
+    wt_path = cfg.get("wt_fasta")
+    if wt_path:
+        from src.utils_seq import read_fasta
+        records = read_fasta(wt_path)
+        if records:
+            return records[0][1]
+    return None
+
+
+def wt_marginal_matrix(wt_seq: str, cfg: dict):
+    """
+    Masked-marginal log-probabilities of the wild type, computed once.
+
+    Every WT position is masked (one batched sweep of L masked copies) and
+    the log-probabilities of the 20 canonical amino acids are kept, in
+    process memory and in the on-disk PLM cache when configured.
+
+    Args:
+        wt_seq: Wild-type amino acid sequence
+        cfg: Configuration dict with plm_model, device, plm_token_budget
+
+    Returns:
+        (matrix, wt_ll): (L, 20) float array in AA_ORDER columns and (L,)
+        log-probability of the WT residue at each position
+    """
+    import numpy as np
+    from src.utils_seq import AA_ORDER
+
+    name = cfg.get("plm_model", "esm2_t30_150M_UR50D")
+    tag = _mode_tag("wt-marginal", resolve_precision(cfg, resolve_device(cfg)))
+    params = _cache_params(cfg, name)
+    key = (name, tag, wt_seq, params)
+    if key in _WT_MARGINALS:
+        return _WT_MARGINALS[key]
+
+    cache = get_cache(cfg)
+    disk_key = cache_key(name, tag, wt_seq, params)
+    hit = cache.get(disk_key) if cache is not None else None
+    if hit is not None:
+        cache.flush()
+        _WT_MARGINALS[key] = (np.asarray(hit["arrays"]["matrix"], dtype=np.float64),
+                              np.asarray(hit["arrays"]["wt_ll"], dtype=np.float64))
+        return _WT_MARGINALS[key]
+
+    _, _, _, _, alphabet = _runtime(cfg)
+    lp = masked_position_scores([wt_seq], [range(len(wt_seq))], cfg, full=True)[0]
+    if lp is None:
+        raise RuntimeError("WT masked-marginal sweep failed")
+    cols = [alphabet.get_idx(aa) for aa in AA_ORDER]
+    matrix = lp[:, cols].astype(np.float64)
+    wt_tok = [alphabet.get_idx(aa) for aa in wt_seq]
+    wt_ll = lp[np.arange(len(wt_seq)), wt_tok].astype(np.float64)
+
+    if cache is not None:
+        cache.put(disk_key, float(wt_ll.mean()), {"matrix": matrix, "wt_ll": wt_ll})
+        cache.flush()
+    _WT_MARGINALS[key] = (matrix, wt_ll)
+    return matrix, wt_ll
+
+
+def wt_marginal_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]:
+    """
+    First-order PLL estimate from the cached WT masked-marginal matrix.
+
+    For a substitution variant the summed log-likelihood is approximated by
+    the WT PLL plus sum(log p_mut - log p_wt) over its mutated positions,
+    so each variant costs one table lookup instead of L forward passes.
+    Variants whose length differs from WT or that contain non-canonical
+    residues are scored with the exact pll_sweep instead.
+
+    Returns:
+        Dict mapping seq_id to mean log-likelihood per residue (same scale
+        as pll_sweep)
+    """
+    import numpy as np
+    from src.utils_seq import UNKNOWN_CODE, encode_sequences
+
+    wt_seq = _load_wt_sequence(cfg)
+    if not wt_seq:
+        print("[WARN] plm_scoring=wt-marginal needs plm_wt_seq or wt_fasta; using full PLL")
+        return pll_sweep(seqs, cfg)
+
+    matrix, wt_ll = wt_marginal_matrix(wt_seq, cfg)
+    L = len(wt_seq)
+    wt_enc = encode_sequences([wt_seq])[0]
+    wt_total = float(wt_ll.sum())
+
+    subs = [(sid, s) for sid, s in seqs if len(s) == L]
+    out = {}
+    fallback = []
+    arange = np.arange(L)
+    for start in range(0, len(subs), _LOOKUP_CHUNK):
+        chunk = subs[start:start + _LOOKUP_CHUNK]
+        enc = encode_sequences([s for _, s in chunk], L)
+        canonical = (enc != UNKNOWN_CODE).all(axis=1)
+        diff = enc != wt_enc
+        gain = matrix[arange, np.minimum(enc, matrix.shape[1] - 1)] - wt_ll
+        delta = np.where(diff, gain, 0.0).sum(axis=1)
+        for i, (sid, s) in enumerate(chunk):
+            if canonical[i]:
+                out[sid] = (wt_total + float(delta[i])) / L
+            else:
+                fallback.append((sid, s))
+
+    fallback += [(sid, s) for sid, s in seqs if len(s) != L]
+    if fallback:
+        out.update(pll_sweep(fallback, cfg))
+    return {sid: out[sid] for sid, _ in seqs if sid in out}
+
+
+def _variant_parent(seq_id: str, seq: str, wt_seq, mapped=None):
+    """
+    Locate a variant's mutated positions and its unmutated parent sequence.
+
+    Uses direct comparison against wt_seq when lengths match. Otherwise,
+    given mapped (the WT -> variant position map from utils_align), WT is
+    the parent and the window covers substitutions, inserted residues and
+    the residues flanking deletions or terminal truncations. Failing that,
+    the mutation codes in the FASTA header (e.g. "FAST_PETase|S121E_D186H")
+    are reverted, keeping only codes whose mutant residue is actually
+    present at that 1-based position of seq.
+
+    Returns:
+        (parent_seq, [0-based positions], index) where index is the (len(seq),)
+        parent position of each variant residue (-1 for insertions), or None
+        if no source applies
+    """
+    import numpy as np
+    from src.utils_seq import parse_mutation_codes
+
+    if wt_seq and len(wt_seq) == len(seq):
+        return (wt_seq, [i for i, (a, b) in enumerate(zip(wt_seq, seq)) if a != b],
+                np.arange(len(seq)))
+
+    if wt_seq and mapped is not None:
+        index = np.full(len(seq), -1, dtype=np.int64)
+        ref_pos = np.flatnonzero(mapped)
+        index[mapped[ref_pos] - 1] = ref_pos
+        window = set(np.flatnonzero(index < 0).tolist())
+        window.update(i for i in np.flatnonzero(index >= 0).tolist() if seq[i] != wt_seq[index[i]])
+        aligned = np.flatnonzero(index >= 0)
+        if len(aligned):
+            breaks = np.flatnonzero(np.diff(index[aligned]) != 1)
+            window.update(aligned[breaks].tolist())
+            window.update(aligned[breaks + 1].tolist())
+            if index[aligned[0]] > 0:
+                window.add(int(aligned[0]))
+            if index[aligned[-1]] < len(wt_seq) - 1:
+                window.add(int(aligned[-1]))
+        return wt_seq, sorted(window), index
+
+    codes = [(wt, pos - 1, mut) for wt, pos, mut in parse_mutation_codes(seq_id)
+             if 1 <= pos <= len(seq) and seq[pos - 1] == mut]
+    if not codes:
+        return None
+    parent = list(seq)
+    for wt, idx, _ in codes:
+        parent[idx] = wt
+    return "".join(parent), sorted({idx for _, idx, _ in codes}), np.arange(len(seq))
+
+
+def _aligned_to_wt(seqs: List[Tuple[str, str]], wt_seq, cfg: dict) -> Dict[int, object]:
+    """
+    WT -> variant position maps for variants whose length differs from WT.
+
+    Uses the library map prepared by run_pipeline when present (see
+    utils_align.find_variant_map); rows below cfg['mapping_min_identity']
+    are left out.
+    """
+    from src.utils_align import get_variant_map, mapping_workers
+
+    rows = [i for i, (_, s) in enumerate(seqs) if wt_seq and len(s) != len(wt_seq)]
+    if not rows:
+        return {}
+    min_identity = float(cfg.get("mapping_min_identity", 0.9))
+    variant_map = get_variant_map(wt_seq, [seqs[i][1] for i in rows], min_identity,
+                                  mapping_workers(cfg))
+    return {i: variant_map.position_map(k) for k, i in enumerate(rows)
+            if variant_map.identity[k] >= min_identity}
+
+
+def mutation_window_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]:
+    """
+    PLL estimate that only re-masks mutated positions (plus a neighbourhood).
+
+    The parent sequence (WT, or the header-reverted sequence) gets one full
+    masked sweep, shared by all its variants and cached on disk. Each
+    variant then masks only its k mutated positions widened by
+    cfg['plm_window_radius'] residues on either side, and its PLL is
+    approximated by the parent's per-position log-likelihoods with the
+    window positions replaced by the variant's own. Cost per variant drops
+    from ~L to ~k(1 + 2*radius) masked positions.
+
+    Variants whose length differs from WT are aligned to it, so insertions
+    and deletions are windowed too (inserted residues and deletion flanks
+    are re-masked; the other residues take the WT value of their aligned
+    position). Variants with no usable mutation information fall back to
+    pll_sweep.
+
+    Returns:
+        Dict mapping seq_id to mean log-likelihood per residue (same scale
+        as pll_sweep)
+    """
+    import numpy as np
+
+    radius = int(cfg.get("plm_window_radius", 0))
+    wt_seq = _load_wt_sequence(cfg)
+    mapped = _aligned_to_wt(seqs, wt_seq, cfg)
+
+    plans = {}
+    fallback = []
+    for i, (sid, s) in enumerate(seqs):
+        plan = _variant_parent(sid, s, wt_seq, mapped.get(i))
+        if plan is None:
+            fallback.append(seqs[i])
+        else:
+            plans[i] = plan
+
+    parents = sorted({parent for parent, _, _ in plans.values()})
+    parent_ll = dict(zip(parents, position_log_likelihoods(
+        [(f"parent_{j}", p) for j, p in enumerate(parents)], cfg)))
+
+    mutated = [i for i, (_, positions, _) in plans.items() if positions]
+    windows = {}
+    for i in mutated:
+        L = len(seqs[i][1])
+        windows[i] = sorted({w for p in plans[i][1]
+                             for w in range(max(0, p - radius), min(L, p + radius + 1))})
+    window_ll = dict(zip(mutated, masked_position_scores(
+        [seqs[i][1] for i in mutated], [windows[i] for i in mutated], cfg)))
+
+    out = {}
+    for i, (parent, _, index) in plans.items():
+        sid, s = seqs[i]
+        if parent_ll[parent] is None or (i in window_ll and window_ll[i] is None):
+            continue
+        base = np.asarray(parent_ll[parent], dtype=np.float64)
+        keep = np.ones(len(s), dtype=bool)
+        total = 0.0
+        if i in window_ll:
+            keep[windows[i]] = False
+            total += float(window_ll[i].sum())
+        total += float(base[index[keep]].sum())
+        out[sid] = total / max(1, len(s))
+
+    if fallback:
+        out.update(pll_sweep(fallback, cfg))
+    return {sid: out[sid] for sid, _ in seqs if sid in out}
+
+
+def plm_scores(seqs: List[Tuple[str, str]], cfg: dict) -> Dict[str, float]:
+    """
+    Mean per-residue log-likelihood using the configured scoring mode.
+
+    cfg['plm_scoring'] selects 'pll' (default, full masked sweep per
+    sequence), 'wt-marginal' (WT masked marginals + per-variant lookup) or
+    'mutation-window' (parent sweep + re-masking only around mutations).
+    """
+    mode = cfg.get("plm_scoring", "pll")
+    if mode == "wt-marginal":
+        return wt_marginal_scores(seqs, cfg)
+    if mode == "mutation-window":
+        return mutation_window_scores(seqs, cfg)
+    if mode != "pll":
+        raise ValueError(f"Unknown plm_scoring mode: {mode} (expected one of {SCORING_MODES})")
+    return pll_sweep(seqs, cfg)
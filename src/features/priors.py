@@ -2,10 +2,23 @@
 """
 Prior-based scoring from literature-derived biochemical knowledge.
 Implements hard constraints (catalytic triad, oxyanion hole) and favorable regions.
+
+The YAML is compiled once (per file version and WT sequence) into dense
+arrays over the referenced WT positions: per-position penalties, the
+allowed (WT) residue at each constrained position, region membership and
+rewards. Variants are mapped onto those positions as one uint8 matrix and
+scored with numpy reductions. With a WT sequence, substitution-only
+variants map by index; others are aligned once each, or taken from the
+library map run_pipeline prepares (see src/utils_align.py).
 """
 
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
 import yaml
-from Bio import pairwise2
+
+from src.utils_align import map_reference_positions, reference_map
 
 
 def _load_yaml(path):
@@ -14,19 +27,143 @@ def _load_yaml(path):
         return yaml.safe_load(f)
 
 def _align_to_wt(seq, wt):
-    # 簡單全域比對，回傳「WT 序列位置 → 變體中的對應位置」的索引映射
-    aln = pairwise2.align.globalms(wt, seq, 2, -1, -5, -1, one_alignment_only=True)[0]
-    wt_aln, var_aln = aln.seqA, aln.seqB
-    mapping = {}
-    i_wt = i_var = 0
-    for a, b in zip(wt_aln, var_aln):
-        if a != "-":
-            i_wt += 1
-        if b != "-":
-            i_var += 1
-        if a != "-" and b != "-":
-            mapping[i_wt] = i_var  # 1-based positions
-    return mapping
+    # 全域比對，回傳「WT 序列位置 → 變體中的對應位置」的索引映射（1-based）
+    mapped = reference_map(wt, seq)
+    return {i + 1: int(v) for i, v in enumerate(mapped) if v}
+
+
+class CompiledPriors:
+    """
+    Position-rule priors as dense arrays over the referenced WT positions.
+
+    Args:
+        positions: (K,) 1-based WT positions referenced by any rule
+        penalty: (K,) summed mutation penalty per position (triad + oxyanion)
+        allowed: (K,) uint8 residue byte allowed at each position
+                 (the WT residue; 0 = cannot be verified)
+        region_members: (R, K) bool, favorable region membership
+        region_reward: (R,) reward credited when a region is present
+        stability: Stability prior (sum of rule rewards, sequence-independent)
+    """
+
+    def __init__(self, positions, penalty, allowed, region_members, region_reward, stability):
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.penalty = np.asarray(penalty, dtype=np.float64)
+        self.allowed = np.asarray(allowed, dtype=np.uint8)
+        self.region_members = np.asarray(region_members, dtype=bool).reshape(-1, len(self.positions))
+        self.region_reward = np.asarray(region_reward, dtype=np.float64)
+        self.stability = float(stability)
+
+    @classmethod
+    def from_dict(cls, pri: dict, wt_seq: Optional[str] = None) -> 'CompiledPriors':
+        activity_cfg = pri.get("activity", {}) or {}
+        constraints = []
+        for key, default in (("catalytic_triad", -2.5), ("oxyanion_hole", -2.0)):
+            block = activity_cfg.get(key, {}) or {}
+            penalty = float(block.get("penalty_if_mutated", default))
+            constraints.extend((int(pos), penalty) for pos in set(block.get("positions", [])))
+        regions = [([int(p) for p in r.get("positions", [])], float(r.get("reward", 0.5)))
+                   for r in activity_cfg.get("favorable_regions", []) or []]
+
+        positions = sorted({pos for pos, _ in constraints} | {p for ps, _ in regions for p in ps})
+        column = {pos: k for k, pos in enumerate(positions)}
+        penalty = np.zeros(len(positions))
+        for pos, value in constraints:
+            penalty[column[pos]] += value
+        members = np.zeros((len(regions), len(positions)), dtype=bool)
+        for r, (region_positions, _) in enumerate(regions):
+            members[r, [column[p] for p in region_positions]] = True
+
+        allowed = np.zeros(len(positions), dtype=np.uint8)
+        if wt_seq:
+            wt_bytes = np.frombuffer(wt_seq.encode("ascii", "replace"), dtype=np.uint8)
+            in_wt = np.array([1 <= pos <= len(wt_seq) for pos in positions], dtype=bool)
+            allowed[in_wt] = wt_bytes[np.asarray(positions, dtype=np.int64)[in_wt] - 1]
+
+        stability_rules = (pri.get("stability", {}) or {}).get("favorable_rules", []) or []
+        stability = sum(float(rule.get("reward", 0.3)) * 0.5 for rule in stability_rules)
+        return cls(positions, penalty, allowed, members,
+                   [reward * 0.5 for _, reward in regions], stability)
+
+    def score(self, residues: np.ndarray):
+        """
+        Score variants mapped onto self.positions.
+
+        Args:
+            residues: (N, K) uint8 residue bytes at each WT position
+                      (0 = position absent from the variant)
+
+        Returns:
+            (activity, stability): two (N,) float arrays
+        """
+        present = residues != 0
+        # Verifiable positions are penalised when mutated; others get a
+        # conservative 10% of the penalty whenever they are present
+        hit = np.where(self.allowed != 0, residues != self.allowed, 0.1)
+        activity = (present * hit) @ self.penalty
+        if len(self.region_reward):
+            region_present = (present.astype(np.uint8) @ self.region_members.T.astype(np.uint8)) > 0
+            activity = activity + region_present @ self.region_reward
+        return activity, np.full(len(residues), self.stability)
+
+
+# Process-level memo: (abs path, size, mtime_ns, WT sequence) -> CompiledPriors
+_COMPILED: Dict[tuple, CompiledPriors] = {}
+
+
+def compile_priors(path: str, wt_seq: Optional[str] = None) -> CompiledPriors:
+    """Compile a priors YAML (and optional WT) once per file version."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, wt_seq)
+    if memo_key not in _COMPILED:
+        _COMPILED[memo_key] = CompiledPriors.from_dict(_load_yaml(path), wt_seq)
+    return _COMPILED[memo_key]
+
+
+def _residue_bytes(seqs: List[str]) -> np.ndarray:
+    """(N, max length) uint8 matrix of raw residue bytes, 0-padded."""
+    lengths = [len(s) for s in seqs]
+    width = max(lengths, default=0)
+    if seqs and min(lengths) == width:
+        joined = "".join(seqs).encode("ascii", "replace")
+        return np.frombuffer(joined, dtype=np.uint8).reshape(len(seqs), width)
+    out = np.zeros((len(seqs), width), dtype=np.uint8)
+    for row, s in enumerate(seqs):
+        out[row, :len(s)] = np.frombuffer(s.encode("ascii", "replace"), dtype=np.uint8)
+    return out
+
+
+def map_to_positions(seqs, positions, wt_seq=None, min_identity=0.9) -> np.ndarray:
+    """
+    Residues of each variant at the given WT positions.
+
+    Without a WT the variants are assumed to use IsPETase numbering; with
+    one, positions are mapped through the global alignment (unaligned
+    positions keep their own number). Variants as long as the WT with at
+    least min_identity identity map by index without aligning.
+
+    Returns:
+        (N, K) uint8 residue bytes, 0 where the position is out of range
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    var_pos = np.broadcast_to(positions, (len(seqs), len(positions))).copy()
+    if wt_seq:
+        try:
+            mapped = map_reference_positions(wt_seq, [seq for _, seq in seqs], positions, min_identity)
+            var_pos = np.where(mapped > 0, mapped, var_pos)
+        except Exception as e:
+            # Fallback: assume direct position correspondence
+            print(f"[WARN] Alignment to WT failed: {e}")
+
+    matrix = _residue_bytes([seq for _, seq in seqs])
+    lengths = np.array([len(seq) for _, seq in seqs], dtype=np.int64)
+    inside = (var_pos >= 1) & (var_pos <= lengths[:, None])
+    if matrix.shape[1] == 0:
+        return np.zeros(var_pos.shape, dtype=np.uint8)
+    rows = np.arange(len(seqs))[:, None]
+    gathered = matrix[rows, np.clip(var_pos - 1, 0, matrix.shape[1] - 1)]
+    return np.where(inside, gathered, 0).astype(np.uint8)
+
 
 def prior_scores(seqs, cfg):
     """
@@ -37,12 +174,14 @@ def prior_scores(seqs, cfg):
         cfg: Configuration dict with:
             - priors_yaml: path to priors YAML file
             - wt_fasta: (optional) path to WT sequence for alignment
+            - mapping_min_identity: identity above which equal-length variants
+              map to the WT by index instead of alignment (default 0.9)
+            - priors_chunk_size: variants scored per numpy batch (default 65536)
 
     Returns:
         (activity_prior, stability_prior): tuple of {seq_id: score} dicts
     """
     pri_path = cfg.get("priors_yaml", "data/priors/priors_petase_2024_2025.yaml")
-    pri = _load_yaml(pri_path)
 
     # Load WT sequence if provided
     wt_seq = None
@@ -54,95 +193,17 @@ def prior_scores(seqs, cfg):
         except Exception as e:
             print(f"[WARN] Could not load WT sequence from {wt_path}: {e}")
 
-    # Extract activity priors (fix YAML field paths)
-    activity_cfg = pri.get("activity", {})
-    triad = set(activity_cfg.get("catalytic_triad", {}).get("positions", []))
-    oxyanion = set(activity_cfg.get("oxyanion_hole", {}).get("positions", []))
-
-    # Get penalties
-    triad_penalty = float(activity_cfg.get("catalytic_triad", {}).get("penalty_if_mutated", -2.5))
-    oxyanion_penalty = float(activity_cfg.get("oxyanion_hole", {}).get("penalty_if_mutated", -2.0))
-
-    # Get favorable regions
-    fav_regions = activity_cfg.get("favorable_regions", [])
-
-    # Extract stability priors
-    stability_cfg = pri.get("stability", {})
-    stability_rules = stability_cfg.get("favorable_rules", [])
+    compiled = compile_priors(pri_path, wt_seq)
+    chunk = max(1, int(cfg.get("priors_chunk_size", 65536)))
+    min_identity = float(cfg.get("mapping_min_identity", 0.9))
 
     act_out = {}
     st_out = {}
-
-    for sid, seq in seqs:
-        # Build alignment mapping if WT is available
-        mapping = {}
-        if wt_seq:
-            try:
-                mapping = _align_to_wt(seq, wt_seq)
-            except Exception as e:
-                print(f"[WARN] Alignment failed for {sid}: {e}")
-                # Fallback: assume direct position correspondence
-                mapping = {i: i for i in range(1, min(len(wt_seq), len(seq)) + 1)}
-        else:
-            # No WT: assume input sequence uses IsPETase numbering
-            mapping = {i: i for i in range(1, len(seq) + 1)}
-
-        # === ACTIVITY SCORE ===
-        a_score = 0.0
-
-        # 1) Catalytic triad - hard penalty if mutated
-        for pos in triad:
-            var_pos = mapping.get(pos, pos)
-            if 1 <= var_pos <= len(seq):
-                # If we have WT, check for mutation
-                if wt_seq and pos <= len(wt_seq):
-                    if seq[var_pos - 1] != wt_seq[pos - 1]:
-                        a_score += triad_penalty
-                else:
-                    # Conservative: assume potential mutation risk
-                    # (only apply small penalty if we can't verify)
-                    a_score += triad_penalty * 0.1
-
-        # 2) Oxyanion hole - hard penalty if mutated
-        for pos in oxyanion:
-            var_pos = mapping.get(pos, pos)
-            if 1 <= var_pos <= len(seq):
-                if wt_seq and pos <= len(wt_seq):
-                    if seq[var_pos - 1] != wt_seq[pos - 1]:
-                        a_score += oxyanion_penalty
-                else:
-                    a_score += oxyanion_penalty * 0.1
-
-        # 3) Favorable regions - reward if positions are present
-        for region in fav_regions:
-            positions = region.get("positions", [])
-            reward = float(region.get("reward", 0.5))
-
-            # Check if any position in this region is accessible
-            hit = False
-            for pos in positions:
-                var_pos = mapping.get(pos, pos)
-                if 1 <= var_pos <= len(seq):
-                    # Position is present and accessible
-                    hit = True
-                    break
-
-            if hit:
-                # Award partial reward for region presence
-                # (more sophisticated: check if mutation is favorable)
-                a_score += reward * 0.5  # Conservative scaling
-
-        # === STABILITY SCORE ===
-        s_score = 0.0
-
-        # Aggregate stability rule rewards
-        for rule in stability_rules:
-            reward = float(rule.get("reward", 0.3))
-            # Simple model: add base reward
-            # (more sophisticated: check specific positions/pairs)
-            s_score += reward * 0.5  # Conservative scaling
-
-        act_out[sid] = a_score
-        st_out[sid] = s_score
+    for start in range(0, len(seqs), chunk):
+        batch = seqs[start:start + chunk]
+        activity, stability = compiled.score(map_to_positions(batch, compiled.positions, wt_seq, min_identity))
+        for (sid, _), a_score, s_score in zip(batch, activity.tolist(), stability.tolist()):
+            act_out[sid] = a_score
+            st_out[sid] = s_score
 
     return act_out, st_out
@@ -1,16 +1,20 @@
-from Bio.SeqUtils.ProtParam import ProteinAnalysis
+from src.features.composition import composition_features
+
+
 def solubility_proxy_scores(seqs, cfg):
-    out = {}
-    for sid, s in seqs:
-        p = ProteinAnalysis(s)
-        gravy = p.gravy()
-        aro = p.aromaticity()
-        pi = p.isoelectric_point()
-        aa = p.count_amino_acids()
-        pos = aa.get('K',0)+aa.get('R',0)
-        neg = aa.get('D',0)+aa.get('E',0)
-        charge_balance = (pos-neg)/max(1,len(s))
-        length_penalty = max(0, len(s)-300)*0.001
-        score = (-gravy) + (-0.5*aro) + (0.5-abs(charge_balance)) - length_penalty
-        out[sid] = float(score)
-    return out
+    """
+    Composition-based solubility proxy (higher = more soluble).
+
+    score = -GRAVY - 0.5 * aromaticity + (0.5 - |charge balance|)
+            - 0.001 * max(0, length - 300)
+
+    Features are computed for the whole batch at once (see
+    src/features/composition.py); cfg['composition_chunk_size'] bounds
+    the encoded matrix (default 65536 sequences).
+    """
+    features = composition_features([s for _, s in seqs],
+                                    int(cfg.get('composition_chunk_size', 65536)))
+    length_penalty = (features['length'] - 300).clip(min=0) * 0.001
+    score = (-features['gravy']) + (-0.5 * features['aromaticity']) \
+        + (0.5 - abs(features['charge_balance'])) - length_penalty
+    return {sid: float(v) for (sid, _), v in zip(seqs, score)}
@@ -10,6 +10,70 @@ from src.ensemble.aggregate import fuse_scores
 from src.reporting.methods_scaffold import write_methods
 from src.reporting.figures import plot_distributions
 
+
+def _prepare_variant_maps(seqs, cfg):
+    """
+    Map the library onto each reference a WT-relative channel will use.
+
+    Priors compare against cfg['wt_fasta'], mutation-window PLM scoring
+    against cfg['plm_wt_seq'] (or the wt_fasta WT) and FoldX against the
+    PDB chain. wt-marginal PLM scoring only compares equal-length variants
+    by index and needs no map. Under foldx_mutation_source 'auto' only the
+    variants without mutation codes in their header are mapped to the PDB
+    chain, as only those are called by alignment.
+    Only the alignments a channel reads are run: position maps for priors,
+    mutation calls for FoldX, both for PLM (maps plus identity).
+    Maps are memoised in src.utils_align, so the channels pick them up
+    instead of aligning again.
+    """
+    from src.utils_align import get_variant_map, mapping_workers
+
+    library = [seq for _, seq in seqs]
+    references = {}
+    libraries = {}  # channel -> the sequences it will look up
+    needs = {}  # channel -> (calls, position maps)
+    wt = read_fasta(cfg['wt_fasta']) if cfg.get('wt_fasta') else []
+    if wt and cfg.get('use_priors', False):
+        references['priors'] = wt[0][1]
+        libraries['priors'] = library
+        needs['priors'] = (False, True)
+    if cfg.get('use_plm', True) and cfg.get('plm_scoring', 'pll') == 'mutation-window':
+        plm_wt = cfg.get('plm_wt_seq') or (wt[0][1] if wt else None)
+        if plm_wt:
+            references['PLM'] = plm_wt
+            libraries['PLM'] = library
+            needs['PLM'] = (True, True)
+    source = cfg.get('foldx_mutation_source', 'auto')
+    if cfg.get('use_ddg_foldx', False) and source != 'header':
+        pdb_path = cfg.get('foldx_pdb', 'tools/foldx/5XJH.pdb')
+        chain = cfg.get('foldx_chain', 'A')
+        foldx_library = library
+        if source == 'auto':
+            from src.features.ddg_foldx import _parse_mutations_from_id
+            foldx_library = [seq for seq_id, seq in seqs if not _parse_mutations_from_id(seq_id, chain)]
+        if foldx_library and os.path.exists(pdb_path):
+            from src.structure_index import load_structure_index
+            references['FoldX'] = load_structure_index(
+                pdb_path, chain, cfg.get('structure_cache_dir', 'cache/structures')).sequence
+            libraries['FoldX'] = foldx_library
+            needs['FoldX'] = (True, False)
+
+    workers = mapping_workers(cfg)
+    for reference in dict.fromkeys(references.values()):
+        users = [name for name, ref in references.items() if ref == reference]
+        wanted = [libraries[name] for name in users]
+        if any(part is library for part in wanted):
+            sequences = library
+        else:
+            sequences = list(dict.fromkeys(seq for part in wanted for seq in part))
+        variant_map = get_variant_map(reference, sequences, cfg.get('mapping_min_identity', 0.9), workers)
+        variant_map.align(calls=any(needs[name][0] for name in users),
+                          position_maps=any(needs[name][1] for name in users))
+        users = ', '.join(users)
+        print(f"[INFO] Mapped {len(variant_map)} variants to the {users} reference "
+              f"({int((~variant_map.direct).sum())} aligned, {workers} workers)")
+
+
 def run_pipeline(fasta_path, outdir, cfg):
     """
     Run the complete PETase variant prediction pipeline.
@@ -30,13 +94,21 @@ def run_pipeline(fasta_path, outdir, cfg):
         raise ValueError('No sequences in FASTA')
     scores = {'activity':{}, 'stability':{}, 'expression':{}}
 
+    # Shared WT mapping stage: one pass per reference, reused by the channels
+    try:
+        _prepare_variant_maps(seqs, cfg)
+    except Exception as e:  # Channels fall back to mapping on their own
+        print('[WARN] Mapping stage failed:', e)
+
     # Lazy imports inside try blocks allow pipeline to continue if dependencies missing
     # pylint: disable=import-outside-toplevel,broad-exception-caught
     if cfg.get('use_plm', True):
         try:
-            from src.features.plm_llr import plm_activity_scores, plm_perplexity_proxy
-            scores['activity']['plm_llr'] = plm_activity_scores(seqs, cfg)
-            scores['stability']['plm_perplexity'] = plm_perplexity_proxy(seqs, cfg)
+            from src.features.plm_llr import plm_channel_scores
+            # One shared sweep feeds both PLM-derived channels
+            plm = plm_channel_scores(seqs, cfg)
+            scores['activity']['plm_llr'] = plm['plm_llr']
+            scores['stability']['plm_perplexity'] = plm['plm_perplexity']
         except Exception as e:  # Catch all to ensure pipeline resilience
             print('[WARN] PLM failed:', e)
 
@@ -49,8 +121,9 @@ def run_pipeline(fasta_path, outdir, cfg):
 
     if cfg.get('use_ddg_foldx', False):
         try:
-            from src.features.ddg_foldx import ddg_foldx_scores
-            scores['stability']['ddg_foldx'] = ddg_foldx_scores(seqs, cfg)
+            from src.features.ddg_foldx import ddg_foldx_channels
+            for name, channel in ddg_foldx_channels(seqs, cfg).items():
+                scores['stability'][name] = channel
         except Exception as e:  # Catch all to ensure pipeline resilience
             print('[WARN] FoldX failed:', e)
 
@@ -0,0 +1,184 @@
+"""
+Cached per-chain structure index.
+
+Parses a PDB chain once and keeps what structure-aware channels need as
+compact numpy arrays:
+
+- resnums: PDB residue numbers (int32, chain order)
+- sequence: one-letter sequence of those residues
+- ca / cb: CA and CB coordinates (float32, N x 3); glycines and residues
+  without CB get a virtual CB built from N, CA and C
+
+The index doubles as the sequence-index <-> PDB-numbering map and as the
+base for spatial queries. Indexes are memoised per process and written to
+<cache_dir>/<pdb sha256[:20]>_<chain>.npz, so a structure is parsed at
+most once across runs.
+
+Key functions:
+- load_structure_index(pdb_path, chain, cache_dir): Cached StructureIndex
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Ideal-geometry coefficients for a virtual CB from backbone N, CA, C
+_CB_A, _CB_B, _CB_C = -0.58273431, 0.56802827, -0.54067466
+
+
+class StructureIndex:
+    """
+    Residue numbering, sequence and coordinates of one PDB chain.
+
+    Args:
+        chain: Chain identifier
+        resnums: (N,) PDB residue numbers
+        sequence: One-letter sequence, len N
+        ca: (N, 3) CA coordinates
+        cb: (N, 3) CB (or virtual CB) coordinates
+    """
+
+    def __init__(self, chain: str, resnums, sequence: str, ca, cb):
+        self.chain = chain
+        self.resnums = np.asarray(resnums, dtype=np.int32)
+        self.sequence = sequence
+        self.ca = np.asarray(ca, dtype=np.float32)
+        self.cb = np.asarray(cb, dtype=np.float32)
+        self._row = {int(r): i for i, r in enumerate(self.resnums)}
+
+    @classmethod
+    def from_pdb(cls, pdb_path: str, chain: str = 'A') -> 'StructureIndex':
+        """Parse standard amino-acid residues of one chain (first model)."""
+        from Bio.PDB import PDBParser
+        from Bio.PDB.Polypeptide import protein_letters_3to1
+
+        structure = PDBParser(QUIET=True).get_structure('protein', pdb_path)
+        resnums, letters, ca, cb = [], [], [], []
+        for residue in structure[0][chain]:
+            resname = residue.resname.upper()
+            if residue.id[0] != ' ' or resname not in protein_letters_3to1 or 'CA' not in residue:
+                continue
+            ca_xyz = residue['CA'].coord
+            if 'CB' in residue:
+                cb_xyz = residue['CB'].coord
+            elif 'N' in residue and 'C' in residue:
+                b = ca_xyz - residue['N'].coord
+                c = residue['C'].coord - ca_xyz
+                cb_xyz = _CB_A * np.cross(b, c) + _CB_B * b + _CB_C * c + ca_xyz
+            else:
+                cb_xyz = ca_xyz
+            resnums.append(residue.id[1])
+            letters.append(protein_letters_3to1[resname])
+            ca.append(ca_xyz)
+            cb.append(cb_xyz)
+        return cls(chain, resnums, ''.join(letters),
+                   np.reshape(ca, (-1, 3)), np.reshape(cb, (-1, 3)))
+
+    def save(self, path):
+        """Write the index as an uncompressed .npz (atomic replace)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, chain=np.frombuffer(self.chain.encode('ascii'), dtype=np.uint8),
+                 resnums=self.resnums, ca=self.ca, cb=self.cb,
+                 sequence=np.frombuffer(self.sequence.encode('ascii'), dtype=np.uint8))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> 'StructureIndex':
+        with np.load(path) as data:
+            return cls(data['chain'].tobytes().decode('ascii'), data['resnums'],
+                       data['sequence'].tobytes().decode('ascii'), data['ca'], data['cb'])
+
+    def __len__(self):
+        return len(self.resnums)
+
+    @property
+    def first_res(self) -> int:
+        return int(self.resnums.min())
+
+    @property
+    def last_res(self) -> int:
+        return int(self.resnums.max())
+
+    @property
+    def offset(self) -> int:
+        """First residue number - 1 (sequence position + offset = PDB number)."""
+        return int(self.resnums[0]) - 1
+
+    def __contains__(self, resnum) -> bool:
+        return int(resnum) in self._row
+
+    def residue(self, resnum: int) -> Optional[str]:
+        """One-letter code at a PDB residue number (None if absent)."""
+        row = self._row.get(int(resnum))
+        return None if row is None else self.sequence[row]
+
+    def residues(self) -> List[tuple]:
+        """(resnum, aa) pairs in chain order."""
+        return list(zip(self.resnums.tolist(), self.sequence))
+
+    def seq_to_pdb(self, index: int) -> int:
+        """0-based index into self.sequence -> PDB residue number."""
+        return int(self.resnums[index])
+
+    def pdb_to_seq(self, resnum: int) -> Optional[int]:
+        """PDB residue number -> 0-based index into self.sequence (None if absent)."""
+        return self._row.get(int(resnum))
+
+    def neighbors(self, resnum: int, radius: float = 8.0) -> np.ndarray:
+        """PDB numbers of residues whose CB lies within radius Å of resnum's CB."""
+        row = self._row[int(resnum)]
+        dist = np.linalg.norm(self.cb - self.cb[row], axis=1)
+        mask = dist <= radius
+        mask[row] = False
+        return self.resnums[mask]
+
+    def cb_distances(self) -> np.ndarray:
+        """(N, N) CB-CB distance matrix."""
+        diff = self.cb[:, None, :] - self.cb[None, :, :]
+        return np.sqrt((diff ** 2).sum(-1))
+
+
+# Process-level memo: (abs path, size, mtime_ns, chain) -> StructureIndex
+_INDEXES: Dict[tuple, StructureIndex] = {}
+
+
+def load_structure_index(pdb_path: str, chain: str = 'A', cache_dir: str = None) -> StructureIndex:
+    """
+    Return the StructureIndex of one chain, parsing the PDB at most once.
+
+    Args:
+        pdb_path: Path to PDB file
+        chain: Chain identifier
+        cache_dir: Directory for .npz indexes keyed by PDB content hash
+                   (None = in-process memo only)
+
+    Returns:
+        StructureIndex
+    """
+    stat = os.stat(pdb_path)
+    memo_key = (os.path.abspath(pdb_path), stat.st_size, stat.st_mtime_ns, chain)
+    if memo_key in _INDEXES:
+        return _INDEXES[memo_key]
+
+    index = None
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha256(Path(pdb_path).read_bytes()).hexdigest()[:20]
+        cache_path = Path(cache_dir) / f"{digest}_{chain}.npz"
+        if cache_path.exists():
+            try:
+                index = StructureIndex.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                index = None
+    if index is None:
+        index = StructureIndex.from_pdb(pdb_path, chain)
+        if cache_path is not None:
+            index.save(cache_path)
+
+    _INDEXES[memo_key] = index
+    return index
@@ -0,0 +1,454 @@
+"""
+Sequence-to-reference comparison for mutation calling and position mapping.
+
+Variants of the same length as the reference whose identity reaches a
+threshold are compared position by position on uint8 byte matrices (one
+vectorised Hamming comparison for the whole group) and map onto the
+reference by index. Everything else is aligned, and the two things an
+alignment gives are computed separately, only when a channel asks:
+- mutation calls (substitutions, internal indels, identity) from a global
+  PairwiseAligner alignment with free end gaps, so N/C-terminal extensions
+  (signal peptides, tags) and truncations do not count as indels;
+- the reference -> variant position map from an alignment with the scores
+  of the former pairwise2.globalms(2, -1, -5, -1) mapping (end gaps
+  penalised), which the priors position tables were calibrated against.
+Both are memoised by content hash and can be spread over a process pool.
+
+The result for a whole library is a VariantMap. run_pipeline prepares one
+per reference up front (see get_variant_map) and aligns the parts its
+channels use, so every WT-relative channel reuses it.
+
+Key functions:
+- call_substitutions(reference, sequences): Per-sequence substitutions vs reference
+- aligned_blocks(reference, sequence): Gap-free aligned segments
+- reference_map(reference, sequence): Reference -> variant position array
+- map_reference_positions(reference, sequences, positions): Batched position mapping
+- get_variant_map(reference, sequences): Memoised VariantMap of a library
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def _aligner():
+    from Bio.Align import PairwiseAligner, substitution_matrices
+
+    aligner = PairwiseAligner()
+    aligner.mode = 'global'
+    aligner.substitution_matrix = substitution_matrices.load('BLOSUM62')
+    aligner.open_gap_score = -10.0
+    aligner.extend_gap_score = -0.5
+    # Terminal overhangs on either side are free
+    aligner.end_gap_score = 0.0
+    return aligner
+
+
+@lru_cache(maxsize=None)
+def _mapping_aligner():
+    from Bio.Align import PairwiseAligner
+
+    # Scores of the former pairwise2.globalms(wt, seq, 2, -1, -5, -1) mapping,
+    # end gaps penalised like internal ones
+    aligner = PairwiseAligner()
+    aligner.mode = 'global'
+    aligner.match_score = 2.0
+    aligner.mismatch_score = -1.0
+    aligner.open_gap_score = -5.0
+    aligner.extend_gap_score = -1.0
+    return aligner
+
+
+def _position_map(reference: str, sequence: str) -> np.ndarray:
+    """(len(reference),) 1-based variant position per reference position, 0 = gap."""
+    mapped = np.zeros(len(reference), dtype=np.int32)
+    if reference and sequence:
+        alignment = _mapping_aligner().align(reference.upper(), sequence.upper())[0]
+        for (r0, r1), (s0, _) in zip(*alignment.aligned):
+            mapped[r0:r1] = np.arange(s0 + 1, s0 + 1 + r1 - r0, dtype=np.int32)
+    return mapped
+
+
+def aligned_blocks(reference: str, sequence: str) -> List[Tuple[int, int, int, int]]:
+    """
+    Gap-free segments of the best global alignment.
+
+    With free end gaps, aligning a few terminal residues as mismatches ties
+    with leaving them in the overhang (e.g. the GSHM cloning tag of a PDB
+    chain against a native N-terminus), so runs of mismatches at the end
+    of a block that borders an overhang are trimmed off rather than
+    called as substitutions.
+
+    Returns:
+        List of (ref_start, ref_end, seq_start, seq_end), 0-based half-open
+    """
+    if not reference or not sequence:
+        return []
+    reference, sequence = reference.upper(), sequence.upper()
+    alignment = _aligner().align(reference, sequence)[0]
+    ref_blocks, seq_blocks = alignment.aligned
+    blocks = [[int(r0), int(r1), int(s0), int(s1)]
+              for (r0, r1), (s0, s1) in zip(ref_blocks, seq_blocks)]
+    while blocks and (blocks[0][0] or blocks[0][2]):
+        r0, r1, s0, _ = blocks[0]
+        while r0 < r1 and reference[r0] != sequence[s0]:
+            r0, s0 = r0 + 1, s0 + 1
+        if r0 < r1:
+            blocks[0][0], blocks[0][2] = r0, s0
+            break
+        blocks.pop(0)
+    while blocks and (blocks[-1][1] < len(reference) or blocks[-1][3] < len(sequence)):
+        r0, r1, _, s1 = blocks[-1]
+        while r1 > r0 and reference[r1 - 1] != sequence[s1 - 1]:
+            r1, s1 = r1 - 1, s1 - 1
+        if r1 > r0:
+            blocks[-1][1], blocks[-1][3] = r1, s1
+            break
+        blocks.pop()
+    return [tuple(block) for block in blocks]
+
+
+def _call_one(reference: str, sequence: str):
+    """(substitutions, indels, identity) of one variant."""
+    blocks = aligned_blocks(reference, sequence)
+    if not blocks:
+        return [], 0, 0.0
+    substitutions = []
+    identical = 0
+    for r0, r1, s0, s1 in blocks:
+        ref_part = reference[r0:r1].upper()
+        seq_part = sequence[s0:s1].upper()
+        for offset, (a, b) in enumerate(zip(ref_part, seq_part)):
+            if a == b:
+                identical += 1
+            else:
+                substitutions.append((a, r0 + offset, b))
+    # Each break between consecutive blocks is one internal insertion/deletion
+    indels = sum(1 for prev, nxt in zip(blocks, blocks[1:])
+                 if nxt[0] != prev[1] or nxt[2] != prev[3])
+    return substitutions, indels, identical / len(reference)
+
+
+def _align_chunk(args):
+    kind, reference, sequences = args
+    align = _call_one if kind == 'calls' else _position_map
+    return [align(reference, s) for s in sequences]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()
+
+
+# Memos: (sha1(reference), sha1(sequence)) -> _call_one() / _position_map() result
+_CALLED: Dict[Tuple[str, str], tuple] = {}
+_MAPPED: Dict[Tuple[str, str], np.ndarray] = {}
+_ALIGNED_MAX = 200_000
+
+
+def _align_all(kind: str, reference: str, sequences: List[str], workers: int = 1) -> list:
+    """
+    _call_one ('calls') or _position_map ('maps') of each sequence, memoised.
+
+    Distinct sequences missing from the memo are aligned once, over a
+    process pool when there are enough of them.
+    """
+    memo = _CALLED if kind == 'calls' else _MAPPED
+    ref_key = _digest(reference)
+    keys = [(ref_key, _digest(s)) for s in sequences]
+    found = {}
+    pending = {}
+    for key, sequence in zip(keys, sequences):
+        if key in memo:
+            found[key] = memo[key]
+        else:
+            pending.setdefault(key, sequence)
+    if pending:
+        todo = list(pending.values())
+        results = None
+        if workers > 1 and len(todo) >= 2 * workers:
+            size = -(-len(todo) // (workers * 4))
+            chunks = [(kind, reference, todo[k:k + size]) for k in range(0, len(todo), size)]
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = [r for part in pool.map(_align_chunk, chunks) for r in part]
+            except (OSError, RuntimeError) as e:
+                print(f"[WARN] Parallel alignment unavailable ({e}); aligning in-process")
+        if results is None:
+            results = _align_chunk((kind, reference, todo))
+        found.update(zip(pending, results))
+        if len(memo) + len(results) > _ALIGNED_MAX:
+            memo.clear()
+        memo.update(zip(pending, results))
+    return [found[key] for key in keys]
+
+
+class VariantMap:
+    """
+    WT-relative view of a sequence library against one reference.
+
+    Rows that map onto the reference by index are compared on construction;
+    the other rows are aligned the first time their calls (substitutions,
+    indels, identity) or position maps are asked for, each kind on its own.
+
+    Args:
+        reference: Reference (WT) sequence
+        sequences: The variant sequences, in row order
+        direct: (N,) True where the variant maps onto the reference by index
+        substitutions: Per variant [(ref_aa, 0-based reference index, variant_aa)],
+                       filled in for the direct rows
+        identity: (N,) fraction of reference residues matched identically,
+                  filled in for the direct rows
+        workers: Processes for the alignments run on demand
+    """
+
+    def __init__(self, reference: str, sequences, direct, substitutions, identity, workers: int = 1):
+        self.reference = reference
+        self.sequences = sequences
+        self.direct = np.asarray(direct, dtype=bool)
+        self.workers = workers
+        self._substitutions = list(substitutions)
+        self._indels = np.zeros(len(self.direct), dtype=np.int32)
+        self._identity = np.asarray(identity, dtype=np.float64)
+        self._called = self.direct.copy()
+        self._aligned = {}
+        self._rows = None
+
+    def __len__(self):
+        return len(self.direct)
+
+    def align(self, calls: bool = False, position_maps: bool = False) -> 'VariantMap':
+        """Align the indirect rows for the calls and/or position maps not computed yet."""
+        if calls:
+            rows = np.flatnonzero(~self._called)
+            results = _align_all('calls', self.reference, [self.sequences[r] for r in rows], self.workers)
+            for row, (subs, n_indels, ident) in zip(rows, results):
+                self._substitutions[row] = subs
+                self._indels[row] = n_indels
+                self._identity[row] = ident
+            self._called[rows] = True
+        if position_maps:
+            rows = [int(r) for r in np.flatnonzero(~self.direct) if r not in self._aligned]
+            results = _align_all('maps', self.reference, [self.sequences[r] for r in rows], self.workers)
+            self._aligned.update(zip(rows, results))
+        return self
+
+    @property
+    def substitutions(self) -> List[List[Tuple[str, int, str]]]:
+        """Per variant [(ref_aa, 0-based reference index, variant_aa)]."""
+        return self.align(calls=True)._substitutions
+
+    @property
+    def indels(self) -> np.ndarray:
+        """(N,) internal indel counts (terminal overhangs excluded)."""
+        return self.align(calls=True)._indels
+
+    @property
+    def identity(self) -> np.ndarray:
+        """(N,) fraction of reference residues matched identically."""
+        return self.align(calls=True)._identity
+
+    @property
+    def aligned(self) -> Dict[int, np.ndarray]:
+        """{row: (len(reference),) 1-based variant positions, 0 = gap} of the indirect rows."""
+        return self.align(position_maps=True)._aligned
+
+    def calls(self) -> List[Tuple[List[Tuple[str, int, str]], int, float]]:
+        """(substitutions, indels, identity) per variant."""
+        return [(subs, int(n), float(ident))
+                for subs, n, ident in zip(self.substitutions, self.indels, self.identity)]
+
+    def position_map(self, row: int) -> np.ndarray:
+        """(len(reference),) 1-based variant position of each reference position (0 = gap)."""
+        if self.direct[row]:
+            return np.arange(1, len(self.reference) + 1, dtype=np.int32)
+        return self.aligned[row]
+
+    def positions(self, positions) -> np.ndarray:
+        """
+        Variant positions aligned to selected reference positions.
+
+        Returns:
+            (N, K) int64 array of 1-based variant positions, 0 where unaligned
+            (or beyond the reference)
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        in_ref = (positions >= 1) & (positions <= len(self.reference))
+        out = np.zeros((len(self), len(positions)), dtype=np.int64)
+        out[self.direct] = np.where(in_ref, positions, 0)
+        for row, mapped in self.aligned.items():
+            out[row, in_ref] = mapped[positions[in_ref] - 1]
+        return out
+
+    def take(self, rows) -> 'VariantMap':
+        """Sub-map of the given rows, in that order (with what is aligned so far)."""
+        rows = [int(r) for r in rows]
+        sub = VariantMap(self.reference, [self.sequences[r] for r in rows], self.direct[rows],
+                         [self._substitutions[r] for r in rows], self._identity[rows], self.workers)
+        sub._indels = self._indels[rows]
+        sub._called = self._called[rows]
+        sub._aligned = {i: self._aligned[r] for i, r in enumerate(rows) if r in self._aligned}
+        return sub
+
+    def row_of(self) -> Dict[str, int]:
+        """Sequence -> row (first occurrence), built on first use."""
+        if self._rows is None:
+            self._rows = {}
+            for row, sequence in enumerate(self.sequences):
+                self._rows.setdefault(sequence, row)
+        return self._rows
+
+
+def map_variants(reference: str, sequences: List[str], min_identity: float = 0.9,
+                 workers: int = 1) -> VariantMap:
+    """
+    Compare a library to the reference.
+
+    Only the index comparison runs here; the other rows are aligned when
+    the VariantMap is first asked for their calls or position maps.
+
+    Args:
+        reference: Reference (WT) sequence
+        sequences: Variant sequences
+        min_identity: Identity an equal-length variant needs to be compared
+                      by index (substitution-only) instead of aligned
+        workers: Processes for the alignments (1 = in this process)
+
+    Returns:
+        VariantMap
+    """
+    n = len(sequences)
+    substitutions = [None] * n
+    identity = np.zeros(n, dtype=np.float64)
+    direct = np.zeros(n, dtype=bool)
+    reference_upper = reference.upper()
+
+    same_length = [i for i, s in enumerate(sequences) if len(s) == len(reference) and s]
+    if same_length:
+        ref_bytes = np.frombuffer(reference_upper.encode('ascii', 'replace'), dtype=np.uint8)
+        upper = [sequences[i].upper() for i in same_length]
+        codes = np.frombuffer(''.join(upper).encode('ascii', 'replace'), dtype=np.uint8)
+        diff = codes.reshape(len(same_length), len(reference)) != ref_bytes[None, :]
+        row_identity = 1.0 - diff.sum(axis=1) / len(reference)
+        for row in np.flatnonzero(row_identity >= min_identity):
+            i = same_length[row]
+            positions = np.flatnonzero(diff[row])
+            substitutions[i] = [(reference_upper[p], int(p), upper[row][p]) for p in positions]
+            identity[i] = row_identity[row]
+            direct[i] = True
+
+    return VariantMap(reference, list(sequences), direct, substitutions, identity, workers)
+
+
+# Process-level memo: (sha1(reference), sha1(library), min_identity) -> VariantMap
+_VARIANT_MAPS: Dict[tuple, VariantMap] = {}
+_VARIANT_MAPS_MAX = 8
+
+
+def _library_digest(sequences: List[str]) -> str:
+    h = hashlib.sha1()
+    for s in sequences:
+        h.update(s.encode('utf-8', 'replace'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def find_variant_map(reference: str, sequences: List[str], min_identity: float = 0.9) -> Optional[VariantMap]:
+    """
+    A memoised VariantMap covering exactly these sequences, or None.
+
+    A library prepared earlier also serves any subset of its sequences.
+    """
+    ref_key = _digest(reference)
+    hit = _VARIANT_MAPS.get((ref_key, _library_digest(sequences), min_identity))
+    if hit is not None:
+        return hit
+    for (ref, _, threshold), prepared in _VARIANT_MAPS.items():
+        if ref != ref_key or threshold != min_identity:
+            continue
+        rows = prepared.row_of()
+        if all(s in rows for s in sequences):
+            return prepared.take([rows[s] for s in sequences])
+    return None
+
+
+def get_variant_map(reference: str, sequences: List[str], min_identity: float = 0.9,
+                    workers: int = 1) -> VariantMap:
+    """
+    VariantMap of a library, computed at most once per process.
+
+    Args:
+        reference: Reference (WT) sequence
+        sequences: Variant sequences
+        min_identity: See map_variants
+        workers: Processes for the alignments of a newly computed map
+
+    Returns:
+        VariantMap
+    """
+    found = find_variant_map(reference, sequences, min_identity)
+    if found is not None:
+        return found
+    variant_map = map_variants(reference, sequences, min_identity, workers)
+    if len(_VARIANT_MAPS) >= _VARIANT_MAPS_MAX:
+        _VARIANT_MAPS.pop(next(iter(_VARIANT_MAPS)))
+    _VARIANT_MAPS[(_digest(reference), _library_digest(sequences), min_identity)] = variant_map
+    return variant_map
+
+
+def mapping_workers(cfg: dict) -> int:
+    """Processes for the mapping stage (cfg['mapping_workers'], default all cores)."""
+    return max(1, int(cfg.get('mapping_workers') or os.cpu_count() or 1))
+
+
+def call_substitutions(reference: str, sequences: List[str],
+                       min_identity: float = 0.0) -> List[Tuple[List[Tuple[str, int, str]], int, float]]:
+    """
+    Call substitutions of each sequence relative to reference.
+
+    Args:
+        reference: Reference (WT) sequence
+        sequences: Variant sequences
+        min_identity: Equal-length sequences below this identity are aligned
+                      instead of compared by index (default: never)
+
+    Returns:
+        One (substitutions, indels, identity) per sequence:
+        substitutions as (ref_aa, 0-based reference index, variant_aa),
+        the number of internal indels (terminal overhangs excluded) and
+        identity as the fraction of reference residues matched identically
+        (so short unrelated fragments score low)
+    """
+    return map_variants(reference, sequences, min_identity).calls()
+
+
+def reference_map(reference: str, sequence: str) -> np.ndarray:
+    """
+    Map every reference position onto the variant by global alignment.
+
+    Returns:
+        (len(reference),) int32 array of 1-based variant positions,
+        0 where the reference residue is aligned to a gap
+    """
+    return _align_all('maps', reference, [sequence])[0]
+
+
+def map_reference_positions(reference: str, sequences: List[str], positions,
+                            min_identity: float = 0.9) -> np.ndarray:
+    """
+    Variant positions aligned to selected reference positions.
+
+    Sequences as long as the reference whose position-by-position identity
+    is at least min_identity are taken as substitution-only and map by
+    index; the others are aligned. Reuses the library map when run_pipeline
+    has prepared one.
+
+    Returns:
+        (N, K) int64 array of 1-based variant positions, 0 where unaligned
+        (or beyond the reference)
+    """
+    return get_variant_map(reference, sequences, min_identity).positions(positions)
@@ -1,4 +1,55 @@
+import re
+
 from Bio import SeqIO
 
+# Canonical amino acids; index in this string is the uint8 code used by encode_sequences
+AA_ORDER = "ACDEFGHIKLMNPQRSTVWY"
+UNKNOWN_CODE = 255
+
+# Mutation code in a FASTA header: [WT aa][1-4 digit position][Mut aa], delimited
+# by start/end of string, '_' or '|' (e.g. "FAST_PETase|S121E_D186H")
+MUTATION_CODE_PATTERN = re.compile(r'(?:^|[_|])([A-Z])(\d{1,4})([A-Z])(?=[_|]|$)')
+
+
 def read_fasta(path):
     return [(rec.id, str(rec.seq)) for rec in SeqIO.parse(path, "fasta")]
+
+
+def encode_sequences(strings, length=None):
+    """
+    Encode sequences into a (N, length) uint8 matrix of AA_ORDER indices.
+
+    Non-canonical residues map to UNKNOWN_CODE; sequences shorter than
+    length are right-padded with UNKNOWN_CODE (longer ones are truncated).
+    """
+    import numpy as np
+
+    lut = np.full(256, UNKNOWN_CODE, dtype=np.uint8)
+    for i, aa in enumerate(AA_ORDER):
+        lut[ord(aa)] = i
+        lut[ord(aa.lower())] = i
+    if length is None:
+        length = max((len(s) for s in strings), default=0)
+    if strings and all(len(s) == length for s in strings):
+        # Common case (substitution libraries): one buffer for the whole batch
+        raw = np.frombuffer("".join(strings).encode("ascii", "replace"), dtype=np.uint8)
+        if len(raw) == len(strings) * length:
+            return lut[raw].reshape(len(strings), length)
+    out = np.full((len(strings), length), UNKNOWN_CODE, dtype=np.uint8)
+    for row, s in enumerate(strings):
+        raw = np.frombuffer(s[:length].encode("ascii", "replace"), dtype=np.uint8)
+        out[row, :len(raw)] = lut[raw]
+    return out
+
+
+def parse_mutation_codes(seq_id):
+    """
+    Parse mutation codes from a FASTA sequence ID.
+
+    Example:
+        "FAST_PETase|S121E_D186H" -> [("S", 121, "E"), ("D", 186, "H")]
+
+    Returns:
+        List of (wt_aa, position, mut_aa) with 1-based positions as written
+    """
+    return [(wt, int(pos), mut) for wt, pos, mut in MUTATION_CODE_PATTERN.findall(seq_id)]
@@ -0,0 +1,139 @@
+"""
+Tests for sequence-to-reference mutation calling (src/utils_align.py)
+
+Test Coverage:
+- Equal-length Hamming comparison
+- Alignment fallback with terminal overhangs and internal indels
+- Non-canonical residues and empty inputs
+- Reference position mapping (Hamming shortcut, alignment memo)
+"""
+
+import pytest
+
+WT = "MNFPRASRLMQAAVLGGLMAVSAAATAQTNPYARGPNPTAASLEASAGPFTVRSFTVSRPSGYGAGTVYYPTNAGGTVGAIAIVPGYTARQSS"
+
+
+class TestCallSubstitutions:
+    """call_substitutions against a PETase fragment"""
+
+    def test_equal_length_hamming(self):
+        from src.utils_align import call_substitutions
+
+        variant = WT[:4] + "K" + WT[5:20] + "W" + WT[21:]
+        [(subs, indels, identity)] = call_substitutions(WT, [variant])
+        assert subs == [("R", 4, "K"), (WT[20], 20, "W")]
+        assert indels == 0
+        assert identity == pytest.approx(1 - 2 / len(WT))
+
+    def test_terminal_overhangs_are_free(self):
+        """Tags and truncations align without counting as indels"""
+        from src.utils_align import call_substitutions
+
+        tagged = "HHHHHH" + WT[:40] + "E" + WT[41:]
+        truncated = WT[10:]
+        (subs, indels, _), (subs_t, indels_t, identity_t) = call_substitutions(WT, [tagged, truncated])
+        assert subs == [(WT[40], 40, "E")]
+        assert indels == 0
+        assert subs_t == [] and indels_t == 0
+        assert identity_t == pytest.approx((len(WT) - 10) / len(WT))
+
+    def test_internal_indel_counted(self):
+        from src.utils_align import aligned_blocks, call_substitutions
+
+        deletion = WT[:50] + WT[53:]
+        [(subs, indels, _)] = call_substitutions(WT, [deletion])
+        assert subs == []
+        assert indels == 1
+        blocks = aligned_blocks(WT, deletion)
+        assert len(blocks) == 2 and blocks[0][2] == 0
+
+    def test_noncanonical_and_empty(self):
+        from src.utils_align import call_substitutions
+
+        variant = WT[:7] + "X" + WT[8:]
+        (subs, _, _), (subs_e, _, identity_e) = call_substitutions(WT, [variant, ""])
+        assert subs == [("R", 7, "X")]
+        assert subs_e == [] and identity_e == 0.0
+
+
+class TestReferencePositions:
+    """Reference -> variant position mapping"""
+
+    def test_reference_map_shifts_after_deletion(self):
+        from src.utils_align import reference_map
+
+        mapped = reference_map(WT, WT[:50] + WT[53:])
+        assert mapped[:50].tolist() == list(range(1, 51))
+        assert (mapped[50:53] == 0).all()
+        assert mapped[60] == 58
+        assert reference_map(WT, WT[:50] + WT[53:]) is mapped  # memoised
+
+    def test_hamming_shortcut_skips_alignment(self):
+        from src.utils_align import map_variants
+
+        substituted = WT[:4] + "K" + WT[5:]
+        tagged = "HHHHHH" + WT
+        variant_map = map_variants(WT, [substituted, tagged])
+        assert variant_map.direct.tolist() == [True, False]
+        assert list(variant_map.aligned) == [1]
+        out = variant_map.positions([1, 5, len(WT), len(WT) + 5])
+        assert out[0].tolist() == [1, 5, len(WT), 0]
+        assert out[1].tolist() == [7, 11, len(WT) + 6, 0]
+        assert variant_map.substitutions == [[("R", 4, "K")], []]
+
+    def test_low_identity_equal_length_is_aligned(self):
+        from src.utils_align import map_reference_positions
+
+        shifted = WT[1:] + "A"
+        out = map_reference_positions(WT, [shifted], [10, 20])
+        assert out[0].tolist() == [9, 19]
+
+
+class TestVariantMap:
+    """Library maps shared between channels"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_memo(self, monkeypatch):
+        import src.utils_align as utils_align
+        monkeypatch.setattr(utils_align, "_VARIANT_MAPS", {})
+        monkeypatch.setattr(utils_align, "_CALLED", {})
+        monkeypatch.setattr(utils_align, "_MAPPED", {})
+
+    def library(self):
+        return [WT, WT[:4] + "K" + WT[5:], "HHHHHH" + WT, WT[:50] + WT[53:], WT[10:], WT[:30] + "GG" + WT[30:]]
+
+    def test_process_pool_matches_serial(self):
+        import src.utils_align as utils_align
+
+        parallel = utils_align.map_variants(WT, self.library(), workers=2).align(True, True)
+        utils_align._CALLED.clear()
+        utils_align._MAPPED.clear()
+        serial = utils_align.map_variants(WT, self.library(), workers=1)
+        assert parallel.calls() == serial.calls()
+        assert parallel.positions(range(1, len(WT) + 1)).tolist() == \
+            serial.positions(range(1, len(WT) + 1)).tolist()
+
+    def test_aligns_only_what_is_read(self, monkeypatch):
+        import src.utils_align as utils_align
+
+        variant_map = utils_align.map_variants(WT, self.library())
+        monkeypatch.setattr(utils_align, "_call_one", lambda *a: pytest.fail("calls aligned"))
+        assert variant_map.positions([60])[3].tolist() == [57]
+        assert utils_align.reference_map(WT, "HHHHHH" + WT)[0] == 7
+        monkeypatch.undo()
+
+        variant_map = utils_align.map_variants(WT, self.library())
+        monkeypatch.setattr(utils_align, "_position_map", lambda *a: pytest.fail("map aligned"))
+        assert variant_map.calls()[3][1] == 1
+
+    def test_prepared_map_serves_subsets(self):
+        from src.utils_align import find_variant_map, get_variant_map
+
+        library = self.library()
+        prepared = get_variant_map(WT, library)
+        assert get_variant_map(WT, list(library)) is prepared
+        subset = find_variant_map(WT, [library[3], library[1]])
+        assert subset.calls() == [prepared.calls()[3], prepared.calls()[1]]
+        assert subset.positions([60]).tolist() == [[57], [60]]
+        assert find_variant_map(WT, [library[1], "MKT"]) is None
+        assert find_variant_map(WT, library, min_identity=0.5) is None
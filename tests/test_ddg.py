@@ -14,6 +14,7 @@ Test Coverage:
 
 import pytest
 import os
+import numpy as np
 import tempfile
 from pathlib import Path
 
@@ -40,42 +41,6 @@ class TestFoldXSetup:
 class TestFoldXMutationGeneration:
     """Test mutation file generation for FoldX"""
 
-    def test_generate_mutation_list_single(self):
-        """Test generating mutation list for single mutation"""
-        from src.features.ddg_foldx import _generate_mutation_list
-
-        wt_seq = "MNFPRASRLM"
-        mut_seq = "MNFPRASKLM"  # R8K mutation (position 8 is R, not L)
-
-        mutations = _generate_mutation_list(wt_seq, mut_seq)
-
-        assert isinstance(mutations, list)
-        assert len(mutations) == 1
-        assert mutations[0] == "RA8K"  # FoldX format: original + chain + position + new
-
-    def test_generate_mutation_list_multiple(self):
-        """Test generating mutation list for multiple mutations"""
-        from src.features.ddg_foldx import _generate_mutation_list
-
-        wt_seq = "MNFPRASRLM"
-        mut_seq = "MNFPKASKLM"  # R5K and R8K (positions 5 and 8)
-
-        mutations = _generate_mutation_list(wt_seq, mut_seq)
-
-        assert len(mutations) == 2
-        assert "RA5K" in mutations
-        assert "RA8K" in mutations
-
-    def test_generate_mutation_list_wildtype(self):
-        """Test that wild-type returns empty mutation list"""
-        from src.features.ddg_foldx import _generate_mutation_list
-
-        wt_seq = "MNFPRASRLM"
-
-        mutations = _generate_mutation_list(wt_seq, wt_seq)
-
-        assert mutations == []
-
     def test_create_individual_list_file(self):
         """Test creating individual_list.txt for FoldX"""
         from src.features.ddg_foldx import _create_individual_list
@@ -113,35 +78,19 @@ class TestFoldXExecution:
             # Check that FoldX was called (result could be error, but function ran)
             assert isinstance(result, dict)
 
-    def test_parse_foldx_output(self):
-        """Test parsing FoldX output files"""
-        from src.features.ddg_foldx import _parse_foldx_output
-
-        # Create mock FoldX output
-        with tempfile.TemporaryDirectory() as tmpdir:
-            output_file = Path(tmpdir) / "Average_5XJH.fxout"
-            output_file.write_text(
-                "5XJH\tS121E\t2.45\t-1.32\t3.77\n"
-                "5XJH\tD186H\t1.89\t-0.54\t2.43\n"
-            )
-
-            ddg_dict = _parse_foldx_output(tmpdir)
-
-            assert isinstance(ddg_dict, dict)
-            assert "S121E" in ddg_dict
-            assert isinstance(ddg_dict["S121E"], float)
-
 
 class TestFoldXScoring:
     """Test main FoldX scoring interface"""
 
     @pytest.fixture
-    def test_config(self):
+    def test_config(self, tmp_path):
         """Test configuration"""
         return {
             'foldx_exe': 'tools/foldx/foldx_20251231.exe',
             'foldx_pdb': 'tools/foldx/5XJH.pdb',
             'foldx_wt_seq': None,  # Will auto-extract from PDB
+            'foldx_cache_dir': str(tmp_path / "cache"),
+            'structure_cache_dir': str(tmp_path / "structures"),
         }
 
     def test_ddg_foldx_scores_returns_dict(self, test_config):
@@ -208,12 +157,14 @@ class TestFoldXIntegration:
         return seqs
 
     @pytest.fixture
-    def test_config(self):
+    def test_config(self, tmp_path):
         """Real config for integration tests"""
         return {
             'foldx_exe': 'tools/foldx/foldx_20251231.exe',
             'foldx_pdb': 'tools/foldx/5XJH.pdb',
             'foldx_timeout': 300,  # 5 minutes per variant
+            'foldx_cache_dir': str(tmp_path / "cache"),
+            'structure_cache_dir': str(tmp_path / "structures"),
         }
 
     def test_real_petase_variants(self, real_sequences, test_config):
@@ -254,22 +205,30 @@ class TestFoldXIntegration:
 class TestFoldXErrorHandling:
     """Test error handling and edge cases"""
 
-    def test_missing_executable(self):
+    @pytest.fixture
+    def cache_dirs(self, tmp_path):
+        """Keep FoldX and structure caches out of the repository"""
+        return {
+            'foldx_cache_dir': str(tmp_path / "cache"),
+            'structure_cache_dir': str(tmp_path / "structures"),
+        }
+
+    def test_missing_executable(self, cache_dirs):
         """Test handling of missing FoldX executable"""
         from src.features.ddg_foldx import ddg_foldx_scores
 
-        cfg = {'foldx_exe': 'nonexistent_foldx.exe'}
+        cfg = dict(cache_dirs, foldx_exe='nonexistent_foldx.exe')
         seqs = [("test", "MNFPRASRLM")]
 
         # Should return empty dict or raise informative error
         result = ddg_foldx_scores(seqs, cfg)
         assert isinstance(result, dict)
 
-    def test_invalid_sequence(self):
+    def test_invalid_sequence(self, cache_dirs):
         """Test handling of invalid amino acid sequence"""
         from src.features.ddg_foldx import ddg_foldx_scores
 
-        cfg = {'foldx_exe': 'tools/foldx/foldx_20251231.exe'}
+        cfg = dict(cache_dirs, foldx_exe='tools/foldx/foldx_20251231.exe')
         seqs = [("invalid", "XYZABC123")]  # Invalid amino acids
 
         result = ddg_foldx_scores(seqs, cfg)
@@ -277,14 +236,12 @@ class TestFoldXErrorHandling:
         # Should handle gracefully
         assert isinstance(result, dict)
 
-    def test_timeout_handling(self):
+    def test_timeout_handling(self, cache_dirs):
         """Test FoldX timeout handling for long computations"""
         from src.features.ddg_foldx import ddg_foldx_scores
 
-        cfg = {
-            'foldx_exe': 'tools/foldx/foldx_20251231.exe',
-            'foldx_timeout': 1,  # 1 second timeout
-        }
+        cfg = dict(cache_dirs, foldx_exe='tools/foldx/foldx_20251231.exe',
+                   foldx_timeout=1)  # 1 second timeout
         seqs = [("test", "M" * 1000)]  # Very long sequence
 
         result = ddg_foldx_scores(seqs, cfg)
@@ -293,6 +250,403 @@ class TestFoldXErrorHandling:
         assert isinstance(result, dict)
 
 
+@pytest.fixture
+def fake_foldx(tmp_path, monkeypatch):
+    """Fake FoldX install in tmp_path (see TestFoldXParallel.FAKE_FOLDX); returns the executable"""
+    foldx_dir = tmp_path / "foldx"
+    foldx_dir.mkdir()
+    (foldx_dir / "fake_foldx.py").write_text(TestFoldXParallel.FAKE_FOLDX)
+    (foldx_dir / "rotabase.txt").write_text("rotamers\n")
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    monkeypatch.setenv("FAKE_FOLDX_LOG", str(log_dir))
+    return str(foldx_dir / "fake_foldx.py")
+
+
+class TestFoldXParallel:
+    """Test the sandboxed FoldX worker pool with a fake FoldX executable"""
+
+    FAKE_FOLDX = (
+        "import os, shutil, sys, time\n"
+        "log = os.environ['FAKE_FOLDX_LOG']\n"
+        "pdb = [a.split('=', 1)[1] for a in sys.argv if a.startswith('--pdb=')][0]\n"
+        "if '--command=RepairPDB' in sys.argv:\n"
+        "    shutil.copy(pdb, pdb[:-4] + '_Repair.pdb')\n"
+        "    open(os.path.join(log, 'repair_%d' % os.getpid()), 'w').close()\n"
+        "    sys.exit(0)\n"
+        "lines = [l.strip().rstrip(';') for l in open('individual_list.txt') if l.strip()]\n"
+        "muts = [l.split(',') for l in lines]\n"
+        "if any('DA186H' in m for m in muts):\n"
+        "    time.sleep(30)\n"
+        "marker = os.path.join(log, 'flaky_done')\n"
+        "if any('TA250Y' in m for m in muts) and not os.path.exists(marker):\n"
+        "    open(marker, 'w').close()\n"
+        "    time.sleep(30)\n"
+        "if any('GA200X' in m for m in muts):\n"
+        "    sys.exit('unknown residue X')\n"
+        "assert os.path.exists(pdb) and os.path.exists('rotabase.txt')\n"
+        "with open('Average_' + pdb.replace('.pdb', '') + '.fxout', 'w') as f:\n"
+        "    f.write('Pdb\\tSD\\ttotal energy\\tBackbone Hbond\\n')\n"
+        "    for k, m in enumerate(muts, 1):\n"
+        "        ddg = 1.5 * len(m) + (2.0 if len(m) > 1 and 'WA159H' in m else 0.0)\n"
+        "        f.write('%s_%d\\t0.0\\t%.2f\\t-0.5\\n' % (pdb[:-4], k, ddg))\n"
+        "with open(os.path.join(log, 'build_%d' % os.getpid()), 'w') as f:\n"
+        "    f.write(os.getcwd() + '\\t' + pdb)\n"
+    )
+
+    @pytest.fixture
+    def fake_cfg(self, fake_foldx, tmp_path):
+        """Config pointing at a fake FoldX install in tmp_path"""
+        return {
+            'foldx_exe': fake_foldx,
+            'foldx_pdb': 'tools/foldx/5XJH.pdb',
+            'foldx_workers': 3,
+            'foldx_timeout': 20,
+            'foldx_cache_dir': str(tmp_path / "cache"),
+            'structure_cache_dir': str(tmp_path / "structures"),
+        }
+
+    def test_runs_each_variant_in_own_sandbox(self, fake_cfg, tmp_path):
+        """Concurrent runs use distinct sandboxes and results keep input order"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        seqs = [
+            ("v1|S121E", "M"),
+            ("WT", "M"),
+            ("v2|S121E_R224Q", "M"),
+            ("v3|S160A_N233K_R280E", "M"),
+        ]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+
+        assert list(result) == ["v1|S121E", "WT", "v2|S121E_R224Q", "v3|S160A_N233K_R280E"]
+        assert result == {"v1|S121E": 1.5, "WT": 0.0,
+                          "v2|S121E_R224Q": 3.0, "v3|S160A_N233K_R280E": 4.5}
+
+        cwds = [p.read_text().split("\t")[0] for p in (tmp_path / "log").glob("build_*")]
+        assert len(cwds) == 3
+        assert len(set(cwds)) == 3
+        assert not any(os.path.exists(c) for c in cwds)  # sandboxes cleaned up
+
+    def test_timeout_isolated_to_one_variant(self, fake_cfg):
+        """A hung FoldX run times out to 0.0 without blocking the others"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        fake_cfg.update({'foldx_timeout': 3, 'foldx_retries': 0})
+        seqs = [("hang|D186H", "M"), ("ok|S121E", "M")]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+
+        assert result == {"hang|D186H": 0.0, "ok|S121E": 1.5}
+
+    def test_batched_rows_map_back_to_variants(self, fake_cfg, tmp_path):
+        """One FoldX process per batch; row k of the output is variant k"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        fake_cfg.update({'foldx_workers': 1, 'foldx_batch_size': 10})
+        seqs = [("v%d|%s" % (i, "_".join(["S121E"] * i)), "M") for i in range(1, 6)]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+
+        assert [result[sid] for sid, _ in seqs] == [1.5, 3.0, 4.5, 6.0, 7.5]
+        assert len(list((tmp_path / "log").glob("build_*"))) == 1
+
+    def test_failed_batch_is_split_and_retried(self, fake_cfg):
+        """A variant that crashes FoldX only loses its own ΔΔG"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        fake_cfg.update({'foldx_workers': 1, 'foldx_batch_size': 4})
+        seqs = [("a|S121E", "M"), ("bad|G200X", "M"), ("c|S121E_R224Q", "M"), ("d|S160A", "M")]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+
+        assert result == {"a|S121E": 1.5, "bad|G200X": 0.0, "c|S121E_R224Q": 3.0, "d|S160A": 1.5}
+
+    def test_anonymous_ids_called_by_alignment(self, fake_cfg):
+        """Sequences without header codes are compared to the PDB chain"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+        from src.structure_index import load_structure_index
+
+        pdb_seq = load_structure_index('tools/foldx/5XJH.pdb', 'A', fake_cfg['structure_cache_dir']).sequence
+        i121 = 121 - 30  # PDB numbering starts at 30
+        single = pdb_seq[:i121] + "E" + pdb_seq[i121 + 1:]
+        double = "MSHHHHHH" + single[:100] + "W" + single[101:]  # tag + second mutation
+        seqs = [("anon1", single), ("anon2", double), ("wt", pdb_seq), ("junk", "GGGGSGGGGS")]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+        assert result == {"anon1": 1.5, "anon2": 3.0, "wt": 0.0, "junk": 0.0}
+
+        fake_cfg['foldx_mutation_source'] = 'header'
+        assert ddg_foldx_scores([("anon1", single)], fake_cfg) == {"anon1": 0.0}
+
+    def test_mapping_stage_aligns_only_anonymous_ids(self, fake_cfg, monkeypatch):
+        """Under 'auto', variants with header codes are not mapped to the PDB chain"""
+        import src.utils_align as utils_align
+        from src.pipelines.run_all import _prepare_variant_maps
+        from src.structure_index import load_structure_index
+
+        pdb_seq = load_structure_index('tools/foldx/5XJH.pdb', 'A', fake_cfg['structure_cache_dir']).sequence
+        seqs = [("v1|S121E", "MSHHHHHH" + pdb_seq), ("anon", pdb_seq[1:]), ("v2|R224Q", pdb_seq[2:])]
+        monkeypatch.setattr(utils_align, "_VARIANT_MAPS", {})
+        monkeypatch.setattr(utils_align, "_CALLED", {})
+        _prepare_variant_maps(seqs, dict(fake_cfg, use_plm=False, use_ddg_foldx=True))
+        assert [len(m) for m in utils_align._VARIANT_MAPS.values()] == [1]
+        assert len(utils_align._CALLED) == 1
+
+    def test_native_wt_not_called_against_cloning_tag(self, fake_cfg, tmp_path):
+        """The native WT (signal peptide, no GSHM tag) calls no mutations on 5XJH"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+        from src.utils_seq import read_fasta
+
+        wt_id, wt_seq = read_fasta('data/real_sequences/petase_variants.fasta')[0]
+        assert ddg_foldx_scores([(wt_id, wt_seq)], fake_cfg) == {wt_id: 0.0}
+        assert not list((tmp_path / "log").glob("build_*"))  # nothing sent to FoldX
+
+    def test_repair_runs_once_and_is_reused(self, fake_cfg, tmp_path):
+        """RepairPDB runs once per structure; BuildModel uses the repaired model"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        seqs = [("v1|S121E", "M"), ("v2|R224Q", "M")]
+        first = ddg_foldx_scores(seqs, fake_cfg)
+        second = ddg_foldx_scores(seqs, fake_cfg)
+
+        log_dir = tmp_path / "log"
+        assert first == second == {"v1|S121E": 1.5, "v2|R224Q": 1.5}
+        assert len(list(log_dir.glob("repair_*"))) == 1
+        pdbs = {p.read_text().split("\t")[1] for p in log_dir.glob("build_*")}
+        assert pdbs == {"5XJH_Repair.pdb"}
+        assert len(list((tmp_path / "cache").rglob("5XJH_Repair.pdb"))) == 1
+
+    def test_store_turns_repeat_runs_into_lookups(self, fake_cfg, tmp_path):
+        """Stored mutation sets skip FoldX; duplicates in one call run once"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+        from src.features.ddg_store import get_store
+
+        first = ddg_foldx_scores([("a|S121E_R224Q", "M"), ("b|R224Q_S121E", "M"),
+                                  ("bad|G200X", "M")], fake_cfg)
+        assert first == {"a|S121E_R224Q": 3.0, "b|R224Q_S121E": 3.0, "bad|G200X": 0.0}
+        builds = len(list((tmp_path / "log").glob("build_*")))
+
+        store = get_store(fake_cfg)
+        assert len(store) == 1  # one mutation set; the failure is not stored
+        assert [n for n, _ in store._db.execute("SELECT mutations, runtime FROM ddg")] == ["RA224Q,SA121E"]
+        second = ddg_foldx_scores([("c|R224Q_S121E", "M"), ("d|S160A", "M")], fake_cfg)
+        assert second == {"c|R224Q_S121E": 3.0, "d|S160A": 1.5}
+        assert len(list((tmp_path / "log").glob("build_*"))) == builds + 1
+        assert len(store) == 2
+
+    def test_store_keeps_energy_terms(self, tmp_path):
+        """Entries hold the total ΔΔG and per-term breakdown"""
+        from src.features.ddg_store import DDGStore, store_key
+
+        store = DDGStore(tmp_path / "ddg.sqlite")
+        key = store_key("abc", "A", ["SA121E", "DA186H"], "foldx:1")
+        assert key == store_key("abc", "A", ["DA186H", "SA121E"], "foldx:1")
+        assert key != store_key("abc", "A", ["DA186H", "SA121E"], "foldx:2")
+
+        store.put_many([{'key': key, 'structure': "abc", 'chain': "A",
+                         'mutations': ["SA121E", "DA186H"], 'settings': "foldx:1",
+                         'total': 1.2, 'terms': {'total': 1.2, 'backbone_hbond': -0.5}}])
+        assert store.get(key) == {'total': 1.2, 'terms': {'total': 1.2, 'backbone_hbond': -0.5}}
+        assert store.get("missing") is None
+        store.close()
+
+    def test_additive_mode_models_singles_only(self, fake_cfg):
+        """Additive mode sums a saturation matrix built from single mutants"""
+        from src.features.ddg_foldx import ddg_foldx_scores, saturation_matrix
+        from src.features.ddg_store import get_store
+
+        fake_cfg.update({'foldx_mode': 'additive', 'foldx_batch_size': 50})
+        seqs = [("a|S121E_R224Q", "M"), ("b|S121E", "M"), ("c|S121E_R224Q_S160A", "M")]
+        result = ddg_foldx_scores(seqs, fake_cfg)
+
+        assert result == {"a|S121E_R224Q": 3.0, "b|S121E": 1.5, "c|S121E_R224Q_S160A": 4.5}
+        store = get_store(fake_cfg)
+        assert len(store) == 3 * 19
+        pdb = next(Path(fake_cfg['foldx_cache_dir']).rglob("5XJH_Repair.pdb"))
+        resnums, matrix = saturation_matrix(str(pdb), 'A', fake_cfg['foldx_exe'], fake_cfg, [121, 160])
+        assert list(resnums) == [121, 160]
+        assert matrix.shape == (2, 20)
+        assert sorted(matrix[0]) == [0.0] + [1.5] * 19
+
+    def test_additive_refinement(self, fake_cfg):
+        """Top-N and historically divergent multi-mutants get real BuildModel runs"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+
+        fake_cfg.update({'foldx_mode': 'additive', 'foldx_batch_size': 50,
+                         'foldx_refine_top_n': 1})
+        # W159H is epistatic in the fake: +2.0 on top of the additive sum
+        result = ddg_foldx_scores([("e|S121E_W159H", "M"), ("f|S121E_R224Q_S160A", "M")], fake_cfg)
+        assert result == {"e|S121E_W159H": 5.0, "f|S121E_R224Q_S160A": 4.5}
+
+        fake_cfg.update({'foldx_refine_top_n': 0, 'foldx_refine_divergence': 1.0})
+        result = ddg_foldx_scores([("g|W159H_R224Q", "M"), ("h|R224Q_S160A", "M")], fake_cfg)
+        assert result == {"g|W159H_R224Q": 5.0, "h|R224Q_S160A": 3.0}
+
+        fake_cfg['foldx_refine_divergence'] = None
+        result = ddg_foldx_scores([("i|W159H_S160A", "M")], fake_cfg)
+        assert result == {"i|W159H_S160A": 3.0}  # pure additive estimate
+
+
+class TestFoldXScheduling:
+    """Test cost-aware scheduling, adaptive timeouts and transient retries"""
+
+    def test_longest_jobs_dispatched_first(self):
+        """Batches come out in descending cost, heaviest variants first"""
+        from src.features.ddg_foldx import _schedule_batches
+
+        jobs = [("a", ["x"]), ("b", ["x"] * 5), ("c", ["x"] * 2), ("d", ["x"] * 4), ("e", ["x"] * 3)]
+        costs = {label: float(len(m)) for label, m in jobs}
+
+        singles = _schedule_batches(jobs, costs, 1)
+        assert [b[0][0] for b in singles] == ["b", "d", "e", "c", "a"]
+        pairs = _schedule_batches(jobs, costs, 2)
+        assert [[label for label, _ in b] for b in pairs] == [["b", "d"], ["e", "c"], ["a"]]
+
+    def test_adaptive_timeout_from_history(self):
+        """Timeouts follow observed per-mutation runtimes within bounds"""
+        from src.features.ddg_foldx import _CostModel
+
+        cfg = {'foldx_timeout': 300, 'foldx_timeout_min': 1, 'foldx_timeout_factor': 3.0}
+        pair = (["SA121E", "RA224Q"], 1.0)
+        assert _CostModel([], cfg).timeout(["x"] * 3) == 300  # no history: fixed
+        assert _CostModel([pair] * 5, cfg).timeout(["x"]) == 300  # too few samples
+
+        model = _CostModel([pair] * 30, cfg)
+        assert model.cost(["x"] * 3) == pytest.approx(1.5)
+        assert model.timeout(["x"] * 3) == pytest.approx(4.5)
+        assert model.timeout(["x"] * 1000) == 300
+        assert _CostModel([pair] * 30, dict(cfg, foldx_timeout_min=30)).timeout(["x"]) == 30
+
+    def test_cost_from_position_history(self):
+        """Positions with slow past runs cost more than the per-mutation median"""
+        from src.features.ddg_foldx import _CostModel
+
+        history = [(["SA121E"], 1.0)] * 10 + [(["WA159H"], 9.0)] * 3 + [(["SA121D", "WA159F"], 10.0)]
+        model = _CostModel(history, {})
+        assert model.cost(["WA159Y"]) == pytest.approx(9.0)
+        assert model.cost(["SA121K"]) == pytest.approx(1.0)
+        assert model.cost(["NA233K"]) == pytest.approx(model.per_mutation)
+        assert model.cost(["WA159Y"]) > model.cost(["SA121K", "NA233K"])
+
+    def test_transient_failure_retried(self, fake_foldx, tmp_path):
+        """A run that times out once succeeds on retry with a longer timeout"""
+        from src.features.ddg_foldx import _run_batch
+
+        batch = [("flaky|T250Y", ["TA250Y"])]
+        args = ("tools/foldx/5XJH.pdb", fake_foldx, {"flaky|T250Y": 1})
+        result = _run_batch(batch, *args, retry=(1, 0.0))
+        assert result["flaky|T250Y"]["terms"]["total"] == 1.5
+        assert result["flaky|T250Y"]["runtime"] > 0
+
+        (tmp_path / "log" / "flaky_done").unlink()
+        assert _run_batch(batch, *args, retry=(0, 0.0)) == {"flaky|T250Y": {'terms': {}}}
+
+    def test_timed_out_batch_retried_per_variant(self, fake_foldx, capsys):
+        """A timed-out batch is not bisected; each variant gets its own timeout"""
+        from src.features.ddg_foldx import _run_batch
+
+        batch = [("slow|D186H", ["DA186H"]), ("a|S121E", ["SA121E"]),
+                 ("b|R224Q", ["RA224Q"]), ("c|N233K", ["NA233K"])]
+        timeouts = {label: 1 for label, _ in batch}
+        result = _run_batch(batch, "tools/foldx/5XJH.pdb", fake_foldx, timeouts)
+
+        assert result["slow|D186H"] == {'terms': {}}
+        assert all(result[label]['terms']['total'] == 1.5 for label, _ in batch[1:])
+        out = capsys.readouterr().out
+        assert "retrying 4 variants individually" in out
+        assert "in halves" not in out
+
+
+class TestFoldXStandin:
+    """Test the orchestration against the FoldX stand-in executable"""
+
+    @pytest.fixture
+    def standin_cfg(self, tmp_path):
+        return {
+            'foldx_exe': str(Path("tools/foldx/foldx_standin.py").resolve()),
+            'foldx_pdb': 'tools/foldx/5XJH.pdb',
+            'foldx_workers': 2,
+            'foldx_batch_size': 10,
+            'foldx_timeout': 20,
+            'foldx_cache_dir': str(tmp_path / "cache"),
+            'structure_cache_dir': str(tmp_path / "structures"),
+        }
+
+    def test_standin_output_conventions(self, tmp_path):
+        """Average/Dif/Raw rows parse back per line with all energy terms"""
+        import shutil
+        import subprocess
+        import sys
+        from src.features.ddg_foldx import _create_batch_list, _parse_batch_output
+
+        shutil.copy("tools/foldx/5XJH.pdb", tmp_path / "5XJH.pdb")
+        _create_batch_list([["SA121E"], ["SA121E", "DA186H"]], tmp_path / "individual_list.txt")
+        subprocess.run([sys.executable, str(Path("tools/foldx/foldx_standin.py").resolve()),
+                        "--command=BuildModel", "--pdb=5XJH.pdb",
+                        "--mutant-file=individual_list.txt", "--numberOfRuns=1"],
+                       cwd=tmp_path, check=True, capture_output=True)
+
+        assert {f.name for f in tmp_path.glob("*.fxout")} == {
+            "Average_5XJH.fxout", "Dif_5XJH.fxout", "Raw_5XJH.fxout"}
+        rows = _parse_batch_output(str(tmp_path), "5XJH.pdb")
+        assert sorted(rows) == [1, 2]
+        assert "van_der_waals" in rows[1]
+        (tmp_path / "Average_5XJH.fxout").unlink()
+        assert _parse_batch_output(str(tmp_path), "5XJH.pdb")[2]["total"] == pytest.approx(rows[2]["total"])
+
+    def test_read_fxout_table_falls_back_to_dif_and_raw(self, tmp_path):
+        """Average, Dif (run average) and Raw (mutant - WT) give the same term table"""
+        import shutil
+        import subprocess
+        import sys
+        from src.features.ddg_foldx import _create_batch_list, read_fxout_table
+
+        shutil.copy("tools/foldx/5XJH.pdb", tmp_path / "5XJH.pdb")
+        _create_batch_list([["SA121E"], ["SA121E", "DA186H"], ["RA224Q"]],
+                           tmp_path / "individual_list.txt")
+        subprocess.run([sys.executable, str(Path("tools/foldx/foldx_standin.py").resolve()),
+                        "--command=BuildModel", "--pdb=5XJH.pdb",
+                        "--mutant-file=individual_list.txt", "--numberOfRuns=3"],
+                       cwd=tmp_path, check=True, capture_output=True)
+
+        average = read_fxout_table(str(tmp_path), "5XJH.pdb")
+        assert list(average.index) == [1, 2, 3]
+        assert {"total", "van_der_waals", "backbone_clash"} <= set(average.columns)
+        assert "sd" not in average.columns
+        (tmp_path / "Average_5XJH.fxout").unlink()
+        dif = read_fxout_table(str(tmp_path), "5XJH.pdb")
+        (tmp_path / "Dif_5XJH.fxout").unlink()
+        raw = read_fxout_table(str(tmp_path), "5XJH.pdb")
+        for table in (dif, raw):
+            assert np.allclose(table[average.columns].values, average.values, atol=1e-3)
+        (tmp_path / "Raw_5XJH.fxout").unlink()
+        assert read_fxout_table(str(tmp_path), "5XJH.pdb").empty
+
+    def test_term_channels(self, standin_cfg):
+        """Requested energy terms come back as foldx_<term> channels"""
+        from src.features.ddg_foldx import ddg_foldx_channels, ddg_foldx_scores
+
+        standin_cfg['foldx_term_channels'] = ["van_der_waals", "not_a_term"]
+        seqs = [("a|S121E", ""), ("b|S121E_R224Q", ""), ("WT", "")]
+        channels = ddg_foldx_channels(seqs, standin_cfg)
+
+        assert set(channels) == {"ddg_foldx", "foldx_van_der_waals", "foldx_not_a_term"}
+        assert channels["foldx_not_a_term"] == {"a|S121E": 0.0, "b|S121E_R224Q": 0.0, "WT": 0.0}
+        assert channels["foldx_van_der_waals"]["WT"] == 0.0
+        assert channels["foldx_van_der_waals"]["a|S121E"] != 0.0
+        # Terms come from the store on the second pass and match the first
+        assert ddg_foldx_channels(seqs, standin_cfg) == channels
+        assert ddg_foldx_scores(seqs, standin_cfg) == channels["ddg_foldx"]
+
+    def test_standin_failures_fall_back_to_neutral(self, standin_cfg, monkeypatch):
+        """Variants the stand-in refuses to build score 0.0 and are not stored"""
+        from src.features.ddg_foldx import ddg_foldx_scores
+        from src.features.ddg_store import get_store
+
+        monkeypatch.setenv("FOLDX_STANDIN_FAIL_RATE", "1.0")
+        seqs = [("a|S121E", ""), ("b|S121E_R224Q", ""), ("WT", "")]
+        result = ddg_foldx_scores(seqs, standin_cfg)
+
+        assert result == {"a|S121E": 0.0, "b|S121E_R224Q": 0.0, "WT": 0.0}
+        assert len(get_store(standin_cfg)) == 0
+
+
 # ============================================================
 # Expected Test Results (TDD RED Phase)
 # ============================================================
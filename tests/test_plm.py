@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test suite for the PLM channels (shared ESM scoring engine)
+Uses a tiny randomly initialised ESM-2 so no weights are downloaded.
+"""
+
+import math
+import pytest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+torch = pytest.importorskip("torch")
+esm = pytest.importorskip("esm")
+
+from src.features import plm_engine
+from src.features.plm_llr import plm_channel_scores, plm_activity_scores, plm_perplexity_proxy
+
+TINY = "tiny_esm2_test"
+
+
+def _reference_pll(model, alphabet, seqs):
+    """Original one-position-per-forward loop (single sequence at a time)."""
+    out = {}
+    bc = alphabet.get_batch_converter()
+    for sid, s in seqs:
+        _, _, toks = bc([(sid, s)])
+        total = 0.0
+        with torch.no_grad():
+            for pos in range(1, toks.size(1) - 1):
+                masked = toks.clone()
+                masked[:, pos] = alphabet.mask_idx
+                logits = model(masked)["logits"][0, pos]
+                total += float(torch.log_softmax(logits, -1)[toks[0, pos]])
+        out[sid] = total / len(s)
+    return out
+
+
+@pytest.fixture
+def tiny_model():
+    """Register a tiny random ESM-2 under TINY for the duration of a test"""
+    torch.manual_seed(0)
+    alphabet = esm.Alphabet.from_architecture("ESM-1b")
+    model = esm.model.esm2.ESM2(num_layers=2, embed_dim=32, attention_heads=4, alphabet=alphabet)
+    plm_engine.register_plm(TINY, model, alphabet, "cpu")
+    yield model, alphabet
+    plm_engine.clear_plm_registry()
+
+
+@pytest.fixture
+def cfg():
+    return {'plm_model': TINY, 'device': 'cpu'}
+
+
+@pytest.fixture
+def sample_sequences():
+    return [
+        ("short", "MKVLA"),
+        ("medium", "MNFPRASRLMQAAV"),
+        ("long", "MNFPRASRLMQAAVLGGLMAVSAAATAQ"),
+    ]
+
+
+WT = "MNFPRASRLMQAAV"
+
+
+class TestPLMEngine:
+    """Test the shared model registry and PLL sweep"""
+
+    def test_registry_loads_once(self, tiny_model):
+        model, alphabet = tiny_model
+        assert plm_engine.load_plm(TINY, "cpu")[0] is model
+        assert plm_engine.load_plm(TINY, "cpu")[0] is model
+
+    def test_pll_matches_reference(self, tiny_model, cfg, sample_sequences):
+        model, alphabet = tiny_model
+        ref = _reference_pll(model, alphabet, sample_sequences)
+        got = plm_engine.pll_sweep(sample_sequences, cfg)
+        for sid in ref:
+            assert got[sid] == pytest.approx(ref[sid], abs=1e-5)
+
+    @pytest.mark.parametrize("budget", [1, 40, 100000])
+    def test_token_budget_does_not_change_scores(self, tiny_model, cfg, sample_sequences, budget):
+        ref = plm_engine.pll_sweep(sample_sequences, cfg)
+        got = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_token_budget=budget))
+        for sid in ref:
+            assert got[sid] == pytest.approx(ref[sid], abs=1e-5)
+
+    def test_length_buckets_cover_all_indices(self):
+        lengths = [290, 12, 300, 15, 295, 600, 14]
+        buckets = plm_engine.length_buckets(lengths, bucket_tokens=1000, slack=0.1)
+        assert sorted(i for b in buckets for i in b) == list(range(len(lengths)))
+        for b in buckets:
+            lens = [lengths[i] for i in b]
+            assert max(lens) <= min(lens) * 1.1
+            assert len(b) == 1 or len(b) * max(lens) <= 1000
+
+    def test_bucketing_does_not_change_scores(self, tiny_model, cfg, sample_sequences):
+        ref = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_bucket_tokens=10**9, plm_bucket_slack=100))
+        got = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_bucket_tokens=1, plm_bucket_slack=0))
+        for sid in ref:
+            assert got[sid] == pytest.approx(ref[sid], abs=1e-5)
+
+    @pytest.mark.parametrize("precision", ["bf16", "int8"])
+    def test_reduced_precision_stays_close(self, tiny_model, cfg, sample_sequences, precision):
+        ref = plm_engine.pll_sweep(sample_sequences, cfg)
+        got = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_precision=precision))
+        for sid in ref:
+            assert got[sid] == pytest.approx(ref[sid], abs=0.1)
+
+    def test_unknown_precision_raises(self, tiny_model, cfg, sample_sequences):
+        with pytest.raises(ValueError):
+            plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_precision='fp4'))
+
+    def test_worker_pool_matches_in_process(self, tiny_model, cfg, sample_sequences):
+        import multiprocessing as mp
+        if "fork" not in mp.get_all_start_methods():
+            pytest.skip("fork start method unavailable")
+        ref = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_token_budget=64))
+        got = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_token_budget=64,
+                                                          plm_workers=2, plm_worker_threads=1))
+        assert list(got) == list(ref)
+        for sid in ref:
+            assert got[sid] == pytest.approx(ref[sid], abs=1e-5)
+
+    def test_channels_share_one_sweep(self, tiny_model, cfg, sample_sequences):
+        channels = plm_channel_scores(sample_sequences, cfg)
+        pll = plm_engine.pll_sweep(sample_sequences, cfg)
+        for sid, _ in sample_sequences:
+            assert channels['plm_llr'][sid] == pytest.approx(-pll[sid], abs=1e-6)
+            assert channels['plm_perplexity'][sid] == pytest.approx(-math.exp(-pll[sid]), rel=1e-6)
+
+    def test_wrappers_match_channels(self, tiny_model, cfg, sample_sequences):
+        channels = plm_channel_scores(sample_sequences, cfg)
+        assert plm_activity_scores(sample_sequences, cfg) == pytest.approx(channels['plm_llr'])
+        assert plm_perplexity_proxy(sample_sequences, cfg) == pytest.approx(channels['plm_perplexity'])
+
+    def test_fallback_when_model_unavailable(self, sample_sequences):
+        channels = plm_channel_scores(sample_sequences, {'plm_model': 'does_not_exist'})
+        assert all(v == 0.0 for v in channels['plm_llr'].values())
+        assert all(v == 0.0 for v in channels['plm_perplexity'].values())
+
+    def test_config_errors_propagate(self, tiny_model, cfg, sample_sequences):
+        with pytest.raises(ValueError):
+            plm_channel_scores(sample_sequences, dict(cfg, plm_scoring='bogus'))
+
+
+class TestWTMarginal:
+    """Test wt-marginal scoring mode (cached WT masked marginals)"""
+
+    @pytest.fixture
+    def wt_cfg(self, cfg):
+        return dict(cfg, plm_scoring='wt-marginal', plm_wt_seq=WT)
+
+    def test_wt_scores_equal_full_pll(self, tiny_model, cfg, wt_cfg):
+        wt_only = [("WT", WT)]
+        assert plm_engine.plm_scores(wt_only, wt_cfg)["WT"] == pytest.approx(
+            plm_engine.pll_sweep(wt_only, cfg)["WT"], abs=1e-5)
+
+    def test_variant_is_sum_of_log_ratios(self, tiny_model, wt_cfg):
+        from src.utils_seq import AA_ORDER
+        matrix, wt_ll = plm_engine.wt_marginal_matrix(WT, wt_cfg)
+        assert matrix.shape == (len(WT), 20)
+
+        var = WT[:2] + "W" + WT[3:6] + "Y" + WT[7:]  # F3W, S7Y
+        expected = wt_ll.sum() + (matrix[2, AA_ORDER.index("W")] - wt_ll[2]) \
+            + (matrix[6, AA_ORDER.index("Y")] - wt_ll[6])
+        got = plm_engine.plm_scores([("F3W_S7Y", var)], wt_cfg)["F3W_S7Y"]
+        assert got == pytest.approx(expected / len(WT), abs=1e-9)
+
+    def test_indel_falls_back_to_pll(self, tiny_model, cfg, wt_cfg):
+        indel = [("ins", WT + "K")]
+        assert plm_engine.plm_scores(indel, wt_cfg)["ins"] == pytest.approx(
+            plm_engine.pll_sweep(indel, cfg)["ins"], abs=1e-6)
+
+    def test_unknown_mode_raises(self, tiny_model, cfg):
+        with pytest.raises(ValueError):
+            plm_engine.plm_scores([("WT", WT)], dict(cfg, plm_scoring='bogus'))
+
+
+class TestPLMCache:
+    """Test the content-addressed on-disk PLM cache"""
+
+    def test_roundtrip_is_memory_mapped(self, tmp_path):
+        import numpy as np
+        from src.features.plm_cache import PLMCache, cache_key
+
+        cache = PLMCache(str(tmp_path))
+        key = cache_key("m", "pll", "MKV")
+        cache.put(key, -1.5, {"position_ll": np.array([-1.0, -2.0, -1.5], dtype=np.float32)})
+        hit = cache.get(key)
+        assert hit["score"] == -1.5
+        assert isinstance(hit["arrays"]["position_ll"], np.memmap)
+        assert cache.get(cache_key("m", "wt-marginal", "MKV")) is None
+
+    def test_lru_eviction_respects_size_bound(self, tmp_path):
+        import numpy as np
+        from src.features.plm_cache import PLMCache
+
+        cache = PLMCache(str(tmp_path), max_bytes=3500)
+        for k in ("a", "b", "c"):
+            cache.put(k, 0.0, {"x": np.zeros(128)})  # ~1.1 kB each
+        cache.get("a")  # a becomes most recently used
+        cache.put("d", 0.0, {"x": np.zeros(128)})
+        assert cache.total_bytes() <= 3500
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+
+    def test_access_times_written_on_flush(self, tmp_path):
+        import sqlite3
+        import numpy as np
+        from src.features.plm_cache import PLMCache
+
+        cache = PLMCache(str(tmp_path))
+        cache.put("a", 0.0, {"x": np.zeros(8)})
+        cache.flush()
+        index = sqlite3.connect(str(tmp_path / "index.sqlite"))
+        before = index.execute("SELECT last_access FROM entries").fetchone()[0]
+        cache.get("a")
+        assert index.execute("SELECT last_access FROM entries").fetchone()[0] == before
+        cache.flush()
+        assert index.execute("SELECT last_access FROM entries").fetchone()[0] > before
+        assert cache.total_bytes() == index.execute("SELECT SUM(nbytes) FROM entries").fetchone()[0]
+
+    def test_tiling_and_weights_change_the_key(self, tmp_path, cfg):
+        from src.features.plm_cache import cache_key
+
+        base = plm_engine._cache_params(cfg, TINY)
+        assert plm_engine._cache_params(dict(cfg, plm_tile_overlap=8), TINY) != base
+        weights = tmp_path / "model.pt"
+        weights.write_bytes(b"v1")
+        first = plm_engine._cache_params(cfg, str(weights))
+        weights.write_bytes(b"v2-retrained")
+        assert plm_engine._cache_params(cfg, str(weights)) != first
+        assert cache_key(TINY, "pll", WT, first) != cache_key(TINY, "pll", WT, base)
+
+    def test_sweep_reuses_cached_scores(self, tiny_model, cfg, sample_sequences, tmp_path):
+        cached_cfg = dict(cfg, plm_cache_dir=str(tmp_path), plm_cache_embeddings=True)
+        first = plm_engine.pll_sweep(sample_sequences, cached_cfg)
+
+        class Broken(torch.nn.Module):
+            def forward(self, *a, **k):
+                raise AssertionError("model should not run on cache hits")
+
+        plm_engine.register_plm(TINY, Broken(), tiny_model[1], "cpu")
+        second = plm_engine.pll_sweep(sample_sequences, cached_cfg)
+        assert second == pytest.approx(first)
+
+
+class TestMutationWindow:
+    """Test mutation-window scoring mode"""
+
+    def test_full_radius_equals_full_pll(self, tiny_model, cfg):
+        var = WT[:2] + "W" + WT[3:]
+        seqs = [("WT", WT), ("F3W", var)]
+        win_cfg = dict(cfg, plm_scoring='mutation-window', plm_wt_seq=WT, plm_window_radius=len(WT))
+        got = plm_engine.plm_scores(seqs, win_cfg)
+        ref = plm_engine.pll_sweep(seqs, cfg)
+        assert got == pytest.approx(ref, abs=1e-5)
+
+    def test_only_window_positions_rescored(self, tiny_model, cfg):
+        var = WT[:2] + "W" + WT[3:]
+        win_cfg = dict(cfg, plm_scoring='mutation-window', plm_wt_seq=WT)
+        base = plm_engine.position_log_likelihoods([("WT", WT)], cfg)[0].astype(float)
+        var_ll = plm_engine.position_log_likelihoods([("F3W", var)], cfg)[0].astype(float)
+        expected = (base.sum() - base[2] + var_ll[2]) / len(WT)
+        got = plm_engine.plm_scores([("F3W", var)], win_cfg)["F3W"]
+        assert got == pytest.approx(expected, abs=1e-5)
+
+    def test_header_mutations_without_wt(self, tiny_model, cfg):
+        var = WT[:2] + "W" + WT[3:]
+        win_cfg = dict(cfg, plm_scoring='mutation-window', plm_window_radius=len(WT))
+        got = plm_engine.plm_scores([("lib|F3W", var)], win_cfg)["lib|F3W"]
+        assert got == pytest.approx(plm_engine.pll_sweep([("v", var)], cfg)["v"], abs=1e-5)
+
+    def test_indel_windows_from_alignment(self):
+        from src.utils_align import reference_map
+
+        insertion = WT[:7] + "W" + WT[7:]
+        _, positions, index = plm_engine._variant_parent("ins", insertion, WT, reference_map(WT, insertion))
+        assert positions == [7]
+        assert index[6] == 6 and index[7] == -1 and index[8] == 7
+
+        deletion = WT[:7] + WT[8:]
+        _, positions, index = plm_engine._variant_parent("del", deletion, WT, reference_map(WT, deletion))
+        assert positions == [6, 7]
+        assert index[7] == 8
+
+    def test_indel_full_radius_equals_full_pll(self, tiny_model, cfg):
+        seqs = [("ins", WT[:7] + "W" + WT[7:]), ("del", WT[:7] + WT[8:])]
+        win_cfg = dict(cfg, plm_scoring='mutation-window', plm_wt_seq=WT, plm_window_radius=len(WT))
+        got = plm_engine.plm_scores(seqs, win_cfg)
+        assert got == pytest.approx(plm_engine.pll_sweep(seqs, cfg), abs=1e-5)
+
+    def test_uses_prepared_variant_map(self, tiny_model, cfg, monkeypatch):
+        import src.utils_align as utils_align
+        from src.pipelines.run_all import _prepare_variant_maps
+
+        seqs = [("ins", WT[:7] + "W" + WT[7:]), ("F3W", WT[:2] + "W" + WT[3:])]
+        win_cfg = dict(cfg, plm_scoring='mutation-window', plm_wt_seq=WT)
+        monkeypatch.setattr(utils_align, "_VARIANT_MAPS", {})
+        monkeypatch.setattr(utils_align, "_CALLED", {})
+        monkeypatch.setattr(utils_align, "_MAPPED", {})
+        _prepare_variant_maps(seqs, win_cfg)
+        monkeypatch.setattr(utils_align, "_position_map", lambda *a: pytest.fail("aligned again"))
+        monkeypatch.setattr(utils_align, "_call_one", lambda *a: pytest.fail("aligned again"))
+        assert set(plm_engine.plm_scores(seqs, win_cfg)) == {"ins", "F3W"}
+
+    def test_unparseable_header_falls_back(self, tiny_model, cfg):
+        seqs = [("anonymous_42", WT + "K")]
+        win_cfg = dict(cfg, plm_scoring='mutation-window')
+        assert plm_engine.plm_scores(seqs, win_cfg) == pytest.approx(plm_engine.pll_sweep(seqs, cfg))
+
+
+class TestSlidingWindow:
+    """Test tiled scoring of sequences longer than the model context"""
+
+    def test_tiles_assign_every_position_once(self):
+        for length in (10, 50, 51, 137):
+            tiles = plm_engine.sequence_tiles(length, max_residues=20, overlap=8)
+            assigned = [p for _, _, lo, hi in tiles for p in range(lo, hi)]
+            assert assigned == list(range(length))
+            for start, end, lo, hi in tiles:
+                assert end - start <= 20 and start <= lo and hi <= end
+
+    def test_short_sequence_unchanged(self, tiny_model, cfg, sample_sequences):
+        ref = plm_engine.pll_sweep(sample_sequences, cfg)
+        got = plm_engine.pll_sweep(sample_sequences, dict(cfg, plm_max_residues=1000))
+        assert got == pytest.approx(ref, abs=1e-6)
+
+    def test_long_sequence_matches_manual_stitching(self, tiny_model, cfg):
+        long_seq = (WT * 5)[:60]
+        tiled_cfg = dict(cfg, plm_max_residues=24, plm_tile_overlap=8)
+        got = plm_engine.position_log_likelihoods([("long", long_seq)], tiled_cfg)[0]
+        for start, end, lo, hi in plm_engine.sequence_tiles(60, 24, 8):
+            tile = plm_engine.position_log_likelihoods([("tile", long_seq[start:end])], cfg)[0]
+            assert got[lo:hi] == pytest.approx(tile[lo - start:hi - start], abs=1e-5)
+
+    def test_failed_sequence_does_not_zero_the_batch(self, tiny_model, cfg, sample_sequences, monkeypatch):
+        real = plm_engine._score_items
+
+        def flaky(items, cfg_, full):
+            if any(len(t) > 20 for t, _ in items):
+                raise RuntimeError("out of memory")
+            return real(items, cfg_, full)
+
+        monkeypatch.setattr(plm_engine, "_score_items", flaky)
+        channels = plm_channel_scores(sample_sequences, cfg)
+        assert channels['plm_llr']['long'] == 0.0
+        assert channels['plm_llr']['short'] != 0.0
+        assert channels['plm_llr']['medium'] != 0.0
+
+
+class TestModelBundle:
+    """Test memory-mapped safetensors model bundles"""
+
+    def test_bundle_roundtrip_is_mapped(self, tiny_model, tmp_path):
+        from src.features.plm_bundle import save_bundle, load_bundle
+        model, alphabet = tiny_model
+        path = tmp_path / f"{TINY}.plmbundle"
+        save_bundle(model, path, TINY)
+
+        mapped, _ = load_bundle(path)
+        _, _, toks = alphabet.get_batch_converter()([("x", WT)])
+        with torch.no_grad():
+            assert torch.allclose(model(toks)["logits"], mapped(toks)["logits"], atol=1e-6)
+        # Parameters are views into one mapping: pointer gaps equal file offset gaps
+        import json, struct
+        with open(path / "model.safetensors", "rb") as f:
+            header = json.loads(f.read(struct.unpack("<Q", f.read(8))[0]))
+        a, b = "layers.0.fc1.weight", "layers.1.fc2.weight"
+        params = dict(mapped.named_parameters())
+        assert not params[a].is_meta
+        assert params[b].data_ptr() - params[a].data_ptr() == \
+            header[b]["data_offsets"][0] - header[a]["data_offsets"][0]
+
+    def test_engine_prefers_bundle(self, tiny_model, cfg, tmp_path, sample_sequences):
+        from src.features.plm_bundle import save_bundle
+        save_bundle(tiny_model[0], tmp_path / "bundled_tiny.plmbundle", "bundled_tiny")
+        bundle_cfg = dict(cfg, plm_model="bundled_tiny", plm_bundle_dir=str(tmp_path))
+        assert plm_engine.pll_sweep(sample_sequences, bundle_cfg) == pytest.approx(
+            plm_engine.pll_sweep(sample_sequences, cfg), abs=1e-5)
+
+    def test_bf16_tensors_roundtrip(self, tmp_path):
+        from src.features.plm_bundle import write_safetensors, read_safetensors_mmap
+        t = {"a": torch.randn(3, 5).to(torch.bfloat16), "b": torch.arange(7)}
+        write_safetensors(t, tmp_path / "x.safetensors")
+        back, _ = read_safetensors_mmap(tmp_path / "x.safetensors")
+        assert torch.equal(back["a"], t["a"]) and torch.equal(back["b"], t["b"])
@@ -13,7 +13,8 @@ import yaml
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.features.priors import prior_scores, _align_to_wt, _load_yaml
+from src.features.priors import prior_scores, _align_to_wt, _load_yaml, compile_priors, map_to_positions
+from src.utils_seq import read_fasta
 
 
 class TestPriorsChannel:
@@ -181,6 +182,91 @@ class TestPriorsChannel:
         assert isinstance(activity["with_favorable"], (int, float))
 
 
+class TestCompiledPriors:
+    """Test the compiled (array) form of the priors"""
+
+    YAML = 'data/priors/priors_petase_2024_2025.yaml'
+
+    def test_compiled_arrays(self):
+        """Referenced positions carry their penalties, WT residues and regions"""
+        wt = "A" * 159 + "S" + "C" + "A" * 139
+        compiled = compile_priors(self.YAML, wt)
+
+        positions = list(compiled.positions)
+        assert positions == sorted(positions)
+        assert {87, 160, 161, 206, 237, 218, 212} <= set(positions)
+        assert compiled.penalty[positions.index(160)] == -2.5
+        assert compiled.penalty[positions.index(87)] == -2.0
+        assert compiled.penalty[positions.index(218)] == 0.0
+        assert chr(compiled.allowed[positions.index(160)]) == "S"
+        assert compiled.region_members.shape == (6, len(positions))
+        assert compile_priors(self.YAML, wt) is compiled  # compiled once
+
+    def test_map_to_positions(self):
+        """Out-of-range positions come back as 0"""
+        residues = map_to_positions([("a", "MKT"), ("b", "MK")], [1, 3, 5])
+        assert residues.tolist() == [[ord("M"), ord("T"), 0], [ord("M"), 0, 0]]
+
+    def test_vectorized_scores(self, tmp_path):
+        """Triad mutations cost the full penalty only when verifiable against WT"""
+        wt = "".join("ACDEFGHIKLMNPQRSTVWY"[i % 20] for i in range(300))
+        wt_path = tmp_path / "wt.fasta"
+        wt_path.write_text(">wt\n" + wt + "\n")
+        mutant = wt[:159] + ("A" if wt[159] != "A" else "G") + wt[160:]
+        seqs = [("wt", wt), ("s160", mutant), ("short", "MKT")]
+
+        activity, stability = prior_scores(seqs, {'priors_yaml': self.YAML, 'wt_fasta': str(wt_path)})
+        assert activity["s160"] == pytest.approx(activity["wt"] - 2.5)
+        assert activity["short"] == pytest.approx(0.0)
+        assert stability["short"] == pytest.approx(stability["wt"])
+        assert stability["wt"] > 0
+
+        unverified, _ = prior_scores(seqs, {'priors_yaml': self.YAML})
+        assert unverified["s160"] == pytest.approx(unverified["wt"])
+        assert unverified["wt"] == pytest.approx(activity["wt"] + 0.1 * (-2.5 * 3 - 2.0 * 2))
+
+    def test_reuses_prepared_variant_map(self, tmp_path, monkeypatch):
+        """With a library map prepared up front, priors align nothing themselves"""
+        import src.utils_align as utils_align
+
+        wt = "".join("ACDEFGHIKLMNPQRSTVWY"[(i * 7) % 20] for i in range(300))
+        wt_path = tmp_path / "wt.fasta"
+        wt_path.write_text(">wt\n" + wt + "\n")
+        seqs = [("del", wt[:100] + wt[103:]), ("tag", "HHHHHH" + wt), ("wt", wt)]
+        cfg = {'priors_yaml': self.YAML, 'wt_fasta': str(wt_path)}
+        monkeypatch.setattr(utils_align, "_VARIANT_MAPS", {})
+        monkeypatch.setattr(utils_align, "_CALLED", {})
+        monkeypatch.setattr(utils_align, "_MAPPED", {})
+        expected = prior_scores(seqs, cfg)
+
+        monkeypatch.setattr(utils_align, "_VARIANT_MAPS", {})
+        monkeypatch.setattr(utils_align, "_CALLED", {})
+        monkeypatch.setattr(utils_align, "_MAPPED", {})
+        utils_align.get_variant_map(wt, [s for _, s in seqs] + ["MKT"]).align(position_maps=True)
+        # Priors read position maps only, so no mutation-calling alignment either
+        monkeypatch.setattr(utils_align, "_position_map", lambda *a: pytest.fail("aligned again"))
+        monkeypatch.setattr(utils_align, "_call_one", lambda *a: pytest.fail("calls aligned"))
+        assert prior_scores(seqs, cfg) == expected
+
+    def test_real_variants_regression(self):
+        """Scores on the bundled variant set match the pairwise2-era mapping"""
+        fasta = 'data/real_sequences/petase_variants.fasta'
+        seqs = read_fasta(fasta)
+        activity, stability = prior_scores(seqs, {'priors_yaml': self.YAML, 'wt_fasta': fasta})
+        expected = {
+            'IsPETase_WT|P0C395|Ideonella_sakaiensis': 1.75,
+            'FAST_PETase|S121E_D186H_R224Q_N233K_R280E': -0.75,
+            'Bhr_NMT|H218N_F222M_F243T': 1.75,
+            'S238F_W159H|IsPETase_mutations': 1.75,
+            'LCC_WT|Thermobifida_fusca': -2.75,
+            'LCC_ICCG|I208C_G263C': -0.25,
+            'YITA|LCC_H183Y_L202I_I208T_T153A': -2.75,
+            'HotPETase|Humicola_insolens|thermostable': -7.25,
+        }
+        assert activity == pytest.approx(expected)
+        assert stability == pytest.approx({sid: 1.275 for sid in expected})
+
+
 class TestPriorsIntegration:
     """Integration tests for priors in full pipeline"""
 
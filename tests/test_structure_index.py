@@ -0,0 +1,71 @@
+"""
+Tests for the cached structure index (src/structure_index.py)
+
+Test Coverage:
+- Numbering, sequence and coordinates match a direct Bio.PDB parse
+- Sequence index <-> PDB numbering map
+- .npz disk cache round trip and in-process memo
+- Spatial neighbour queries
+"""
+
+import numpy as np
+import pytest
+
+PDB = "tools/foldx/5XJH.pdb"
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    import src.structure_index as structure_index
+    monkeypatch.setattr(structure_index, '_INDEXES', {})  # start from a cold process memo
+    return structure_index.load_structure_index(PDB, 'A', str(tmp_path))
+
+
+class TestStructureIndex:
+    """StructureIndex built from the reference PETase structure"""
+
+    def test_matches_pdb_parse(self, index, tmp_path):
+        """Numbering and sequence agree with the FoldX helpers' expectations"""
+        from src.features.ddg_foldx import _extract_wt_sequence_from_pdb, _get_pdb_range
+
+        assert _get_pdb_range(PDB, 'A', str(tmp_path)) == (index.first_res, index.last_res, index.offset)
+        assert _extract_wt_sequence_from_pdb(PDB, 'A', str(tmp_path)) == index.sequence
+        assert index.first_res == 30
+        assert len(index) == len(index.sequence) == index.ca.shape[0] == index.cb.shape[0]
+
+    def test_numbering_map(self, index):
+        """seq_to_pdb and pdb_to_seq are inverse; absent residues give None"""
+        for i in (0, 10, len(index) - 1):
+            assert index.pdb_to_seq(index.seq_to_pdb(i)) == i
+        assert index.residue(index.first_res) == index.sequence[0]
+        assert index.pdb_to_seq(1) is None
+        assert 1 not in index
+
+    def test_npz_cache_round_trip(self, index, tmp_path):
+        """The cached .npz reloads to an identical index"""
+        from src.structure_index import StructureIndex
+
+        cached = list(tmp_path.glob("*_A.npz"))
+        assert len(cached) == 1
+        loaded = StructureIndex.load(cached[0])
+        assert loaded.sequence == index.sequence
+        assert loaded.chain == 'A'
+        np.testing.assert_array_equal(loaded.resnums, index.resnums)
+        np.testing.assert_array_equal(loaded.cb, index.cb)
+
+    def test_memoised_per_process(self, index, tmp_path):
+        """A second load returns the same object without reparsing"""
+        from src.structure_index import load_structure_index
+
+        assert load_structure_index(PDB, 'A', str(tmp_path)) is index
+
+    def test_neighbors(self, index):
+        """CB neighbours are symmetric and exclude the query residue"""
+        res = index.seq_to_pdb(50)
+        near = index.neighbors(res, radius=8.0)
+        assert res not in near
+        assert len(near) > 0
+        assert all(res in index.neighbors(int(n), radius=8.0) for n in near)
+        dist = index.cb_distances()
+        assert np.allclose(dist, dist.T)
+        assert set(near) == set(index.resnums[(dist[50] <= 8.0) & (np.arange(len(index)) != 50)])
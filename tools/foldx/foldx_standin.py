@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+FoldX stand-in for orchestration tests and throughput benchmarks.
+
+Mimics the parts of the FoldX 5 command line and output conventions that
+src/features/ddg_foldx.py relies on, without the licensed binary:
+
+    foldx_standin.py --command=BuildModel --pdb=5XJH.pdb \
+        --mutant-file=individual_list.txt --numberOfRuns=1
+    foldx_standin.py --command=RepairPDB --pdb=5XJH.pdb
+
+BuildModel writes Average_<stem>.fxout, Dif_<stem>.fxout and
+Raw_<stem>.fxout in the working directory with one row per line of the
+mutant file. ΔΔG values are deterministic pseudo-energies derived from a
+hash of each mutation. RepairPDB copies the PDB to <stem>_Repair.pdb.
+
+Behaviour is tuned through environment variables:
+- FOLDX_STANDIN_STARTUP: Seconds spent "loading" before any work (default 0)
+- FOLDX_STANDIN_LATENCY: Seconds per modelled mutant (default 0)
+- FOLDX_STANDIN_FAIL_RATE: Fraction of mutation sets that make the run
+  exit with an error (default 0)
+- FOLDX_STANDIN_HANG_RATE: Fraction of mutation sets that make the run
+  hang until killed (default 0)
+- FOLDX_STANDIN_SEED: Salt for which mutation sets fail or hang
+
+Failures and hangs are a deterministic property of the mutation set, like
+a variant FoldX genuinely cannot model, so retries reproduce them.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+
+TERMS = [
+    "total energy", "Backbone Hbond", "Sidechain Hbond", "Van der Waals",
+    "Electrostatics", "Solvation Polar", "Solvation Hydrophobic",
+    "Van der Waals clashes", "entropy sidechain", "entropy mainchain",
+    "sloop_entropy", "mloop_entropy", "cis_bond", "torsional clash",
+    "backbone clash", "helix dipole", "water bridge", "disulfide",
+    "electrostatic kon", "partial covalent bonds", "energy Ionisation",
+    "Entropy Complex",
+]
+MUTATION = re.compile(r'^[A-Z][A-Za-z0-9][0-9]+[a-z]?[A-Z]$')
+
+
+def _env_float(name, default=0.0):
+    return float(os.environ.get(name, default))
+
+
+def _unit(text, salt=""):
+    """Deterministic pseudo-random number in [0, 1) for a string."""
+    digest = hashlib.sha256(f"{salt}|{text}".encode()).digest()
+    return int.from_bytes(digest[:8], "little") / 2 ** 64
+
+
+def _mutation_terms(mutation):
+    """Pseudo per-term energies of one mutation; terms sum to total energy."""
+    terms = [(_unit(mutation, term) - 0.4) * 1.5 for term in TERMS[1:]]
+    return [sum(terms)] + terms
+
+
+def _header(pdb, output_type, columns):
+    return (
+        "FoldX 5.0 (c) stand-in\n"
+        "by the FoldX Consortium\n"
+        "------------------------------------------------------\n\n\n"
+        f"PDB file analysed: ./{pdb}\n"
+        f"Output type: {output_type}\n"
+        + "\t".join(columns) + "\n"
+    )
+
+
+def _read_mutant_file(path):
+    mutation_sets = []
+    for line in open(path, encoding="utf-8"):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.endswith(";"):
+            raise ValueError(f"mutant file line does not end with ';': {line}")
+        mutations = [m.strip() for m in line[:-1].split(",") if m.strip()]
+        for mutation in mutations:
+            if not MUTATION.match(mutation):
+                raise ValueError(f"malformed mutation: {mutation}")
+        mutation_sets.append(mutations)
+    return mutation_sets
+
+
+def build_model(pdb, mutant_file, runs):
+    stem = os.path.splitext(os.path.basename(pdb))[0]
+    mutation_sets = _read_mutant_file(mutant_file)
+    salt = os.environ.get("FOLDX_STANDIN_SEED", "")
+    fail_rate = _env_float("FOLDX_STANDIN_FAIL_RATE")
+    hang_rate = _env_float("FOLDX_STANDIN_HANG_RATE")
+    latency = _env_float("FOLDX_STANDIN_LATENCY")
+
+    rows = []
+    for k, mutations in enumerate(mutation_sets, start=1):
+        key = ",".join(sorted(mutations))
+        if _unit(key, salt + "hang") < hang_rate:
+            print(f"Mutant {k}: minimisation not converging", flush=True)
+            while True:
+                time.sleep(60)
+        if _unit(key, salt + "fail") < fail_rate:
+            sys.exit(f"Error: cannot build mutant {k} ({key})")
+        time.sleep(latency * runs)
+        totals = [0.0] * len(TERMS)
+        for mutation in mutations:
+            totals = [a + b for a, b in zip(totals, _mutation_terms(mutation[0] + mutation[2:]))]
+        rows.append((k, totals))
+        print(f"BuildModel: mutant {k} done", flush=True)
+
+    fmt = lambda values: "\t".join(f"{v:.6g}" for v in values)
+    with open(f"Average_{stem}.fxout", "w", encoding="utf-8") as f:
+        f.write(_header(pdb, "BuildModel", ["Pdb", "SD"] + TERMS))
+        for k, totals in rows:
+            f.write(f"{stem}_{k}\t0\t{fmt(totals)}\n")
+    with open(f"Dif_{stem}.fxout", "w", encoding="utf-8") as f:
+        f.write(_header(pdb, "BuildModel", ["Pdb"] + TERMS))
+        for k, totals in rows:
+            for run in range(runs):
+                f.write(f"{stem}_{k}_{run}.pdb\t{fmt(totals)}\n")
+    with open(f"Raw_{stem}.fxout", "w", encoding="utf-8") as f:
+        f.write(_header(pdb, "BuildModel", ["Pdb"] + TERMS))
+        reference = [-250.0] + [-10.0] * (len(TERMS) - 1)
+        for k, totals in rows:
+            for run in range(runs):
+                f.write(f"{stem}_{k}_{run}.pdb\t{fmt(r + t for r, t in zip(reference, totals))}\n")
+                f.write(f"WT_{stem}_{k}_{run}.pdb\t{fmt(reference)}\n")
+
+
+def repair_pdb(pdb):
+    stem = os.path.splitext(os.path.basename(pdb))[0]
+    shutil.copy(pdb, f"{stem}_Repair.pdb")
+    with open(f"{stem}_Repair.fxout", "w", encoding="utf-8") as f:
+        f.write(_header(pdb, "RepairPDB", ["Pdb"] + TERMS))
+        f.write(f"{stem}_Repair.pdb\t" + "\t".join(["0"] * len(TERMS)) + "\n")
+
+
+def main(argv):
+    args = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    time.sleep(_env_float("FOLDX_STANDIN_STARTUP"))
+    command = args.get("command")
+    pdb = args.get("pdb")
+    if not pdb or not os.path.exists(pdb):
+        sys.exit(f"Error: PDB file not found: {pdb}")
+    if command == "BuildModel":
+        build_model(pdb, args.get("mutant-file", "individual_list.txt"),
+                    int(args.get("numberOfRuns", 1)))
+    elif command == "RepairPDB":
+        repair_pdb(pdb)
+    else:
+        sys.exit(f"Error: unsupported command: {command}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])